@@ -73,71 +73,483 @@ import sys
 import os
 import importlib
 import getopt
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from engine.data import Data
-from engine.linux_perf import LinuxPerf
+from engine.linux_perf import LinuxPerf, PerfRecord
+from engine.regression import Regression
+from engine.ranking import Ranking
+from engine.query import Query
+from engine.logfile import stream_logs, is_archive
+from engine.perf_report import is_report, hotspots
+from engine.config import Benchmark, load_config, find_benchmark
+from engine.export import export, FORMATS
+from engine.watch import Watcher
+from engine.server import QueryServer, make_server
+from engine.history import History
+from engine.snapshot import Snapshot, is_snapshot, merge as merge_snapshots, \
+                            EXTENSION as SNAPSHOT
+# Same registry / cache the engine modules use (engine/ must be in PYTHONPATH)
+from instrument import STATS, profile as run_profiled
+from analysis.cache import CACHE
+
+# Seconds between checks for new logs, when watching
+WATCH_INTERVAL = 1.0
 
 def validate_plugin(plugin):
-    """Make sure we don't try to load a bogus plugin"""
+    """Make sure we don't try to load a bogus plugin (ValueError if so)"""
     filename = "engine/" + plugin + ".py"
     if os.path.isfile(filename):
         raw = Path(filename).read_text()
         if raw.find("class LinuxPerfPlugin") == -1:
-            print("Cannot find class LinuxPerfPlugin in " + filename)
-            syntax()
+            raise ValueError("Cannot find class LinuxPerfPlugin in " + filename)
     else:
-        print("Cannot find plugin " + filename)
-        syntax()
+        raise ValueError("Cannot find plugin " + filename)
 
 def load_plugin(plugin):
     """Loads module in engine/plugin.py and return LinuxPerfClass object"""
     mod = importlib.import_module("engine." + plugin)
     return mod.LinuxPerfPlugin()
 
-def process(log_dir, log_file, data, plugin):
-    """Process a single log file, using plugins, update Data"""
-    # Hardcoded "process" for Lulesh for now
-    plugin = load_plugin(plugin)
+def process(log_file, raw, plugin, validate=False):
+    """Process a single log (name and text), using plugins, return values.
+       Optionally, fail (ValueError) on logs with missing data"""
     # Create an empty perf, as we won't execute, just parse
-    app = LinuxPerf(plugin=plugin)
-    # Open log file, pass it to LinuxPerf, parse
-    raw = Path(log_dir + "/" + log_file).read_text()
-    results = app.parse(raw, raw)
-    # Collect parsed data, push into Data
-    data.add_log(log_dir, log_file, results)
-
-def process_logs(log_dir, data, plugin):
-    """Process all log files in directory, update Data"""
-    # Unused root, dirs, only reading files
-    for _, _, files in os.walk(log_dir):
-        for filename in files:
-            if filename.startswith("."):
+    if plugin:
+        app = LinuxPerf(plugin=load_plugin(plugin))
+    else:
+        app = LinuxPerf()
+    # Pass the log to LinuxPerf, parse
+    with STATS.timer('parse'):
+        results = app.parse(raw, raw)
+    if validate:
+        problems = app.check()
+        if problems:
+            raise ValueError(", ".join(problems))
+    return results.get_values()
+
+def process_file(path, reldir, benchmarks, keep_going=False):
+    """Process a log file (plain, compressed or archive) for the benchmarks
+       it belongs to. Returns a list of (benchmark, name, values, kind, size),
+       kind is 'log', 'report' (values are hotspots) or, when keeping going,
+       'error' (values is the reason, name the path of the bad log or file)"""
+    results = list()
+    try:
+        for subdir, name, stream in stream_logs(path):
+            # Archive members are in the directories they were in
+            bench = find_benchmark(benchmarks, os.path.join(reldir, subdir), name)
+            if bench is None:
+                continue
+            member = (os.path.join(path, subdir, name) if is_archive(path)
+                      else path)
+            if bench.error:
+                results.append((bench.name, member, bench.error, 'error', 0))
+                continue
+            try:
+                if is_report(name):
+                    with STATS.timer('hotspots'):
+                        results.append((bench.name, name, hotspots(stream),
+                                        'report', 0))
+                    continue
+                # Reading is decompressing / streaming the log
+                with STATS.timer('read'):
+                    raw = stream.read()
+                results.append((bench.name, name,
+                                process(name, raw, bench.plugin, keep_going),
+                                'log', len(raw)))
+            # Any problem with a log is that log's problem, the rest goes on
+            except Exception as error:
+                if not keep_going:
+                    raise
+                results.append((bench.name, member, _reason(error), 'error', 0))
+    # A broken archive / compressed file loses the rest of the file only
+    except Exception as error:
+        if not keep_going:
+            raise
+        results.append((None, path, _reason(error), 'error', 0))
+    return results
+
+def process_file_stats(path, reldir, benchmarks, keep_going=False, stats=False):
+    """process_file() in a worker process, whose STATS isn't the parent's:
+       returns its results and the timers and counters of this file"""
+    STATS.enable(stats)
+    STATS.reset()
+    results = process_file(path, reldir, benchmarks, keep_going)
+    return results, STATS.take()
+
+def _reason(error):
+    """Short description of an exception, for the quarantine report"""
+    message = str(error)
+    if isinstance(error, ValueError) and message:
+        return message
+    return type(error).__name__ + (": " + message if message else "")
+
+def process_logs(log_dir, datas, benchmarks, jobs=1, quarantine=None,
+                 run=None, files=None):
+    """Process all log files in directory (or archive) in one walk, for all
+       benchmarks, update their Data, in run (default: the log dir). Files
+       are parsed by 'jobs' processes but added in walk order, so results
+       don't depend on it. With a quarantine list, bad logs go there as
+       (path, reason) instead of stopping the run. Optionally, only some
+       files (path, relative dir) instead of walking"""
+    keep_going = quarantine is not None
+    if files is not None:
+        pass
+    elif os.path.isfile(log_dir):
+        files = [(log_dir, '')]
+    else:
+        files = list()
+        with STATS.timer('walk'):
+            for root, _, names in os.walk(log_dir):
+                reldir = os.path.relpath(root, log_dir)
+                if reldir == '.':
+                    reldir = ''
+                for filename in sorted(names):
+                    if filename.startswith("."):
+                        continue
+                    files.append((os.path.join(root, filename), reldir))
+
+    paths = [path for path, _ in files]
+    reldirs = [reldir for _, reldir in files]
+    if jobs > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            chunk = max(1, len(files) // (jobs * 4))
+            results = list()
+            for file_results, stats in pool.map(
+                    process_file_stats, paths, reldirs, repeat(benchmarks),
+                    repeat(keep_going), repeat(STATS.enabled), chunksize=chunk):
+                STATS.merge(*stats)
+                results.append(file_results)
+    else:
+        results = map(process_file, paths, reldirs, repeat(benchmarks),
+                      repeat(keep_going))
+    add_results(results, log_dir, run or log_dir, datas, quarantine)
+
+def _add_logs(datas, bench, logs):
+    """Adds (run, name, record) to a benchmark's Data at once, returns the
+       (benchmark, log id) of the leaves that changed"""
+    with STATS.timer('add_log'):
+        return [(bench, log_id) for log_id in datas[bench].add_logs(logs)]
+
+def add_results(results, log_dir, run, datas, quarantine=None):
+    """Pushes parsed files (lists of process_file() results) into Data,
+       hotspots go with the log of the same name, wherever it was. Returns
+       the (benchmark, log id) of every leaf that changed"""
+    changed = list()
+    reports = list()
+    # Benchmark -> logs, added at once: each leaf is summarised once
+    pending = dict()
+    for file_results in results:
+        for bench, name, values, kind, size in file_results:
+            if kind == 'error':
+                quarantine.append((name, values))
+                STATS.count('logs quarantined')
+                continue
+            if kind == 'report':
+                reports.append((bench, name, values))
                 continue
-            process(log_dir, filename, data, plugin)
+            STATS.count('files read')
+            STATS.count('bytes scanned', size)
+            if quarantine is not None:
+                # The first log sets the number of categories of the others
+                if not datas[bench].num_cat and pending.get(bench):
+                    changed += _add_logs(datas, bench, pending.pop(bench))
+                problem = datas[bench].check_log(name)
+                if problem:
+                    quarantine.append((os.path.join(log_dir, name), problem))
+                    STATS.count('logs quarantined')
+                    continue
+            pending.setdefault(bench, list()).append(
+                (run, name, PerfRecord(name, values)))
+    for bench, logs in pending.items():
+        changed += _add_logs(datas, bench, logs)
+    for bench, name, values in reports:
+        if not datas[bench].attach(run, name, values):
+            print("Warning: no log for " + name + ", ignoring")
+            continue
+        changed.append((bench, datas[bench].log_id(run, name)))
+    return changed
 
-def process_runs(name, log_dirs, plugin, data_string):
-    """Adjust dictionary, process all logs, return Data"""
-    data = Data(name, data_string)
-    # For each log dir, parse, append to the dictionary
+def process_runs(benchmarks, log_dirs, jobs=1, quarantine=None, merge=False,
+                 files=None):
+    """Process all logs of all benchmarks, return their Data, by name. When
+       merging, all log dirs are one run (same logs are repeats). Snapshots
+       (of other nodes) are merged in, by benchmark name. Optionally, the
+       files of each log dir, instead of walking them"""
+    if files is None:
+        files = dict()
+    datas = {bench.name: Data(bench.name, bench.data_string)
+             for bench in benchmarks}
+    run = '+'.join(log_dirs) if merge else None
+    # For each log dir, parse, append to the dictionaries
+    shards = dict()
     for log_dir in log_dirs:
-        process_logs(log_dir, data, plugin)
-    return data
+        if not is_snapshot(log_dir):
+            process_logs(log_dir, datas, benchmarks, jobs, quarantine, run,
+                         files.get(log_dir))
+            continue
+        try:
+            with STATS.timer('read'):
+                shard = Snapshot.load(log_dir)
+        except (OSError, ValueError) as error:
+            if quarantine is None:
+                raise
+            quarantine.append((log_dir, _reason(error)))
+            STATS.count('logs quarantined')
+            continue
+        # With a single benchmark, all snapshots are of it
+        name = benchmarks[0].name if len(benchmarks) == 1 else shard.name
+        if name not in datas:
+            print("Warning: no benchmark " + shard.name + " for " + log_dir +
+                  ", ignoring")
+            continue
+        shard.name = name
+        if shard.datastr != datas[name].datastr:
+            problem = ("snapshot of '" + shard.datastr + "' doesn't fit data of '"
+                       + datas[name].datastr + "'")
+            if quarantine is None:
+                raise ValueError(log_dir + ": " + problem)
+            quarantine.append((log_dir, problem))
+            STATS.count('logs quarantined')
+            continue
+        shards.setdefault(name, list()).append(shard)
+    for name, snapshots in shards.items():
+        with STATS.timer('merge'):
+            merge_snapshots(snapshots).to_data(datas[name], run)
+    return datas
+
+def save_snapshots(datas, path):
+    """Saves the Data of each benchmark as a snapshot, with the benchmark
+       name before the extension if there are many. Returns the paths"""
+    paths = list()
+    for name, data in datas.items():
+        if len(datas) > 1:
+            paths.append(path[:-len(SNAPSHOT)] + '-' + name + SNAPSHOT)
+        else:
+            paths.append(path)
+        with STATS.timer('export'):
+            Snapshot.from_data(data).save(paths[-1])
+    return paths
 
-def compare(data):
+def compare(data, baseline=None, top=10, levels=1, changes=None):
     """Compare all results together, mark exceptions"""
     # Find th leaf nodes (perf/bench data)
     # Find their equivalent leaf nodes in other categories
     # Spot outliers, curve fits, significant differences
+    ranking = Ranking(top)
+    if baseline:
+        regression = Regression(baseline, data)
+        with STATS.timer('regression'):
+            regression.run()
+        print(" + Regressions:")
+        for delta in regression.get_value('regressions'):
+            print(" - " + str(delta))
+        print(" + Improvements:")
+        for delta in regression.get_value('improvements'):
+            print(" - " + str(delta))
+        ranking.extend(regression.findings())
+    if changes is not None:
+        print(" + Changes:")
+        for change in changes:
+            print(" - " + str(change))
+        ranking.extend(change.finding() for change in changes)
+    ranking.extend(data.analyse(levels=levels))
+
+    # Only the biggest findings, at the very end of the log
+    print(" + Top " + repr(top) + " of " + repr(ranking.count) + " finding(s):")
+    for finding in ranking.results():
+        print(" - " + str(finding))
     return data
 
+def run(benchmarks, log_dirs, baseline_dirs, top, query, jobs=1, output=None,
+        levels=1, keep_going=False, merge=False, snapshot=None, watching=False,
+        address=None, history=None, date=None):
+    """Process all logs, then query or analyse them, benchmark by benchmark.
+       With a snapshot file, only save the parsed data there. When watching,
+       go on with the logs written after that. With an address, answer
+       queries there instead. With a history, record the data on date and
+       report the changes across all dates"""
+    # Watch from the start, so that no log is missed or processed twice
+    watcher = None
+    files = None
+    if watching:
+        watcher = Watcher([log_dir for log_dir in log_dirs
+                           if os.path.isdir(log_dir)])
+        files = {root: list() for root in watcher.roots}
+        for root, path, reldir in watcher.existing():
+            files[root].append((path, reldir))
+
+    # Process all logs (with plugins), bad logs are set aside if keeping going
+    quarantine = list() if keep_going else None
+    datas = process_runs(benchmarks, log_dirs, jobs, quarantine, merge, files)
+    if snapshot:
+        print(" + Snapshot:")
+        for path in save_snapshots(datas, snapshot):
+            print(" - " + path)
+        _quarantined(quarantine)
+        return
+    if address:
+        _quarantined(quarantine)
+        serve(datas, address)
+        return
+    baselines = dict()
+    if baseline_dirs:
+        baselines = process_runs(benchmarks, baseline_dirs, jobs, quarantine,
+                                 merge)
+
+    for bench in benchmarks:
+        data = datas[bench.name]
+        baseline = baselines.get(bench.name)
+        if len(benchmarks) > 1:
+            print(" + Benchmark: " + bench.name)
+            if not data.records:
+                print(" - No logs")
+                continue
+
+        # Queries replace the analysis
+        if query:
+            try:
+                print(query.run(data))
+            except ValueError as error:
+                print("Invalid query: " + str(error))
+                sys.exit(1)
+            continue
+
+        # Tonight's metrics, then the shifts over all nights
+        changes = None
+        if history:
+            try:
+                print(" + History: " + history.record(data, date))
+            except ValueError as error:
+                print(" + History: not recorded, " + str(error))
+            with STATS.timer('history'):
+                changes = history.changes(bench.name)
+
+        # Perform all comparisons
+        if not baseline:
+            data.summary()
+        compare(data, baseline, top, levels, changes)
+
+        # Metrics and analysis results as tables, for other tools
+        if output:
+            if len(benchmarks) > 1:
+                base, ext = os.path.splitext(output)
+                path = base + '-' + bench.name + ext
+            else:
+                path = output
+            with STATS.timer('export'):
+                paths = export(data, path)
+            print(" + Exported:")
+            for path in paths:
+                print(" - " + path)
+
+    _quarantined(quarantine)
+
+    if watcher:
+        with watcher:
+            watch(watcher, benchmarks, datas,
+                  '+'.join(log_dirs) if merge else None)
+
+    # Dump significant data (higher than threshold)
+
+def serve(datas, address):
+    """Answers queries about the data on address until interrupted"""
+    server = make_server(QueryServer(datas), address)
+    print(" + Serving " + ", ".join(datas) + " on " + address +
+          ", Ctrl-C to stop")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(" + Stopped serving")
+    finally:
+        server.server_close()
+
+def watch(watcher, benchmarks, datas, run=None):
+    """Processes logs as they are written (bad ones are set aside), prints
+       the new findings of the groups they change, until interrupted"""
+    seen = {name: set(str(finding) for finding in data.analyse())
+            for name, data in datas.items()}
+    print(" + Watching " + ", ".join(watcher.roots) +
+          (" (polling)" if watcher.polling else "") + ", Ctrl-C to stop")
+    sys.stdout.flush()
+    quarantine = list()
+    try:
+        while True:
+            for root, path, reldir in watcher.wait(WATCH_INTERVAL):
+                results = [process_file(path, reldir, benchmarks, True)]
+                changed = add_results(results, root, run or root, datas,
+                                      quarantine)
+                print(" + " + path)
+                for _, reason in quarantine:
+                    print(" - Quarantined: " + reason)
+                del quarantine[:]
+                logs = dict()
+                for bench, log_id in changed:
+                    logs.setdefault(bench, list()).append(log_id)
+                for bench, ids in logs.items():
+                    with STATS.timer('watch'):
+                        findings = list(datas[bench].analyse(logs=ids))
+                    for finding in findings:
+                        if str(finding) not in seen[bench]:
+                            seen[bench].add(str(finding))
+                            print(" - " + str(finding))
+                sys.stdout.flush()
+    except KeyboardInterrupt:
+        print(" + Stopped watching")
+
+def _quarantined(quarantine):
+    """Lists the logs set aside, if any"""
+    if quarantine:
+        print(" + Quarantined " + repr(len(quarantine)) + " log(s):")
+        for name, reason in quarantine:
+            print(" - " + name + ": " + reason)
+
 def syntax():
     """Syntax"""
     print("Syntax: aggregate.py [options] benchname <logs_dir_arch1> <logs_dir_arch2> ...")
+    print("        aggregate.py [options] -c <config> <logs_dir_arch1> <logs_dir_arch2> ...")
+    print(" Log dirs can also be tar archives, logs can be compressed (gz, xz, zst...)")
+    print(" Log dirs can also be snapshots of other nodes (-s), which are merged")
+    print(" Perf report / script dumps (<log name>.report / .script) add hotspots to logs")
     print(" Options:")
     print("   -p <plugin_name> : Loads class LinuxPerfPlugin in module <plugin_name>")
     print("   -d <data_desc> : Description of the data, in positional order, in log names")
     print("                    Example: -d sep=-,outlier=1.0,cluster=2,fit=2")
     print("                             from lognames <compiler>-<options>-<arch>-<cores>")
+    print("   -b <logs_dir> : Baseline logs, compare the runs against them and only")
+    print("                   report significant regressions / improvements")
+    print("   -t <N> : Number of top findings to report (default 10)")
+    print("   -l <N> : Analyse group statistics again, up to level N (default 1), with")
+    print("            the opposite strategy (see DataAnalysis.md)")
+    print("   -q <query> : Print the result of a query instead of the analysis")
+    print("                Example: -q 'select FOM, cycles where cat1 in (gcc6, llvm5)")
+    print("                             and cat3 >= 4 group by cat2 agg median'")
+    print("   -c <config> : Benchmarks (plugin, data string, file patterns) from an INI")
+    print("                 file, all processed in one walk (see engine/config.py)")
+    print("   -o <file> : Export metrics, analysis points and groups as tables next to")
+    print("               <file>, format by extension: " + ", ".join(FORMATS))
+    print("   -j <N> : Parse logs with N processes (default 1)")
+    print("   -m : Merge log dirs: same logs in different dirs are repeats of one")
+    print("        measurement, like <log name>-rN logs in the same dir")
+    print("   -s <file" + SNAPSHOT + "> : Only parse the logs and save them in a snapshot,")
+    print("                        to merge with others by passing snapshots as log dirs")
+    print("   --watch : After the analysis, process logs as they are written in the log")
+    print("             dirs and print new findings of the groups they change")
+    print("   --serve <[host:]port|socket> : Keep the parsed logs in memory and answer")
+    print("                 queries in JSON over HTTP, on TCP (localhost by default)")
+    print("                 or a Unix socket (see engine/server.py)")
+    print("   --history <dir> : Record the metrics of each path in a history of all")
+    print("                     nights and report when they changed (see")
+    print("                     engine/history.py)")
+    print("   --date <YYYY-MM-DD> : Date to record in the history (default today)")
+    print("   -k : Keep going: set aside bad logs (no perf output, missing fields,")
+    print("        wrong name, corrupt file) and report them at the end")
+    print("   --stats : Print time spent in each stage and counters at the end")
+    print("   --cache <MiB> : Memory for cached analysis results (default 64, 0 = off)")
+    print("   --profile : Run under cProfile/tracemalloc, print hottest functions")
     sys.exit(2)
 
 def main():
@@ -146,26 +558,156 @@ def main():
     start = 1
     plugin = None
     data_string = ''
-    opts, _ = getopt.getopt(sys.argv[start:], 'p:d:')
+    baseline_dirs = list()
+    top = 10
+    query = None
+    config = None
+    jobs = 1
+    output = None
+    levels = 1
+    keep_going = False
+    merge = False
+    snapshot = None
+    watching = False
+    address = None
+    history = None
+    date = datetime.date.today().isoformat()
+    stats = False
+    profiling = False
+    try:
+        opts, _ = getopt.getopt(sys.argv[start:], 'p:d:b:t:q:c:j:o:l:s:km',
+                                ['stats', 'profile', 'cache=', 'watch', 'serve=',
+                                 'history=', 'date='])
+    except getopt.GetoptError as error:
+        print(str(error))
+        syntax()
     for opt, arg in opts:
         if opt in ('-p', '--plugin'):
-            validate_plugin(arg)
             plugin = arg
             start += 2
         elif opt in ('-d', '--data'):
             data_string = arg
             start += 2
+        elif opt in ('-b', '--baseline'):
+            baseline_dirs.append(arg)
+            start += 2
+        elif opt in ('-t', '--top'):
+            if not arg.isdigit() or not int(arg):
+                print("Top must be a positive number")
+                syntax()
+            top = int(arg)
+            start += 2
+        elif opt in ('-l', '--levels'):
+            if not arg.isdigit() or not int(arg):
+                print("Levels must be a positive number")
+                syntax()
+            levels = int(arg)
+            start += 2
+        elif opt in ('-q', '--query'):
+            try:
+                query = Query(arg)
+            except ValueError as error:
+                print("Invalid query: " + str(error))
+                syntax()
+            start += 2
+        elif opt in ('-c', '--config'):
+            config = arg
+            start += 2
+        elif opt in ('-j', '--jobs'):
+            if not arg.isdigit() or not int(arg):
+                print("Jobs must be a positive number")
+                syntax()
+            jobs = int(arg)
+            start += 2
+        elif opt in ('-o', '--output'):
+            if os.path.splitext(arg)[1] not in FORMATS:
+                print("Export format must be one of " + ", ".join(FORMATS))
+                syntax()
+            output = arg
+            start += 2
+        elif opt == '--cache':
+            if not arg.isdigit():
+                print("Cache size must be a number of MiB")
+                syntax()
+            CACHE.set_budget(int(arg) << 20)
+            # Either --cache=N or --cache N
+            start += 1 if sys.argv[start].startswith('--cache=') else 2
+        elif opt in ('-k', '--keep-going'):
+            keep_going = True
+            start += 1
+        elif opt in ('-s', '--snapshot'):
+            if not is_snapshot(arg):
+                print("Snapshot files must end in " + SNAPSHOT)
+                syntax()
+            snapshot = arg
+            start += 2
+        elif opt in ('-m', '--merge'):
+            merge = True
+            start += 1
+        elif opt == '--serve':
+            address = arg
+            # Either --serve=A or --serve A
+            start += 1 if sys.argv[start].startswith('--serve=') else 2
+        elif opt == '--history':
+            try:
+                history = History(arg)
+            except ValueError as error:
+                print(str(error))
+                syntax()
+            # Either --history=D or --history D
+            start += 1 if sys.argv[start].startswith('--history=') else 2
+        elif opt == '--date':
+            try:
+                datetime.date.fromisoformat(arg)
+            except ValueError:
+                print("Date must be YYYY-MM-DD")
+                syntax()
+            date = arg
+            start += 1 if sys.argv[start].startswith('--date=') else 2
+        elif opt == '--watch':
+            watching = True
+            start += 1
+        elif opt == '--stats':
+            stats = True
+            start += 1
+        elif opt == '--profile':
+            profiling = True
+            start += 1
         else:
             syntax()
 
-    # First positional parameter is benchmark name
-    if len(sys.argv) < start+1:
-        print("Missing Benchmark name")
-        syntax()
-    benchname = sys.argv[start]
-    if not benchname:
-        syntax()
-    start += 1
+    # Benchmarks from config, or first positional parameter is benchmark name
+    if config:
+        if plugin or data_string:
+            print("Plugin and data string go in the config file")
+            syntax()
+        try:
+            benchmarks = load_config(config)
+        except (OSError, ValueError) as error:
+            print("Cannot load config " + config + ": " + str(error))
+            syntax()
+    else:
+        if len(sys.argv) < start+1:
+            print("Missing Benchmark name")
+            syntax()
+        benchname = sys.argv[start]
+        if not benchname:
+            syntax()
+        start += 1
+        benchmarks = [Benchmark(benchname, plugin, data_string)]
+
+    # A bad plugin stops everything, unless keeping going (its logs are then
+    # all quarantined)
+    for bench in benchmarks:
+        if not bench.plugin:
+            continue
+        try:
+            validate_plugin(bench.plugin)
+        except ValueError as error:
+            if not keep_going:
+                print(str(error))
+                syntax()
+            bench.error = str(error)
 
     # Second onward is different runs' logs (machines?)
     if len(sys.argv) < start+1:
@@ -176,19 +718,38 @@ def main():
         syntax()
 
     # Validate input
-    for log_dir in log_dirs:
-        if not os.path.isdir(log_dir):
-            print(log_dir + " is not a directory")
+    for log_dir in log_dirs + baseline_dirs:
+        if not os.path.isdir(log_dir) and not (os.path.isfile(log_dir) and
+                                               (is_archive(log_dir) or
+                                                is_snapshot(log_dir))):
+            print(log_dir + " is not a directory, log archive or snapshot")
+            syntax()
+    if address and (query or snapshot or watching or baseline_dirs):
+        print("Cannot serve with a query, snapshot, baseline or watching")
+        syntax()
+    if history and (query or snapshot or address or baseline_dirs):
+        print("Cannot keep a history with a query, snapshot, baseline or serving")
+        syntax()
+    if watching:
+        if query or snapshot:
+            print("Cannot watch with a query or a snapshot")
+            syntax()
+        if not any(os.path.isdir(log_dir) for log_dir in log_dirs):
+            print("Watching needs a log directory")
             syntax()
 
-    # Process all logs (with plugins)
-    data = process_runs(benchname, log_dirs, plugin, data_string)
-
-    # Perform all comparisons
-    data.summary()
-    compare(data)
-
-    # Dump significant data (higher than threshold)
+    STATS.enable(stats)
+    if profiling:
+        run_profiled(run, benchmarks, log_dirs, baseline_dirs, top, query, jobs,
+                     output, levels, keep_going, merge, snapshot, watching,
+                     address, history, date)
+    else:
+        run(benchmarks, log_dirs, baseline_dirs, top, query, jobs, output,
+            levels, keep_going, merge, snapshot, watching, address, history,
+            date)
+    if stats:
+        print(" + Stats:")
+        print(STATS.report())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+ Benchmark the tool itself on synthetic log corpora
+
+ Generates deterministic corpora (see engine/synthetic.py) of increasing size
+ and times each stage of the pipeline separately:
+  * generate : writing the logs (not part of the tool, for reference)
+  * walk     : listing the log directory
+  * read     : reading all files
+  * parse    : LinuxPerf.parse with the lulesh plugin
+  * add_log  : Data.add_logs of all logs, at once as aggregate.py does
+  * columns  : building Data's metric columns
+  * groups   : building the groups of every category
+  * pass-N   : each analysis pass (category N), on all groups and metrics
+  * aggregate: end-to-end aggregate.py run (separate process)
+
+ Results are written as JSON, with wall and CPU time per stage (and per log),
+ so that regressions in the tool can be tracked over time.
+"""
+import sys
+import os
+import json
+import time
+import getopt
+import platform
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+import numpy as np
+from engine.data import Data
+from engine.linux_perf import LinuxPerf
+from engine.lulesh import LinuxPerfPlugin
+from engine import synthetic
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def cpu_time():
+    """User + system time of this process and its finished children"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def timed(stages, name, func, num_logs):
+    """Runs func, records wall/CPU time under name, returns func's result"""
+    wall = time.perf_counter()
+    cpu = cpu_time()
+    result = func()
+    wall = time.perf_counter() - wall
+    cpu = cpu_time() - cpu
+    stages[name] = {'wall': wall, 'cpu': cpu,
+                    'wall_per_log': wall / num_logs if num_logs else 0.0}
+    return result
+
+def aggregate(log_dir, data_string):
+    """Runs aggregate.py on the corpus, discarding the output"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.join(ROOT, 'engine')] + env.get('PYTHONPATH', '').split(os.pathsep))
+    subprocess.run([sys.executable, os.path.join(ROOT, 'aggregate.py'),
+                    '-d', data_string, '-p', 'lulesh', synthetic.BENCH, log_dir],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+def bench(num_logs, depth, counters, seed, end_to_end):
+    """Benchmarks all stages on one corpus size, returns the results"""
+    stages = dict()
+    log_dir = tempfile.mkdtemp(prefix='synth-')
+    try:
+        size = timed(stages, 'generate',
+                     lambda: synthetic.write(log_dir, num_logs, depth,
+                                             counters, seed), num_logs)
+        files = timed(stages, 'walk',
+                      lambda: sorted(name for _, _, names in os.walk(log_dir)
+                                     for name in names), num_logs)
+        texts = timed(stages, 'read',
+                      lambda: [Path(log_dir, name).read_text() for name in files],
+                      num_logs)
+        plugin = LinuxPerfPlugin()
+        results = timed(stages, 'parse',
+                        lambda: [LinuxPerf(plugin=plugin).parse(text, text)
+                                 for text in texts], num_logs)
+        data_string = synthetic.data_string(depth)
+        data = Data(synthetic.BENCH, data_string)
+        timed(stages, 'add_log',
+              lambda: data.add_logs((log_dir, name, result) for name, result
+                                    in zip(files, results)), num_logs)
+        timed(stages, 'columns', data.columns, num_logs)
+        timed(stages, 'groups',
+              lambda: [list(data.groups(pos)) for pos in range(data.num_cat)],
+              num_logs)
+        findings = 0
+        for pos, analysis in enumerate(data.analyses):
+            if analysis is None:
+                continue
+            found = timed(stages, 'pass-' + str(pos) + '-' + str(analysis.plugin),
+                          lambda: list(data.analyse([pos])), num_logs)
+            findings += len(found)
+        if end_to_end:
+            timed(stages, 'aggregate', lambda: aggregate(log_dir, data_string),
+                  num_logs)
+    finally:
+        shutil.rmtree(log_dir)
+
+    return {'logs': num_logs, 'depth': depth, 'counters': counters,
+            'seed': seed, 'bytes': size, 'findings': findings,
+            'stages': stages}
+
+def syntax():
+    """Syntax"""
+    print("Syntax: benchmark.py [options]")
+    print(" Options:")
+    print("   -n <sizes> : Comma separated number of logs (default 100,1000)")
+    print("   -d <depth> : Number of categories in log names (default 3)")
+    print("   -c <counters> : Extra (unparsed) perf counters per log (default 0)")
+    print("   -s <seed> : Seed of the log generator (default 0)")
+    print("   -o <file> : Write JSON results to file (default stdout)")
+    print("   -e : Skip the end-to-end aggregate.py run")
+    sys.exit(2)
+
+def main():
+    """Main"""
+    sizes = [100, 1000]
+    depth = 3
+    counters = 0
+    seed = 0
+    output = None
+    end_to_end = True
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], 'n:d:c:s:o:e')
+        for opt, arg in opts:
+            if opt == '-n':
+                sizes = [int(float(size)) for size in arg.split(',')]
+            elif opt == '-d':
+                depth = int(arg)
+            elif opt == '-c':
+                counters = int(arg)
+            elif opt == '-s':
+                seed = int(arg)
+            elif opt == '-o':
+                output = arg
+            elif opt == '-e':
+                end_to_end = False
+    except (getopt.GetoptError, ValueError):
+        syntax()
+    if args or depth < 1 or counters < 0 or min(sizes) < 1:
+        syntax()
+
+    report = {'python': platform.python_version(),
+              'numpy': np.__version__,
+              'machine': platform.machine(),
+              'results': list()}
+    for num_logs in sizes:
+        report['results'].append(bench(num_logs, depth, counters, seed,
+                                       end_to_end))
+
+    if output:
+        with open(output, 'w') as out:
+            json.dump(report, out, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
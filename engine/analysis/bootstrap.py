@@ -0,0 +1,158 @@
+"""
+ Bootstrap Module - confidence intervals for group statistics by resampling
+
+ Small groups (2~4 logs) give very noisy point estimates. Resampling the group
+ with replacement gives an interval around the statistic, which tells how much
+ a flag can be trusted.
+
+ All resamples are computed in one batch: a single (resamples x size) index
+ matrix is drawn and applied to every group of the same size at once. The
+ random generator is seeded, so the output is stable for the same input.
+
+ Usage:
+   boot = Bootstrap({'statistic': 'median', 'resamples': 1000})
+   boot.set_data([...data...])
+   boot.run()
+   print(boot.get_value('ci'))
+
+   # Many groups at once (list of lists/arrays, any sizes)
+   intervals = batch_intervals(groups, 'mean')
+
+ [1] B. Efron, R. Tibshirani (1993) "An Introduction to the Bootstrap"
+"""
+
+import numpy as np
+from analysis.base import AnalysisBase
+
+STATISTICS = {
+    'mean': np.mean,
+    'median': np.median,
+    'stdev': np.std,
+    'min': np.min,
+    'max': np.max,
+}
+
+# Order statistics: (lower, upper) rank as a function of size, averaged
+ORDER = {
+    'median': lambda size: ((size - 1) // 2, size // 2),
+    'min': lambda size: (0, 0),
+    'max': lambda size: (size - 1, size - 1),
+}
+
+# Upper bound on elements of a resampled batch (groups x resamples x size)
+BATCH_ELEMENTS = 1 << 22
+
+def _statistic(statistic):
+    """Returns the numpy reduction for the statistic name"""
+    if statistic not in STATISTICS:
+        raise ValueError("Unknown statistic '" + str(statistic) + "'")
+    return STATISTICS[statistic]
+
+def _index(size, resamples, seed):
+    """One index matrix for all groups of the same size"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, size, (resamples, size))
+
+def intervals(matrix, statistic='mean', resamples=1000, confidence=0.95,
+              seed=0):
+    """Confidence intervals for each row of a 2D array of equal sized groups,
+       returns an array (rows x 2) with the low and high bounds"""
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.ndim != 2:
+        raise ValueError("Groups must be a 2D array")
+    func = _statistic(statistic)
+    index = _index(matrix.shape[1], resamples, seed)
+    if statistic in ORDER:
+        # With sorted rows and sorted indices, each resample is sorted too, so
+        # order statistics are a gather of one or two columns, no sorting
+        matrix = np.sort(matrix, axis=1)
+        index = np.sort(index, axis=1)
+        lower, upper = ORDER[statistic](matrix.shape[1])
+    tail = (1.0 - confidence) / 2.0 * 100.0
+    bounds = np.empty((matrix.shape[0], 2))
+    step = max(1, BATCH_ELEMENTS // index.size)
+    for start in range(0, matrix.shape[0], step):
+        chunk = matrix[start:start+step]
+        if statistic in ORDER:
+            stats = (chunk[:, index[:, lower]] + chunk[:, index[:, upper]]) / 2.0
+        else:
+            stats = func(chunk[:, index], axis=-1)
+        bounds[start:start+step] = np.percentile(stats, [tail, 100.0 - tail],
+                                                 axis=-1).T
+    return bounds
+
+def batch_intervals(groups, statistic='mean', resamples=1000, confidence=0.95,
+                    seed=0):
+    """Confidence intervals for a list of groups of any size, batched by size,
+       returns a list of (low, high) in the same order as groups"""
+    by_size = dict()
+    for pos, group in enumerate(groups):
+        by_size.setdefault(len(group), list()).append(pos)
+    result = [None] * len(groups)
+    for size, positions in by_size.items():
+        if size == 0:
+            raise ValueError("Can't resample empty groups")
+        matrix = np.array([groups[pos] for pos in positions], dtype=float)
+        bounds = intervals(matrix, statistic, resamples, confidence, seed)
+        for pos, bound in zip(positions, bounds):
+            result[pos] = (float(bound[0]), float(bound[1]))
+    return result
+
+def permutation_test(first, second, statistic='mean', resamples=1000, seed=0):
+    """Two-sided p-value of the difference of statistic between two groups,
+       by shuffling the group labels (all permutations in one batch)"""
+    first = np.asarray(first, dtype=float)
+    second = np.asarray(second, dtype=float)
+    func = _statistic(statistic)
+    pooled = np.concatenate((first, second))
+    observed = abs(func(first) - func(second))
+    rng = np.random.default_rng(seed)
+    perms = np.argsort(rng.random((resamples, len(pooled))), axis=1)
+    shuffled = pooled[perms]
+    diff = np.abs(func(shuffled[:, :len(first)], axis=1) -
+                  func(shuffled[:, len(first):], axis=1))
+    return float((np.count_nonzero(diff >= observed) + 1) / (resamples + 1))
+
+class Bootstrap(AnalysisBase):
+    """Confidence interval of a group statistic"""
+    def __init__(self, options=None):
+        super().__init__(options)
+        if 'statistic' not in self.options:
+            self.options['statistic'] = 'mean'
+        _statistic(self.options['statistic'])
+        if 'resamples' in self.options:
+            if not isinstance(self.options['resamples'], int):
+                raise ValueError("Resamples must be int")
+        else:
+            self.options['resamples'] = 1000
+        if 'confidence' not in self.options:
+            self.options['confidence'] = 0.95
+        if 'seed' not in self.options:
+            self.options['seed'] = 0
+
+    def _run(self):
+        """Resample data, calculate value, interval and relative width"""
+        func = _statistic(self.options['statistic'])
+        value = float(func(self.data))
+        bounds = intervals(self.data[None, :], self.options['statistic'],
+                           self.options['resamples'],
+                           self.options['confidence'], self.options['seed'])
+        self.results['value'] = value
+        self.results['ci'] = (float(bounds[0][0]), float(bounds[0][1]))
+        if value:
+            self.results['width'] = abs((bounds[0][1] - bounds[0][0]) / value)
+        else:
+            self.results['width'] = float('inf')
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Bootstrap"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ " + self.options['statistic'] + ", "
+        string += repr(self.options['resamples']) + " resamples"
+        if 'ci' in self.results:
+            string += " -> " + repr(self.results['ci'])
+        string += " ]"
+        return string
@@ -0,0 +1,138 @@
+"""
+ Analysis Cache - Memoizes analysis passes by (pass, options, input data)
+
+ Running a pass on the same values with the same options always gives the
+ same results, so finished plugins are kept in an LRU cache keyed by the
+ pass' class, its options and a hash of the input (and x axis), and handed
+ back instead of running again. The cache has a memory budget (estimated
+ from the arrays each plugin holds), least recently used entries are evicted
+ when it's full.
+
+ Cached plugins are shared: callers must only read their results.
+
+ Usage:
+   plugin = CACHE.run(Outliers, {'threshold': 3.5}, [1.0, 2.0, 9.0])
+   plugin.get_value('flags')
+   CACHE.hits, CACHE.misses
+"""
+
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from instrument import STATS
+
+# Default memory budget, in bytes
+BUDGET = 64 << 20
+# Fixed cost of an entry (plugin, dictionaries, key)
+ENTRY_SIZE = 1024
+
+def _digest(values):
+    """Short hash of the contents of an array (or list of numbers)"""
+    array = np.ascontiguousarray(values, dtype=float)
+    digest = hashlib.blake2b(array.tobytes(), digest_size=16)
+    digest.update(repr(array.shape).encode())
+    return digest.digest()
+
+def _freeze(value):
+    """Hashable version of an option value"""
+    if isinstance(value, np.ndarray):
+        return ('array', _digest(value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(val)) for key, val in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+def _sizeof(value):
+    """Rough size in bytes of results: arrays and lists of numbers"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_sizeof(val) for val in value.values())
+    if isinstance(value, (list, tuple)):
+        return 8 * len(value) + sum(_sizeof(val) for val in value
+                                    if isinstance(val, (np.ndarray, list, dict)))
+    return 0
+
+class AnalysisCache:
+    """LRU cache of finished analysis plugins with a memory budget"""
+    def __init__(self, budget=BUDGET):
+        self.entries = OrderedDict()
+        self.budget = budget
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_budget(self, budget):
+        """Changes the memory budget (bytes, 0 disables), evicting if needed"""
+        if not isinstance(budget, int) or budget < 0:
+            raise ValueError("Cache budget must be a positive number of bytes")
+        self.budget = budget
+        self._evict()
+
+    def clear(self):
+        """Drops all entries (counters are kept)"""
+        self.entries.clear()
+        self.size = 0
+
+    @staticmethod
+    def key(cls, options, data, xaxis=None):
+        """Cache key of running pass 'cls' with options on data"""
+        return (cls.__module__ + '.' + cls.__name__, _freeze(options),
+                _digest(data), None if xaxis is None else _digest(xaxis))
+
+    def run(self, cls, options, data, xaxis=None):
+        """Returns a plugin of class cls that ran on data (and xaxis) with a
+           copy of options, from the cache if it ran before"""
+        key = self.key(cls, options, data, xaxis)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            STATS.count('analysis cache hits')
+            return entry[0]
+        self.misses += 1
+        STATS.count('analysis cache misses')
+
+        plugin = cls(dict(options))
+        if xaxis is not None:
+            plugin.set_option('xaxis', xaxis)
+        plugin.set_data(list(data))
+        plugin.run()
+
+        size = ENTRY_SIZE + _sizeof(plugin.results) + _sizeof(plugin.data)
+        if size <= self.budget:
+            self.entries[key] = (plugin, size)
+            self.size += size
+            self._evict()
+        return plugin
+
+    def _evict(self):
+        """Drops least recently used entries until within budget"""
+        while self.size > self.budget and self.entries:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            STATS.count('analysis cache evictions')
+
+    def __len__(self):
+        """Number of cached plugins"""
+        return len(self.entries)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "AnalysisCache"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ AnalysisCache: " + repr(len(self.entries)) + " entries, "
+        string += repr(self.size) + "/" + repr(self.budget) + " bytes, "
+        string += repr(self.hits) + " hit(s), " + repr(self.misses) + " miss(es) ]"
+        return string
+
+CACHE = AnalysisCache()
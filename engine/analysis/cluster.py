@@ -13,12 +13,14 @@
 import numpy as np
 from analysis.outlier import Outliers
 from analysis.outlier import AnalysisBase
+from analysis.cache import CACHE
 
 class Cluster:
     """Data class with a specific cluster"""
     def __init__(self, centre):
         self.data = list()
         self.centre = float(centre)
+        self.flags = np.zeros(0, dtype=bool)
 
     def set_data(self, data):
         """Override data, returns true if centre changed"""
@@ -39,9 +41,10 @@ class Cluster:
 
     def get_outliers(self):
         """Uses Outlier module to find outliers, if any"""
-        out = Outliers()
-        out.set_data(self.data)
-        out.run()
+        if not self.data:
+            return list()
+        out = CACHE.run(Outliers, dict(), self.data)
+        self.flags = out.get_value('flags')
         return out.get_value('outliers')
 
     def __str__(self):
@@ -77,7 +80,7 @@ class Clustering(AnalysisBase):
         for cent in centres:
             self.results['clusters'].append(Cluster(cent))
         # List of points and centres they belong to
-        belongs = np.zeros(len(self.data), np.int)
+        belongs = np.zeros(len(self.data), int)
 
         # While centres move around (or up to max_iter)
         for _ in range(self.max_iter):
@@ -101,9 +104,19 @@ class Clustering(AnalysisBase):
             if not changed:
                 break
 
-        # Find outliers on each cluster
-        for cluster in self.results['clusters']:
+        # Find outliers on each cluster, flag them in input order
+        self.results['belongs'] = belongs
+        # Centre of the biggest cluster stands for the whole group
+        biggest = np.argmax(np.bincount(belongs, minlength=num_clusters))
+        self.results['centre'] = self.results['clusters'][biggest].centre
+        self.results['flags'] = np.zeros(len(self.data), dtype=bool)
+        self.results['reference'] = np.zeros(len(self.data))
+        for cent, cluster in enumerate(self.results['clusters']):
+            members = np.flatnonzero(belongs == cent)
             self.results['outliers'].extend(cluster.get_outliers())
+            if members.size:
+                self.results['flags'][members] = cluster.flags
+                self.results['reference'][members] = np.median(self.data[members])
 
     def __str__(self):
         """Class name, for lists"""
@@ -0,0 +1,199 @@
+"""
+ Distribution - Vectorised CDFs for the significance tests used by the passes
+
+ Scipy is not a requirement, so the few distribution functions the analysis
+ needs are implemented here on top of numpy. All functions accept scalars or
+ arrays and broadcast like numpy ufuncs.
+
+ Running statistics (Welford's algorithm) give the mean, stdev and the
+ confidence interval of values as they come, without keeping them.
+
+ Usage:
+   pval = t_pvalue([2.0, 3.1], [10, 4])   # two-sided p-values
+   pval = norm_pvalue(1.96)               # ~0.05
+   crit = t_ppf(0.975, 4)                 # ~2.776
+   crit = chi2_ppf(0.975, 3)              # ~9.35 (Wilson-Hilferty [2])
+   crit = f_ppf(0.95, 3, 10)              # ~3.71
+   stats = RunningStats()
+   stats.update(1.2)
+   stats.update(1.3)
+   stats.ci_width(0.95)                   # relative width of the 95% CI
+
+ [1] W. H. Press et al. (2007) "Numerical Recipes", 3rd ed., section 6.4
+ [2] E. B. Wilson, M. M. Hilferty (1931) "The distribution of chi-square",
+     PNAS 17(12), 684-688
+"""
+
+import math
+import numpy as np
+
+_LGAMMA = np.vectorize(math.lgamma, otypes=[float])
+_ERFC = np.vectorize(math.erfc, otypes=[float])
+_TINY = 1e-300
+_EPS = 1e-15
+_MAX_ITER = 300
+
+def _betacf(a, b, x):
+    """Continued fraction for the incomplete beta function (modified Lentz)"""
+    qab = a + b
+    qap = a + 1.0
+    qam = a - 1.0
+    c = np.ones_like(x)
+    d = 1.0 - qab * x / qap
+    d = np.where(np.abs(d) < _TINY, _TINY, d)
+    d = 1.0 / d
+    h = d
+    for m in range(1, _MAX_ITER + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = np.where(np.abs(d) < _TINY, _TINY, d)
+        c = 1.0 + aa / c
+        c = np.where(np.abs(c) < _TINY, _TINY, c)
+        d = 1.0 / d
+        h = h * d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = np.where(np.abs(d) < _TINY, _TINY, d)
+        c = 1.0 + aa / c
+        c = np.where(np.abs(c) < _TINY, _TINY, c)
+        d = 1.0 / d
+        delta = d * c
+        h = h * delta
+        if np.all(np.abs(delta - 1.0) < _EPS):
+            break
+    return h
+
+def betainc(a, b, x):
+    """Regularised incomplete beta function I_x(a, b)"""
+    a, b, x = np.broadcast_arrays(np.asarray(a, dtype=float),
+                                  np.asarray(b, dtype=float),
+                                  np.asarray(x, dtype=float))
+    inner = np.clip(x, _TINY, 1.0 - 1e-16)
+    # The continued fraction converges fast below (a+1)/(a+b+2), use symmetry
+    flip = inner > (a + 1.0) / (a + b + 2.0)
+    fa = np.where(flip, b, a)
+    fb = np.where(flip, a, b)
+    fx = np.where(flip, 1.0 - inner, inner)
+    lbeta = _LGAMMA(fa + fb) - _LGAMMA(fa) - _LGAMMA(fb)
+    front = np.exp(np.log(fx) * fa + np.log1p(-fx) * fb + lbeta) / fa
+    result = front * _betacf(fa, fb, fx)
+    result = np.where(flip, 1.0 - result, result)
+    result = np.where(x <= 0.0, 0.0, result)
+    result = np.where(x >= 1.0, 1.0, result)
+    return result
+
+def t_pvalue(tval, dof):
+    """Two-sided p-value of Student's t statistic with 'dof' degrees of freedom"""
+    tval = np.asarray(tval, dtype=float)
+    dof = np.asarray(dof, dtype=float)
+    return betainc(dof / 2.0, 0.5, dof / (dof + tval**2))
+
+def t_cdf(tval, dof):
+    """Cumulative distribution function of Student's t"""
+    tval = np.asarray(tval, dtype=float)
+    half = t_pvalue(tval, dof) / 2.0
+    return np.where(tval < 0, half, 1.0 - half)
+
+def norm_pvalue(zval):
+    """Two-sided p-value of a standard normal statistic"""
+    zval = np.asarray(zval, dtype=float)
+    return _ERFC(np.abs(zval) / math.sqrt(2.0))
+
+def norm_cdf(zval):
+    """Cumulative distribution function of the standard normal"""
+    zval = np.asarray(zval, dtype=float)
+    return 0.5 * _ERFC(-zval / math.sqrt(2.0))
+
+def t_ppf(prob, dof):
+    """Quantile of Student's t (inverse of t_cdf), by bisection"""
+    prob = np.asarray(prob, dtype=float)
+    dof = np.asarray(dof, dtype=float)
+    low = np.full(np.broadcast(prob, dof).shape, -1e6)
+    high = np.full(low.shape, 1e6)
+    for _ in range(100):
+        mid = (low + high) / 2.0
+        below = t_cdf(mid, dof) < prob
+        low = np.where(below, mid, low)
+        high = np.where(below, high, mid)
+    return (low + high) / 2.0
+
+def norm_ppf(prob):
+    """Quantile of the standard normal (inverse of norm_cdf), by bisection"""
+    prob = np.asarray(prob, dtype=float)
+    low = np.full(prob.shape, -40.0)
+    high = np.full(prob.shape, 40.0)
+    for _ in range(64):
+        mid = (low + high) / 2.0
+        below = norm_cdf(mid) < prob
+        low = np.where(below, mid, low)
+        high = np.where(below, high, mid)
+    return (low + high) / 2.0
+
+def chi2_ppf(prob, dof):
+    """Quantile of chi-square with 'dof' degrees of freedom, by the
+       Wilson-Hilferty cube root approximation (within 1% from 3 dof)"""
+    dof = np.asarray(dof, dtype=float)
+    spread = 2.0 / (9.0 * dof)
+    return dof * np.maximum(1.0 - spread + norm_ppf(prob) * np.sqrt(spread), 0.0)**3
+
+def f_ppf(prob, dfn, dfd):
+    """Quantile of Fisher's F(dfn, dfd), by bisection of the incomplete beta
+       function: F = dfd y / (dfn (1 - y)) with y ~ Beta(dfn/2, dfd/2)"""
+    prob, dfn, dfd = np.broadcast_arrays(np.asarray(prob, dtype=float),
+                                         np.asarray(dfn, dtype=float),
+                                         np.asarray(dfd, dtype=float))
+    low = np.zeros(prob.shape)
+    high = np.ones(prob.shape)
+    for _ in range(64):
+        mid = (low + high) / 2.0
+        below = betainc(dfn / 2.0, dfd / 2.0, mid) < prob
+        low = np.where(below, mid, low)
+        high = np.where(below, high, mid)
+    ratio = (low + high) / 2.0
+    return dfd * ratio / (dfn * (1.0 - ratio))
+
+class RunningStats:
+    """Count, mean and variance of values as they come (Welford)"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        """Adds a value"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def variance(self):
+        """Sample variance (nan with fewer than two values)"""
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    def stdev(self):
+        """Sample standard deviation"""
+        return math.sqrt(self.variance())
+
+    def ci_width(self, confidence=0.95):
+        """Width of the confidence interval of the mean, relative to the
+           mean (inf with fewer than two values, or a zero mean that varies)"""
+        if self.count < 2:
+            return math.inf
+        if not self.m2:
+            return 0.0
+        if not self.mean:
+            return math.inf
+        crit = float(t_ppf(0.5 + confidence / 2.0, self.count - 1))
+        return 2.0 * crit * self.stdev() / math.sqrt(self.count) / abs(self.mean)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "RunningStats"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        return ("[ RunningStats: " + repr(self.count) + " value(s), mean " +
+                repr(self.mean) + " ]")
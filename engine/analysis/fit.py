@@ -14,17 +14,27 @@
 import numpy as np
 from analysis.outlier import AnalysisBase
 
+# Deviations are relative to the fitted value, but never to less than this
+# fraction of the group's scale (mean absolute value) or this absolute floor
+SCALE_FLOOR = 0.01
+ABSOLUTE_FLOOR = 1e-9
+# Fitted values this close to zero (relative to the scale) are float noise
+ZERO = 1e-9
+
 class CurveFit(AnalysisBase):
     """Curve Fit"""
     def __init__(self, options):
         super().__init__(options)
         self.residual = None
         self.poly = None
+        # Relative distance from the curve for a point to be flagged
+        if 'tolerance' not in self.options:
+            self.options['tolerance'] = 0.1
 
     def _xaxis(self):
         if 'xaxis' in self.options:
             xaxis = self.options['xaxis']
-            if not isinstance(self.data, list) or len(self.data) != len(xaxis):
+            if len(self.data) != len(xaxis):
                 raise ValueError("'xaxis' must have the same length as data")
         else:
             xaxis = np.linspace(0, len(self.data)-1, len(self.data), dtype=int)
@@ -56,6 +66,12 @@ class CurveFit(AnalysisBase):
         if not isinstance(degree, int) or degree < 1:
             raise ValueError("degree must be integer > 1")
 
+        # Not enough points to judge a fit, every point is on the curve
+        self.results['flags'] = np.zeros(len(self.data), dtype=bool)
+        self.results['reference'] = self.data
+        if len(self.data) <= degree:
+            return
+
         xaxis = self._xaxis()
         poly = np.polyfit(xaxis, self.data, degree)
         residual = np.polyval(poly, xaxis)
@@ -64,11 +80,24 @@ class CurveFit(AnalysisBase):
         self.results['residual'] = residual
         self.results['quality'] = self._quality()
 
-    def get_value(self, key):
-        """Specialise to recalculate quality, optimal may have changed"""
-        if key == 'quality' and self.done:
+        # Points too far from the fitted curve, relative to it but not to
+        # values that are tiny for the group (an exact fit of zeros gives
+        # 1e-15, not a reference worth a relative deviation)
+        scale = float(np.mean(np.abs(self.data)))
+        floor = max(SCALE_FLOOR * scale, ABSOLUTE_FLOOR)
+        distance = np.abs(self.data - residual) / np.maximum(np.abs(residual), floor)
+        zero = np.abs(residual) <= max(ZERO * scale, ABSOLUTE_FLOOR)
+        distance[zero] = 0.0
+        self.results['reference'] = residual
+        self.results['flags'] = distance > self.options['tolerance']
+        # How far from the curve the group is, as a whole (relative RMS)
+        self.results['error'] = float(np.sqrt(np.mean(distance**2)))
+
+    def set_option(self, key, value):
+        """Specialise to recalculate quality once, if optimal changed"""
+        super().set_option(key, value)
+        if key == 'optimal' and self.done and 'residual' in self.results:
             self.results['quality'] = self._quality()
-        return super().get_value(key)
 
     def __str__(self):
         """Class name, for lists"""
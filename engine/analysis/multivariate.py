@@ -0,0 +1,324 @@
+"""
+ Multivariate Module - outlier logs on all their counters at once
+
+ Per-metric passes can't see a log whose cycles, branch-misses and page-faults
+ are each normal but whose combination is not, and 20 counters analysed one
+ by one flag the same log many times over (they are correlated). Here each
+ log of a group is a point (its vector of counters) and its robust
+ Mahalanobis distance to the group is tested at significance 'alpha', as a
+ new observation against the mean and covariance of the m good logs [2]:
+ p(m-1)(m+1)/(m(m-p)) F(p, m-p), which tends to chi-square for large groups.
+
+ The robust estimate still under-covers small groups (it trims good logs,
+ the covariance shrinks), so below 200 logs the bound is multiplied by a
+ small-sample correction factor: how far above it clean Gaussian groups of
+ the same shape go at the 1-alpha quantile, simulated through the same
+ estimator (which is affine equivariant, any covariance will do), seeded
+ and cached by shape (a fraction of a second each).
+
+ Groups of fewer than 8 logs are too small for a covariance, nothing is
+ flagged there.
+
+ Location and covariance are MCD-style [1]: the h logs (three quarters)
+ with the smallest covariance determinant, found by concentration steps
+ from many starting subsets, all subsets at once (batched covariance,
+ inversion and distances), then reweighted. Counters are first centred and
+ scaled by their median and MAD. Correlations are only shrunk, by p/(p+h),
+ when there are no more logs in the subset h than counters p, so that it
+ can be inverted. Groups of more than 1500 logs are searched on a sample,
+ then refined on all logs. The starting subsets are drawn from a seeded
+ generator: same input, same output.
+
+ The contribution of a counter is what it adds to a log's squared distance
+ given all the other counters, (S^-1 (x-m))_j^2 / (S^-1)_jj: how far it is
+ from what the others predict (cycles for their instructions), and the
+ biggest ones, that make up most of the total, are reported for each log.
+
+ Usage:
+   multi = Multivariate({'alpha': 0.01, 'metrics': ['cycles', 'page-faults']})
+   multi.set_data([[1.2e9, 100.0], [1.3e9, 120.0], ...])   # logs x counters
+   multi.run()
+   multi.get_value('flags'), multi.get_value('distances')
+   multi.get_value('contributors')   # ex. 'page-faults+cycles', by log
+
+ [1] P. J. Rousseeuw and K. Van Driessen (1999) "A Fast Algorithm for the
+     Minimum Covariance Determinant Estimator", Technometrics 41(3), 212-223
+ [2] J. Hardin and D. M. Rocke (2005) "The Distribution of Robust Distances",
+     Journal of Computational and Graphical Statistics 14(4), 928-946
+"""
+
+import numpy as np
+from analysis.base import AnalysisBase
+from analysis.distribution import chi2_ppf, f_ppf
+
+# Starting subsets and concentration steps of the MCD search
+SUBSETS = 50
+STEPS = 20
+SEED = 0
+# Fraction of the logs in the MCD subset: up to a quarter can be outliers
+COVER = 0.75
+# Larger groups are searched on a sample of this many logs first
+SAMPLE = 1500
+# Logs with a larger distance are left out of the reweighted estimate
+REWEIGHT = 0.975
+# Smaller groups can't give a covariance, leave them to per-metric passes
+MIN_LOGS = 8
+# At most this many counters are named as contributors of a flagged log
+CONTRIBUTORS = 3
+# Smaller groups have their bound corrected by simulation: distances pooled
+# over POOL logs of clean groups of the same shape, at least TAIL above it
+CALIBRATE = 200
+POOL = 4000
+TAIL = 20
+_SIMULATED = dict()
+_CORRECTIONS = dict()
+# Bounds already computed, by (alpha, counters, logs)
+_BOUNDS = dict()
+# Smallest shrinkage of the correlations
+RIDGE = 1e-9
+
+def _standardise(matrix):
+    """Centres columns on their median and scales them by their MAD (mean
+       absolute deviation if MAD is zero). Returns the points and the mask
+       of the columns kept (constant ones carry no information)"""
+    centre = np.median(matrix, axis=0)
+    deviation = np.abs(matrix - centre)
+    scale = 1.4826 * np.median(deviation, axis=0)
+    scale = np.where(scale > 0, scale, 1.253314 * np.mean(deviation, axis=0))
+    keep = scale > 0
+    return (matrix[:, keep] - centre[keep]) / scale[keep], keep
+
+def _estimates(points, subsets, shrink):
+    """Mean and shrunk covariance of each subset (rows of indices), batched"""
+    chosen = points[subsets]
+    means = chosen.mean(axis=1)
+    centred = chosen - means[:, None, :]
+    covs = np.matmul(centred.transpose(0, 2, 1), centred)
+    covs /= max(subsets.shape[1] - 1, 1)
+    # Towards the variances (correlations shrink, variances stay), a ridge
+    # so that exact fits (ex. a counter twice the other) can be inverted
+    diagonal = np.maximum(np.diagonal(covs, axis1=1, axis2=2), 1e-12)
+    shrink = max(shrink, RIDGE)
+    covs *= 1.0 - shrink
+    covs += shrink * diagonal[:, :, None] * np.eye(points.shape[1])
+    return means, covs
+
+def _distances(points, means, covs):
+    """Squared Mahalanobis distances of all points to each estimate"""
+    inverse = np.linalg.inv(covs)
+    diff = points[None, :, :] - means[:, None, :]
+    return np.sum(np.matmul(diff, inverse) * diff, axis=2)
+
+def _size(count, dims):
+    """Points of the MCD subset: a fraction COVER of them (at least
+       (n+p+1)/2, more than half), less than n"""
+    size = max(int(COVER * count), (count + dims + 1) // 2)
+    return max(count // 2 + 1, min(size, count - 1))
+
+def _concentrate(points, subsets, size, shrink):
+    """Concentration steps on all subsets at once, until none changes"""
+    for _ in range(STEPS):
+        means, covs = _estimates(points, subsets, shrink)
+        dist = _distances(points, means, covs)
+        # Concentration: the 'size' nearest points never increase the
+        # determinant
+        closest = np.sort(np.argsort(dist, axis=1, kind='stable')[:, :size], axis=1)
+        if np.array_equal(closest, subsets):
+            break
+        subsets = closest
+    return subsets
+
+def mcd(points):
+    """Robust location and covariance of points (n x p): the subset of about
+       half the points whose (shrunk) covariance has the smallest
+       determinant, by concentration steps from many starts. Large sets are
+       searched on a sample first, and only the best start goes on with all
+       the points. Returns the mean, the covariance and the shrinkage"""
+    count, dims = points.shape
+    size = _size(count, dims)
+    # Only with too few points for their dimensions: counters are often
+    # strongly correlated (cycles and instructions), and the thinnest
+    # directions are where the outliers show
+    shrink = dims / (dims + size) if size <= dims else 0.0
+    rng = np.random.default_rng(SEED)
+    sample = points
+    if count > SAMPLE:
+        sample = points[np.sort(rng.permutation(count)[:SAMPLE])]
+    part = _size(len(sample), dims)
+    subsets = np.argsort(rng.random((SUBSETS, len(sample))), axis=1)[:, :part]
+    # And the points nearest the coordinate-wise median
+    nearest = np.argsort(np.sum(sample**2, axis=1), kind='stable')[:part]
+    subsets = np.sort(np.vstack([nearest[None, :], subsets]), axis=1)
+    subsets = _concentrate(sample, subsets, part, shrink)
+    means, covs = _estimates(sample, subsets, shrink)
+    best = int(np.argmin(np.linalg.slogdet(covs)[1]))
+    if sample is not points:
+        dist = _distances(points, means[best:best + 1], covs[best:best + 1])
+        start = np.sort(np.argsort(dist, axis=1, kind='stable')[:, :size], axis=1)
+        subsets = _concentrate(points, start, size, shrink)
+        means, covs = _estimates(points, subsets, shrink)
+        best = 0
+    return means[best], covs[best], shrink
+
+def _constants(dims):
+    """Chi-square median and reweighting cutoff of 'dims' dimensions"""
+    return float(chi2_ppf(0.5, dims)), float(chi2_ppf(REWEIGHT, dims))
+
+def estimate(points, constants):
+    """MCD estimate of standardised points, reweighted on the points within
+       the REWEIGHT quantile until they don't change (small groups leave out
+       good points at first, they come back). Returns the mean, the
+       covariance (consistent with chi-square at the median) and the indices
+       of the points it's made of"""
+    count, dims = points.shape
+    median, cutoff = constants
+    mean, cov, shrink = mcd(points)
+    good = np.arange(count)
+    for _ in range(STEPS):
+        dist = _distances(points, mean[None, :], cov[None, :, :])[0]
+        middle = np.median(dist) or 1.0
+        cov *= middle / median
+        within = np.flatnonzero(dist * median <= cutoff * middle)
+        if len(within) <= dims + 1 or np.array_equal(within, good):
+            break
+        good = within
+        means, covs = _estimates(points, good[None, :], shrink)
+        mean, cov = means[0], covs[0]
+    return mean, cov, good
+
+def _bound(prob, dims, sizes):
+    """Squared distance bound of a new point against the mean and covariance
+       of m points (Hotelling), for all m in sizes at once"""
+    sizes = np.maximum(np.asarray(sizes, dtype=float), dims + 2)
+    return (dims * (sizes - 1) * (sizes + 1) / (sizes * (sizes - dims)) *
+            f_ppf(prob, dims, sizes - dims))
+
+def _simulate(count, dims):
+    """Squared distances and numbers of good points of clean (Gaussian)
+       groups of a shape, through the same estimator (affine equivariant,
+       any covariance will do), about POOL distances, seeded and cached"""
+    key = (count, dims)
+    if key not in _SIMULATED:
+        rng = np.random.default_rng(SEED)
+        constants = _constants(dims)
+        dists, sizes = list(), list()
+        for _ in range(-(-POOL // count)):
+            points, _ = _standardise(rng.normal(size=(count, dims)))
+            mean, cov, good = estimate(points, constants)
+            dists.append(_distances(points, mean[None, :], cov[None, :, :])[0])
+            sizes.append(np.full(count, len(good)))
+        _SIMULATED[key] = (np.concatenate(dists), np.concatenate(sizes))
+    return _SIMULATED[key]
+
+def correction(count, dims, alpha):
+    """Small-sample correction factor of the bound at significance alpha:
+       how far above it the simulated clean groups go at that quantile (or
+       the highest one with TAIL distances above it)"""
+    key = (count, dims, alpha)
+    if key not in _CORRECTIONS:
+        dists, sizes = _simulate(count, dims)
+        prob = min(1.0 - alpha, 1.0 - TAIL / len(dists))
+        ratios = dists / _bound(prob, dims, np.arange(count + 1))[sizes]
+        _CORRECTIONS[key] = float(np.quantile(ratios, prob))
+    return _CORRECTIONS[key]
+
+class Multivariate(AnalysisBase):
+    """Robust Mahalanobis distances of the logs of a group, on all counters"""
+    # Takes a logs x counters matrix, not one metric at a time
+    multivariate = True
+
+    def __init__(self, options=None):
+        super().__init__(options)
+        # Mandatory options
+        if 'alpha' in self.options:
+            if not isinstance(self.options['alpha'], float) or \
+               not 0.0 < self.options['alpha'] < 1.0:
+                raise ValueError("Alpha must be a float between 0 and 1")
+        else:
+            self.options['alpha'] = 0.01
+        # Optional: names of the counters (columns), for the contributors
+        if 'metrics' in self.options:
+            if not isinstance(self.options['metrics'], (list, tuple)):
+                raise ValueError("Metrics must be a list of names")
+
+    def set_data(self, data):
+        """Sets the logs x counters matrix (list of lists of floats)"""
+        if not isinstance(data, list):
+            raise TypeError("Analysis data should be a list")
+        self.data = np.array(data, dtype=float)
+        if self.data.ndim != 2 or not self.data.size:
+            raise ValueError("Multivariate data should be a non empty matrix"
+                             " (logs x counters)")
+
+    def _names(self):
+        """Names of the counters"""
+        metrics = self.options.get('metrics')
+        if metrics is None or len(metrics) != self.data.shape[1]:
+            return ['c' + repr(num) for num in range(self.data.shape[1])]
+        return list(metrics)
+
+    def _run(self):
+        """MCD estimate, reweighted, and distances against their F bound"""
+        count = len(self.data)
+        self.results['flags'] = np.zeros(count, dtype=bool)
+        self.results['distances'] = np.zeros(count)
+        self.results['reference'] = np.zeros(count)
+        self.results['contributors'] = [''] * count
+        # What the pass reports for each log
+        self.results['metric'] = 'distance'
+        self.results['values'] = self.results['distances']
+        points, keep = _standardise(self.data)
+        dims = points.shape[1]
+        # Small datasets (or nothing varies) can't have outliers
+        if count < MIN_LOGS or not dims:
+            self.done = True
+            return
+
+        mean, cov, good = estimate(points, _constants(dims))
+        inverse = np.linalg.inv(cov)
+        diff = points - mean
+        scaled = diff @ inverse
+        dist = np.sum(scaled * diff, axis=1)
+        # What each counter adds to the distance, given all the others
+        contributions = scaled**2 / np.diagonal(inverse)
+        key = (self.options['alpha'], dims, len(good))
+        if key not in _BOUNDS:
+            _BOUNDS[key] = float(_bound(1.0 - key[0], dims, len(good)))
+        critical = _BOUNDS[key]
+        if count < CALIBRATE:
+            critical *= correction(count, dims, self.options['alpha'])
+        flags = dist > critical
+
+        names = [name for name, kept in zip(self._names(), keep) if kept]
+        contributors = list()
+        for num in range(count):
+            order = np.argsort(-contributions[num], kind='stable')
+            total = contributions[num].sum()
+            share = np.cumsum(contributions[num][order]) / total if total else []
+            # The biggest ones, until they make up most of the distance
+            top = order[:min(CONTRIBUTORS, int(np.searchsorted(share, 0.5)) + 1)]
+            contributors.append('+'.join(names[col] for col in top))
+
+        self.results['flags'] = flags
+        self.results['distances'] = np.sqrt(np.maximum(dist, 0.0))
+        self.results['values'] = self.results['distances']
+        self.results['reference'] = np.full(count, np.sqrt(critical))
+        self.results['contributions'] = contributions
+        self.results['contributors'] = contributors
+        self.results['outliers'] = np.flatnonzero(flags).tolist()
+        self.results['num_outliers'] = int(np.count_nonzero(flags))
+        self.done = True
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Multivariate"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ alpha: " + repr(self.options['alpha']) + ", "
+        if 'num_outliers' in self.results:
+            string += repr(self.results['num_outliers']) + " outlier log(s) on "
+        if self.data is not None:
+            string += repr(len(self.data)) + " logs"
+        string += " ]"
+        return string
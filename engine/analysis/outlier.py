@@ -2,6 +2,24 @@
  Outlier Module - detect outliers based on the Grubs test [1].
  According to [2], threshold is 3.5 and MZS=0.6745(Xi-Xmed)/MAD
 
+ Methods (data string: outlier=N for the default, outlier=<method>:N):
+  * mzs : modified z-score above N (default 3.5) [2]. When more than half
+          the values are equal (MAD = 0), the mean absolute deviation is used
+          instead, MZS=(Xi-Xmed)/(1.253314*MeanAD)
+  * esd : generalized ESD, Rosner's test of up to half the values (at most
+          100, or the max_outliers option) at significance N (default 0.05),
+          for many outliers at once [3]
+  * iqr : Tukey's fences, N (default 1.5) interquartile ranges out of the
+          quartiles
+ Groups of 3 to 7 values are too small for any of them: Dixon's Q test of
+ the lowest and highest values is used instead [4], whatever the method, at
+ the 'significance' option: by default the threshold with esd, 0.05 with the
+ others. Critical values are tabulated at 0.10, 0.05 and 0.01, interpolated
+ (on the log of the significance) in between.
+
+ Medians and quartiles are found by selection (np.partition, linear time),
+ not by sorting, and everything is deterministic.
+
  Usage:
    out = Outlier([...data...], significance)
    out.find_outliers()
@@ -12,21 +30,171 @@
      "Volume 16: How to Detect and Handle Outliers"
      The ASQC Basic References in Quality Control: Statistical Techniques
      Edward F. Mykytka, Ph.D., Editor.
+ [3] Bernard Rosner (1983) "Percentage Points for a Generalized ESD
+     Many-Outlier Procedure", Technometrics 25(2), 165-172
+ [4] David B. Rorabacher (1991) "Statistical Treatment for Rejection of
+     Deviant Values", Analytical Chemistry 63(2), 139-146
 """
 
 import numpy as np
 from analysis.base import AnalysisBase
+from analysis.bootstrap import intervals
+from analysis.distribution import t_pvalue
+
+# Method -> default threshold
+METHODS = {'mzs': 3.5, 'esd': 0.05, 'iqr': 1.5}
+# Default upper bound of the number of outliers of the generalized ESD
+ESD_MAX = 100
+# Dixon's Q critical values by significance and group size, for the smallest
+# groups [4], and the default significance (other than esd)
+DIXON_Q = {
+    0.10: {3: 0.941, 4: 0.765, 5: 0.642, 6: 0.560, 7: 0.507},
+    0.05: {3: 0.970, 4: 0.829, 5: 0.710, 6: 0.625, 7: 0.568},
+    0.01: {3: 0.994, 4: 0.926, 5: 0.821, 6: 0.740, 7: 0.680},
+}
+DIXON_SIZES = range(3, 8)
+DIXON_ALPHA = 0.05
+
+def _select(values, position, fraction=0.0):
+    """Value at position of the sorted array, interpolated towards the next
+       one by fraction, with a single selection: the next one is the lowest
+       above (much cheaper than partitioning on both)"""
+    part = np.partition(values, position)
+    if not fraction:
+        return float(part[position])
+    return float(part[position] * (1.0 - fraction) +
+                 part[position + 1:].min() * fraction)
+
+def median(values):
+    """Median of a 1D array by selection, linear time"""
+    return _select(values, (len(values) - 1) // 2,
+                   0.0 if len(values) % 2 else 0.5)
+
+def quartiles(values):
+    """First and third quartiles of a 1D array (linearly interpolated, as
+       np.percentile), by selection"""
+    result = list()
+    for quarter in (0.25, 0.75):
+        position = quarter * (len(values) - 1)
+        result.append(_select(values, int(position), position - int(position)))
+    return result
+
+def modified_zscores(values, centre):
+    """Modified z-scores from the median absolute deviation, or the mean
+       absolute deviation when MAD is zero (all zero if all values equal)"""
+    diff = np.subtract(values, centre)
+    np.abs(diff, out=diff)
+    mad = median(diff)
+    if mad:
+        return 0.6745 * diff / mad
+    meanad = np.mean(diff)
+    if meanad:
+        return diff / (1.253314 * meanad)
+    return np.zeros(len(values))
+
+def esd_flags(values, alpha, max_outliers=None):
+    """Generalized ESD: the extreme value (lowest or highest) is removed up to
+       max_outliers times (half the values, at most ESD_MAX by default), and
+       the outliers are all removed up to the last step whose statistic is
+       above its critical value"""
+    count = len(values)
+    if max_outliers is None:
+        max_outliers = min((count - 1) // 2, ESD_MAX)
+    max_outliers = min(max_outliers, count - 2)
+    flags = np.zeros(count, dtype=bool)
+    if max_outliers < 1:
+        return flags
+    order = np.argsort(values, kind='stable')
+    # Centred, so that the running sums don't lose precision
+    ordered = values[order] - median(values)
+    sums = np.concatenate([[0.0], np.cumsum(ordered)])
+    squares = np.concatenate([[0.0], np.cumsum(ordered**2)])
+    low, high = 0, count - 1
+    removed = np.empty(max_outliers, dtype=np.int64)
+    stats = np.empty(max_outliers)
+    for step in range(max_outliers):
+        size = high - low + 1
+        total = sums[high + 1] - sums[low]
+        mean = total / size
+        var = (squares[high + 1] - squares[low] - total * mean) / (size - 1)
+        std = np.sqrt(max(var, 0.0))
+        below, above = mean - ordered[low], ordered[high] - mean
+        if above >= below:
+            removed[step], high = high, high - 1
+        else:
+            removed[step], low = low, low + 1
+        # All remaining values equal: nothing deviates
+        stats[step] = max(above, below) / std if std else 0.0
+
+    # R_i > lambda_i, as the t value that would give lambda_i = R_i against
+    # the critical t of (1 - alpha / 2(n-i+1), n-i-1), all steps at once
+    rest = count - np.arange(1, max_outliers + 1, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denom = rest**2 - stats**2 * (rest + 1)
+        tval = np.where(denom > 0, stats * np.sqrt((rest - 1) * (rest + 1) /
+                                                   np.abs(denom)), np.inf)
+    pvalue = np.where(np.isinf(tval), 0.0,
+                      t_pvalue(np.where(np.isinf(tval), 0.0, tval), rest - 1))
+    significant = np.flatnonzero(pvalue < alpha / (rest + 1))
+    if len(significant):
+        flags[order[removed[:significant[-1] + 1]]] = True
+    return flags
+
+def dixon_critical(count, alpha=DIXON_ALPHA):
+    """Dixon's Q critical value of a group of count values at significance
+       alpha, interpolated on log(alpha), the table's ends beyond it"""
+    levels = sorted(DIXON_Q)
+    alpha = min(max(alpha, levels[0]), levels[-1])
+    critical = [DIXON_Q[level][count] for level in levels]
+    return float(np.interp(np.log(alpha), np.log(levels), critical))
+
+def dixon_flags(values, alpha=DIXON_ALPHA):
+    """Dixon's Q test at significance alpha of the lowest and highest values
+       of a small group: gap to the nearest value over the range"""
+    flags = np.zeros(len(values), dtype=bool)
+    order = np.argsort(values, kind='stable')
+    ordered = values[order]
+    spread = ordered[-1] - ordered[0]
+    if not spread:
+        return flags
+    critical = dixon_critical(len(values), alpha)
+    if (ordered[1] - ordered[0]) / spread > critical:
+        flags[order[0]] = True
+    if (ordered[-1] - ordered[-2]) / spread > critical:
+        flags[order[-1]] = True
+    return flags
 
 class Outliers(AnalysisBase):
     """Utility class to calculate outliers in data sets"""
     def __init__(self, options=None):
         super().__init__(options)
+        # Optional: detection method (modified z-score by default)
+        method = self.options.setdefault('method', 'mzs')
+        if method not in METHODS:
+            raise ValueError("Outlier method must be one of " +
+                             ", ".join(METHODS))
         # Mandatory options
         if 'threshold' in self.options:
             if not isinstance(self.options['threshold'], float):
                 raise ValueError("Threshold must be float")
         else:
-            self.options['threshold'] = 3.5 # recommended default value
+            self.options['threshold'] = METHODS[method] # recommended default
+        # Optional: upper bound of the number of outliers (esd)
+        if 'max_outliers' in self.options:
+            if not isinstance(self.options['max_outliers'], int):
+                raise ValueError("Maximum number of outliers must be int")
+        # Optional: significance of Dixon's test of the smallest groups
+        if 'significance' in self.options:
+            if not isinstance(self.options['significance'], float) or \
+               not 0.0 < self.options['significance'] < 1.0:
+                raise ValueError("Significance must be float between 0 and 1")
+        else:
+            self.options['significance'] = (self.options['threshold']
+                                            if method == 'esd' else DIXON_ALPHA)
+        # Optional: number of bootstrap resamples for mean/stdev intervals
+        if 'bootstrap' in self.options:
+            if not isinstance(self.options['bootstrap'], int):
+                raise ValueError("Bootstrap resamples must be int")
 
     def set_data(self, data):
         """Sets data, makes sure np.array is in the right shape"""
@@ -41,29 +209,50 @@ class Outliers(AnalysisBase):
         self.results['stdev'] = np.std(self.data)
         # When only two points, also record the scale (0->1)
         if len(self.data) == 2:
-            self.results['scale'] = float(self.data[1] / self.data[0])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.results['scale'] = float(self.data[1][0] / self.data[0][0])
+        # Confidence intervals, so that small groups can be taken with salt
+        if self.options.get('bootstrap') and len(self.data):
+            for stat in ('mean', 'stdev'):
+                bounds = intervals(self.data.T, stat, self.options['bootstrap'])
+                self.results[stat + '_ci'] = (float(bounds[0][0]),
+                                             float(bounds[0][1]))
+
+    def _flags(self, values, centre):
+        """Outlier flags of 1D values, by the method in the options"""
+        if len(values) in DIXON_SIZES:
+            return dixon_flags(values, self.options['significance'])
+        method = self.options['method']
+        threshold = self.options['threshold']
+        if method == 'esd':
+            return esd_flags(values, threshold, self.options.get('max_outliers'))
+        if method == 'iqr':
+            first, third = quartiles(values)
+            fence = threshold * (third - first)
+            return (values < first - fence) | (values > third + fence)
+        return modified_zscores(values, centre) > threshold
 
     def _run(self):
         """MED based outlier test (better than percentile, see source)"""
+        # Values are 1D, the second axis is only there for the results
+        values = self.data[:, 0]
+        centre = median(values)
+        # Flags and reference (median) for each input point, in order
+        self.results['flags'] = np.zeros(len(self.data), dtype=bool)
+        self.results['reference'] = np.full(len(self.data), centre)
+
         # Small datasets can't have outlers
         if len(self.data) < 3:
             self.done = True
             return
 
-        # G = MAX(Xi - Xmed)/dev
-        median = np.median(self.data, axis=0)
-        diff = np.sqrt(np.sum((self.data - median)**2, axis=-1))
-
-        # Mi = 0.6745(Xi - Xmed)/MAD
-        mad = np.median(diff)
-        mzs = 0.6745 * diff / mad
-
         # Return array with bits set on which are the outliers
-        outliers_flags = mzs > self.options['threshold']
+        outliers_flags = self._flags(values, centre)
 
         # Store results
+        self.results['flags'] = outliers_flags
         self.results['outliers'] = self.data[outliers_flags].tolist()
-        self.results['num_outliers'] = np.count_nonzero(self.results['outliers'])
+        self.results['num_outliers'] = int(np.count_nonzero(outliers_flags))
 
         # Remove outliers from data
         self.data = self.data[np.logical_not(outliers_flags)]
@@ -77,7 +266,8 @@ class Outliers(AnalysisBase):
 
     def __repr__(self):
         """Pretty-printing"""
-        string = "[ threshold: " + repr(self.options['threshold']) + ", "
+        string = "[ " + self.options['method'] + " threshold: "
+        string += repr(self.options['threshold']) + ", "
         if 'outliers' in self.results:
             string += repr(len(self.results['outliers'])) + " outliers on "
             if self.results['outliers']:
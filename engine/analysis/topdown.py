@@ -0,0 +1,213 @@
+"""
+ TopDown Module - where the pipeline slots of each log go, and why a
+ configuration is slower than the others of its group [1]
+
+ Level 1 splits the slots in retiring, bad speculation, frontend and backend
+ bound, level 2 splits each of them in two (heavy/light operations, branch
+ mispredicts/machine clears, fetch latency/bandwidth, memory/core bound).
+ Where a level 2 split isn't known, its level 1 category is kept whole.
+
+ The breakdown of all the logs of a group is computed at once (columns of the
+ logs x counters matrix), from the first source that's there:
+  * tma_* metrics perf computed (percentages, also from perf stat --topdown)
+  * Icelake onwards raw events: topdown-retiring, topdown-bad-spec,
+    topdown-fe-bound, topdown-be-bound over their sum, and the level 2 ones
+    (topdown-heavy-ops, topdown-br-mispredict, topdown-fetch-lat,
+    topdown-mem-bound), their siblings being the rest of the parent
+  * Skylake raw events (level 1 only): topdown-fetch-bubbles,
+    topdown-slots-issued, topdown-slots-retired, topdown-recovery-bubbles
+    over topdown-total-slots, backend bound being the rest
+
+ Each fraction times the log's cycles is what the category costs it. Against
+ the group's median (of the costs in each category, and of the cycles), logs
+ slower by more than 'threshold' (relative, default 5%) are flagged, and
+ their difference is attributed to the category that grew the most: a log
+ 20% slower, all of it memory bound, is a memory problem, not a compiler
+ scheduling one.
+
+ Usage:
+   top = TopDown({'level': 2, 'metrics': ['cycles', 'tma_retiring', ...]})
+   top.set_data([[1.2e9, 35.1, ...], [1.3e9, 30.2, ...], ...])   # logs x counters
+   top.run()
+   top.get_value('breakdown')       # logs x categories, fractions of the slots
+   top.get_value('attribution')     # logs x categories, cycles against the median
+   top.get_value('contributors')    # ex. 'cycles (backend_bound/memory_bound)'
+
+ [1] A. Yasin (2014) "A Top-Down Method for Performance Analysis and Counters
+     Architecture", IEEE ISPASS, 35-44
+"""
+
+import numpy as np
+from analysis.base import AnalysisBase
+
+# Level 1 categories and their level 2 children
+LEVEL1 = ('retiring', 'bad_speculation', 'frontend_bound', 'backend_bound')
+LEVEL2 = {
+    'retiring': ('light_operations', 'heavy_operations'),
+    'bad_speculation': ('branch_mispredicts', 'machine_clears'),
+    'frontend_bound': ('fetch_latency', 'fetch_bandwidth'),
+    'backend_bound': ('memory_bound', 'core_bound'),
+}
+# Raw events (Icelake onwards): level 1, and one child of each parent
+SLOTS_LEVEL1 = ('topdown-retiring', 'topdown-bad-spec', 'topdown-fe-bound',
+                'topdown-be-bound')
+SLOTS_LEVEL2 = {
+    'heavy_operations': 'topdown-heavy-ops',
+    'branch_mispredicts': 'topdown-br-mispredict',
+    'fetch_latency': 'topdown-fetch-lat',
+    'memory_bound': 'topdown-mem-bound',
+}
+# Raw events (Skylake), level 1 only
+BUBBLES = ('topdown-total-slots', 'topdown-slots-issued',
+           'topdown-slots-retired', 'topdown-fetch-bubbles',
+           'topdown-recovery-bubbles')
+# What the fractions are of (the first one there), cost of each log
+WEIGHTS = ('cycles', 'slots', 'topdown-total-slots', 'elapsed')
+
+def _ratio(top, bottom):
+    """Element-wise top / bottom, zero where bottom is"""
+    return np.divide(top, bottom, out=np.zeros(len(top)),
+                     where=np.asarray(bottom) != 0)
+
+def fractions(columns):
+    """Fractions of the slots of each node of the hierarchy (level 1 and 2)
+       known from the columns (name -> values of all logs), empty if no
+       top-down source is there"""
+    nodes = dict()
+    if all('tma_' + name in columns for name in LEVEL1):
+        for parent in LEVEL1:
+            nodes[parent] = columns['tma_' + parent] / 100.0
+            for child in LEVEL2[parent]:
+                if 'tma_' + child in columns:
+                    nodes[child] = columns['tma_' + child] / 100.0
+    elif all(event in columns for event in SLOTS_LEVEL1):
+        total = sum(columns[event] for event in SLOTS_LEVEL1)
+        for parent, event in zip(LEVEL1, SLOTS_LEVEL1):
+            nodes[parent] = _ratio(columns[event], total)
+        for child, event in SLOTS_LEVEL2.items():
+            if event in columns:
+                nodes[child] = _ratio(columns[event], total)
+    elif all(event in columns for event in BUBBLES):
+        slots, issued, retired, fetch, recovery = (columns[event]
+                                                   for event in BUBBLES)
+        nodes['frontend_bound'] = _ratio(fetch, slots)
+        nodes['bad_speculation'] = _ratio(issued - retired + recovery, slots)
+        nodes['retiring'] = _ratio(retired, slots)
+        nodes['backend_bound'] = 1.0 - (nodes['frontend_bound'] +
+                                        nodes['bad_speculation'] +
+                                        nodes['retiring'])
+    # Children from the other child, counters aren't exact: never below zero
+    for parent, children in LEVEL2.items():
+        if parent not in nodes:
+            continue
+        for child, other in (children, children[::-1]):
+            if child not in nodes and other in nodes:
+                nodes[child] = nodes[parent] - nodes[other]
+        for node in (parent,) + children:
+            if node in nodes:
+                nodes[node] = np.maximum(nodes[node], 0.0)
+    return nodes
+
+def breakdown(columns, level=1):
+    """Logs x categories matrix of fractions at a level, and the names of the
+       categories (parent/child at level 2). None, [] without top-down data"""
+    nodes = fractions(columns)
+    if not nodes:
+        return None, []
+    names, vectors = list(), list()
+    for parent in LEVEL1:
+        children = LEVEL2[parent]
+        if level > 1 and all(child in nodes for child in children):
+            names.extend(parent + '/' + child for child in children)
+            vectors.extend(nodes[child] for child in children)
+        else:
+            names.append(parent)
+            vectors.append(nodes[parent])
+    return np.column_stack(vectors), names
+
+class TopDown(AnalysisBase):
+    """Top-down breakdown of the logs of a group, slowdowns attributed to the
+       bottleneck category that explains them"""
+    # Takes a logs x counters matrix, not one metric at a time
+    multivariate = True
+
+    def __init__(self, options=None):
+        super().__init__(options)
+        # Mandatory options
+        if 'level' in self.options:
+            if self.options['level'] not in (1, 2):
+                raise ValueError("Top-down level must be 1 or 2")
+        else:
+            self.options['level'] = 1
+        # Optional: relative slowdown against the group flagged
+        if 'threshold' in self.options:
+            if not isinstance(self.options['threshold'], float):
+                raise ValueError("Threshold must be float")
+        else:
+            self.options['threshold'] = 0.05
+        # Names of the counters (columns)
+        if 'metrics' in self.options:
+            if not isinstance(self.options['metrics'], (list, tuple)):
+                raise ValueError("Metrics must be a list of names")
+
+    def set_data(self, data):
+        """Sets the logs x counters matrix (list of lists of floats)"""
+        if not isinstance(data, list):
+            raise TypeError("Analysis data should be a list")
+        self.data = np.array(data, dtype=float)
+        if self.data.ndim != 2:
+            raise ValueError("Top-down data should be a matrix (logs x counters)")
+
+    def _run(self):
+        """Breakdown of each log, cost by category and attribution"""
+        count = len(self.data)
+        metrics = self.options.get('metrics') or []
+        columns = {name: self.data[:, num] for num, name in enumerate(metrics)
+                   if num < self.data.shape[1]}
+        weight = next((name for name in WEIGHTS if name in columns), None)
+        totals = columns[weight] if weight else np.ones(count)
+        self.results['metric'] = weight or 'slots'
+        self.results['values'] = totals.tolist()
+        self.results['flags'] = np.zeros(count, dtype=bool)
+        self.results['contributors'] = [''] * count
+        fracs, names = breakdown(columns, self.options['level'])
+        self.results['categories'] = names
+        if fracs is None or not count:
+            self.results['reference'] = np.zeros(count)
+            self.done = True
+            return
+
+        # Cost of each category against the group's median cost
+        costs = fracs * totals[:, None]
+        attribution = costs - np.median(costs, axis=0)
+        reference = float(np.median(totals))
+        slowdown = totals / reference - 1.0 if reference else np.zeros(count)
+        flags = slowdown > self.options['threshold']
+        # The category that grew the most, for every log
+        worst = np.argmax(attribution, axis=1)
+
+        self.results['breakdown'] = fracs
+        self.results['attribution'] = attribution
+        self.results['slowdown'] = slowdown
+        self.results['bottlenecks'] = [names[col] for col in worst]
+        self.results['contributors'] = [self.results['metric'] + ' (' +
+                                        names[col] + ')' for col in worst]
+        self.results['reference'] = np.full(count, reference)
+        self.results['flags'] = flags
+        self.results['num_flagged'] = int(np.count_nonzero(flags))
+        self.done = True
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "TopDown"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ level: " + repr(self.options['level']) + ", "
+        string += "threshold: " + repr(self.options['threshold']) + ", "
+        if 'num_flagged' in self.results:
+            string += repr(self.results['num_flagged']) + " slower log(s) on "
+        if self.data is not None:
+            string += repr(len(self.data)) + " logs"
+        string += " ]"
+        return string
@@ -0,0 +1,100 @@
+"""
+ Config - Maps log directories / file names to benchmarks (plugin and data
+ string), so that one aggregate run covers many benchmarks in one walk
+
+ INI format, one section per benchmark, in order of priority (the first
+ benchmark that matches a file gets it):
+
+   [Lulesh]
+   plugin = lulesh                       # engine/<plugin>.py, optional
+   data = sep=-,none,outlier=1,cluster=2,fit=3
+   pattern = lulesh*                     # file name globs (default *)
+   dirs = lulesh proxies/lulesh*         # directory globs, relative to the
+                                         # log dir (default: any)
+
+ Patterns match the file name without compression suffix, or the member
+ name for archives, directories match the path of the file relative to the
+ log directory given on the command line ('' at the top). Archive members
+ are in the archive's directory, plus theirs inside the archive, as if it
+ was extracted there.
+
+ Usage:
+   benchmarks = load_config('nightly.ini')
+   bench = find_benchmark(benchmarks, 'lulesh/x86', 'lulesh-gcc-O2-1.log')
+"""
+
+import configparser
+from fnmatch import fnmatchcase
+from logfile import COMPRESSION
+
+class Benchmark:
+    """A benchmark: plugin, data string and which files belong to it"""
+    def __init__(self, name, plugin=None, data_string='', patterns=None,
+                 dirs=None):
+        if not isinstance(name, str) or not name:
+            raise TypeError("Benchmark name must be a non-empty string")
+        self.name = name
+        self.plugin = plugin
+        self.data_string = data_string
+        self.patterns = patterns or ['*']
+        self.dirs = dirs or list()
+        # Why the benchmark can't be processed (ex. bad plugin), if so
+        self.error = None
+
+    def matches(self, reldir, filename):
+        """True if a file in a directory (relative to the log dir) belongs
+           to this benchmark"""
+        for suffix in COMPRESSION:
+            if filename.endswith(suffix):
+                filename = filename[:-len(suffix)]
+                break
+        if self.dirs and not any(fnmatchcase(reldir, pattern)
+                                 for pattern in self.dirs):
+            return False
+        return any(fnmatchcase(filename, pattern) for pattern in self.patterns)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Benchmark: " + self.name
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Benchmark: " + self.name + ", "
+        string += (self.plugin or "<no plugin>") + ", "
+        string += repr(self.patterns) + " in " + repr(self.dirs or ['*']) + " ]"
+        return string
+
+def parse_config(text):
+    """List of benchmarks from the text of a config file"""
+    parser = configparser.ConfigParser(inline_comment_prefixes=('#', ';'),
+                                       interpolation=None)
+    try:
+        parser.read_string(text)
+    except configparser.Error as error:
+        raise ValueError("Invalid config: " + str(error).splitlines()[0])
+    benchmarks = list()
+    for name in parser.sections():
+        section = parser[name]
+        unknown = set(section) - {'plugin', 'data', 'pattern', 'dirs'}
+        if unknown:
+            raise ValueError("Unknown key(s) in [" + name + "]: " +
+                             ", ".join(sorted(unknown)))
+        benchmarks.append(Benchmark(name, section.get('plugin') or None,
+                                    section.get('data', ''),
+                                    section.get('pattern', '').split(),
+                                    section.get('dirs', '').split()))
+    if not benchmarks:
+        raise ValueError("Config has no benchmarks")
+    return benchmarks
+
+def load_config(path):
+    """List of benchmarks from a config file"""
+    with open(path) as config:
+        return parse_config(config.read())
+
+def find_benchmark(benchmarks, reldir, filename):
+    """First benchmark a file belongs to, or None"""
+    for bench in benchmarks:
+        if bench.matches(reldir, filename):
+            return bench
+    return None
@@ -17,6 +17,9 @@
   * Analysis in categories are specified by data_string
     - Example: -d sep=-,outlier=1/ac,cluster=2/ac,fit=3/al
   * If using multiple log dirs, naming convention (sep,cats) needs to be the same
+  * Logs with the same categories in a run are repeats of the same measurement
+    - Example: gcc-O2-4-r1, gcc-O2-4-r2 (an extra rN category) -> gcc-O2-4
+    - Each leaf keeps all samples, analyses use their median
   * Analysis "across" search for same category on other parent categories
   * Analysis "along" search for all categories on the parent categories
 
@@ -26,16 +29,46 @@
   * none      : Do nothing (ignore that category)
   * outlier=N : warn if found outliers with threshold N (see outlier.py)
                 If only two values, warn if difference > N
+  * outlier=M:N : same, with method M (mzs, esd or iqr, see outlier.py)
+                Groups of 3 to 7 values use Dixon's Q test instead, at
+                significance N with esd, 0.05 otherwise
   * cluster=N : find N clusters in the data, warn if outliers
                 Warning, this algorithm includes random guesses
   * fit=N     : try to fit a polynomial of power N (least squares)
+  * multivariate=A : flag logs whose counters are jointly unusual, robust
+                Mahalanobis distance at significance A (see multivariate.py)
+  * topdown=L : top-down breakdown (level L, 1 or 2) of the logs, flag the
+                slower ones with their bottleneck category (see topdown.py)
   * ac/al     : across / along category analysis (default = across)
 """
 
 import importlib
 import re
+import warnings
 from enum import Enum
+import numpy as np
 from analysis.base import AnalysisBase
+from analysis.cache import CACHE
+from ranking import Finding
+from index import CategoryIndex, numeric
+from hierarchy import Hierarchy
+from linux_perf import PerfRecord
+from logfile import strip_extension, extension
+from perf_report import PREFIX
+from instrument import STATS
+
+# Last category of repeated runs of the same configuration (-r1, -r2, ...)
+REPEAT = re.compile(r'r\d+')
+
+# Data string keys: module name -> (class name, option, type of value)
+PASSES = {
+    'outlier': ('Outliers', 'threshold', float),
+    'cluster': ('Clustering', 'num_clusters', int),
+    'fit': ('CurveFit', 'degree', int),
+    'bootstrap': ('Bootstrap', 'resamples', int),
+    'multivariate': ('Multivariate', 'alpha', float),
+    'topdown': ('TopDown', 'level', int),
+}
 
 def load_analysis(plugin, data):
     """Loads analysis module from analysis/plugin.py"""
@@ -52,11 +85,21 @@ def load_analysis(plugin, data):
     if not split:
         raise ValueError("Invalid plugin format")
     key = split.group(1)
+    if key not in PASSES:
+        raise ValueError("Invalid Analysis pass requested")
     # Options
     if not split.group(2):
         raise ValueError("Plugin must have at least one parameter")
     value = split.group(2)
-    options = {'value': value} # fixme
+    name, option, convert = PASSES[key]
+    # Passes with many methods: method:value
+    method = None
+    if ':' in value:
+        method, value = value.split(':', 1)
+    try:
+        options = {'value': value, option: convert(value)}
+    except ValueError:
+        raise ValueError("Invalid parameter for " + key + ": " + value)
     # Type
     if split.group(3):
         if split.group(3) == 'al':
@@ -65,14 +108,11 @@ def load_analysis(plugin, data):
             raise ValueError("Invalid analysis type (must be ac/al)")
 
     mod = importlib.import_module("analysis." + key)
-    if key == "outlier":
-        return Analysis(analysis_type, mod.Outliers(options))
-    elif key == "cluster":
-        return Analysis(analysis_type, mod.Clustering(options))
-    elif key == "fit":
-        return Analysis(analysis_type, mod.CurveFit(options))
-    else:
-        raise ValueError("Invalid Analysis pass requested")
+    if method is not None:
+        if method not in getattr(mod, 'METHODS', ()):
+            raise ValueError("Invalid method for " + key + ": " + method)
+        options['method'] = method
+    return Analysis(analysis_type, getattr(mod, name)(options))
 
 class AnalysisType(Enum):
     """Analysis Type"""
@@ -94,6 +134,16 @@ class Analysis:
         self.plugin.set_data(data)
         self.plugin.run()
 
+    def run_group(self, data, xaxis=None, options=None):
+        """Runs a copy of the plugin on one group, returns the plugin (shared
+           with other identical runs, see analysis/cache.py, read only).
+           Options of this group only are added to the plugin's"""
+        if options:
+            options = dict(self.plugin.options, **options)
+        else:
+            options = self.plugin.options
+        return CACHE.run(type(self.plugin), options, data, xaxis)
+
     def set_option(self, key, value):
         """Sets the plugin's option"""
         self.plugin.set_option(key, value)
@@ -113,12 +163,39 @@ class Analysis:
             string += str(self.plugin) + " ]"
         return string
 
+def _vectors(ids, xaxis, values):
+    """(ids, x axis, metric, values) of every metric of a group: the ones all
+       its logs have, and the hotspots (sym:) of all the logs with a report,
+       0% where a symbol was below the report's threshold"""
+    common = set.intersection(*[set(val) for val in values])
+    hot = [num for num, val in enumerate(values)
+           if any(key.startswith(PREFIX) for key in val)]
+    symbols = set()
+    if len(hot) > 1:
+        symbols = {key for num in hot for key in values[num]
+                   if key.startswith(PREFIX)}
+        hot_ids = ids[hot]
+        hot_xaxis = None if xaxis is None else xaxis[hot]
+    for metric in sorted(common | symbols):
+        if metric in symbols:
+            yield hot_ids, hot_xaxis, metric, [values[num].get(metric, 0.0)
+                                               for num in hot]
+        else:
+            yield ids, xaxis, metric, [val[metric] for val in values]
+
 class Data:
     """Class that holds categories and log data in a hierarchical way"""
     def __init__(self, name, data_string):
         self.name = name
         self.analyses = list()
         self.logs = dict()
+        # Flat view of the logs: id -> data, and (run, categories) -> ids.
+        # Data is the median of the samples (repeated logs) of the same id
+        self.records = list()
+        self.samples = list()
+        self.index = CategoryIndex()
+        # Metric name -> float array by log id, built on demand
+        self._columns = None
         self.sep = None
         self.num_cat = 0
         self.num_logs = 0
@@ -144,40 +221,302 @@ class Data:
 
 
     def add_log(self, run, log, data):
-        """Add a log file to a run"""
+        """Add a log file to a run, returns the log id of its leaf"""
+        return self.add_logs([(run, log, data)])[0]
 
+    def add_logs(self, logs):
+        """Add many (run, log file, data) at once, each leaf is summarised
+           once at the end, so this is linear in the number of logs. Returns
+           the log ids of the leaves that changed"""
+        changed = dict()
+        try:
+            for run, log, data in logs:
+                log_id, cats, name = self._add(run, log, data)
+                changed[log_id] = (run, cats, name)
+        finally:
+            # Logs added before a bad one stay consistent
+            for log_id, (run, cats, name) in changed.items():
+                self._summarise(run, cats, name, log_id)
+        return list(changed)
+
+    def _add(self, run, log, data):
+        """Adds a log as a sample of its leaf, returns the leaf's log id,
+           categories and name"""
         # Validate input
         if not isinstance(run, str):
             raise TypeError("A run must be a str")
         if not isinstance(log, str):
             raise TypeError("A log must be a str")
-        # Remove extension, split by separator
-        cats = re.sub(r'\.[^-\.]+$', r'', log).split(self.sep)
+        problem = self.check_log(log)
+        if problem:
+            raise ValueError(problem)
+        # Remove extension(s) and repeat number, split by separator
+        cats, name = self._categories(log)
         if not self.num_cat and len(cats) == 1:
             print("Warning: Mo separators in lognames. Using one category")
-        if self.num_cat and len(cats) != self.num_cat:
-            raise ValueError("Different number of separators in log file names")
+        self.num_cat = len(cats)
+
+        # Only keep the numeric values, in a compact record
+        data = PerfRecord(log, data.get_values())
+
+        # Index the log, same path is one more sample of the same leaf
+        path = [run] + cats
+        log_id = self.index.get(path)
+        if log_id is None:
+            log_id = self.index.add(path)
+            self.records.append(data)
+            self.samples.append([data])
         else:
-            self.num_cat = len(cats)
+            self.samples[log_id].append(data)
+        self.num_logs += 1
+        return log_id, cats, name
+
+    def _categories(self, log):
+        """Categories of a log name, without the repeat number (if it has one
+           more category than expected, or nothing is expected yet), and the
+           name of its leaf (the log name without the repeat number)"""
+        cats = strip_extension(log).split(self.sep)
+        expected = len(self.analyses) or self.num_cat
+        if len(cats) > 1 and REPEAT.fullmatch(cats[-1]) and \
+           (not expected or len(cats) == expected + 1):
+            cats = cats[:-1]
+            return cats, self.sep.join(cats) + extension(log)
+        return cats, log
+
+    def _summarise(self, run, cats, name, log_id):
+        """Sets the data of a leaf to the median of its samples"""
+        samples = self.samples[log_id]
+        if len(samples) == 1:
+            data = samples[0]
+        else:
+            keys = list(dict.fromkeys(key for sample in samples
+                                      for key in sample.keys))
+            values = [sample.get_values() for sample in samples]
+            matrix = np.array([[val.get(key, np.nan) for key in keys]
+                               for val in values])
+            medians = np.nanmedian(matrix, axis=0)
+            data = PerfRecord(name, dict(zip(keys, medians.tolist())))
+        self._set_leaf(run, cats, data)
+        self.records[log_id] = data
+        self._columns = None
+
+    def sample_stats(self, metric):
+        """Statistics of a metric over the samples of each leaf, as arrays by
+           log id: count, min, median and stdev (nan where no sample has the
+           metric, stdev is nan for fewer than two samples)"""
+        width = max((len(samples) for samples in self.samples), default=0)
+        matrix = np.full((len(self.samples), width), np.nan)
+        for log_id, samples in enumerate(self.samples):
+            for num, sample in enumerate(samples):
+                if metric in sample.keys:
+                    matrix[log_id, num] = sample.get_value(metric)
+        count = np.count_nonzero(~np.isnan(matrix), axis=1)
+        stats = {'count': count}
+        for key in ('min', 'median', 'stdev'):
+            stats[key] = np.full(len(count), np.nan)
+        some = count > 0
+        stats['min'][some] = np.nanmin(matrix[some], axis=1)
+        stats['median'][some] = np.nanmedian(matrix[some], axis=1)
+        many = count > 1
+        stats['stdev'][many] = np.nanstd(matrix[many], axis=1, ddof=1)
+        return stats
+
+    def check_log(self, log):
+        """Returns why a log name doesn't fit in the data, None if it does"""
+        cats, _ = self._categories(log)
+        if self.num_cat and len(cats) != self.num_cat:
+            return ("Different number of separators in log file names"
+                    " (" + repr(len(cats)) + " categories in " + log +
+                    ", expected " + repr(self.num_cat) + ")")
         if self.analyses and len(cats) != len(self.analyses):
-            raise ValueError("Different number of categories and analysis in -d argument")
+            return ("Different number of categories and analysis in -d argument"
+                    " (" + repr(len(cats)) + " in " + log + ", expected " +
+                    repr(len(self.analyses)) + ")")
+        return None
 
-        # Add runs / logs to the structure
+    def attach(self, run, log, values):
+        """Adds values (ex. hotspots) to an existing log, returns False if
+           there's no such log"""
+        if not isinstance(values, dict):
+            raise TypeError("Values must be dictionary")
+        log_id = self.log_id(run, log)
+        if log_id is None:
+            return False
+        cats, name = self._categories(log)
+        # To the sample of the same name, or all of them
+        samples = self.samples[log_id]
+        matching = [num for num, sample in enumerate(samples)
+                    if strip_extension(sample.name) == strip_extension(log)]
+        for num in matching or range(len(samples)):
+            merged = samples[num].get_values()
+            merged.update(values)
+            samples[num] = PerfRecord(samples[num].name, merged)
+        self._summarise(run, cats, name, log_id)
+        return True
+
+    def _set_leaf(self, run, cats, data):
+        """Puts data in the tree, at run / categories"""
         if run not in self.logs:
             self.logs[run] = dict()
-
-        # For each category, build the tree
-        data.set_name(log)
         pointer = self.logs[run] # (chuckle)
-        last = cats[-1]
-        for cat in cats:
-            if cat == last:
-                pointer[cat] = data
+        for cat in cats[:-1]:
+            if cat not in pointer:
+                pointer[cat] = dict()
+            pointer = pointer[cat]
+        pointer[cats[-1]] = data
+
+    def log_id(self, run, log):
+        """Returns the log id of the leaf of a log file, None if not added"""
+        cats, _ = self._categories(log)
+        return self.index.get([run] + cats)
+
+    def get_log(self, log_id):
+        """Returns (run, categories, data) of a log id"""
+        path = self.index.path(log_id)
+        return path[0], path[1:], self.records[log_id]
+
+    def find(self, pattern=None, run=None):
+        """Sorted array of log ids matching a partial category pattern, where
+           each position is a value, a list of values or None/'*' (any)"""
+        if pattern is None:
+            pattern = list()
+        return self.index.find([run] + list(pattern))
+
+    def columns(self):
+        """All numeric metrics as columns: name -> float array by log id, with
+           nan where a log doesn't have it. Built in one pass, kept until new
+           logs are added"""
+        if self._columns is None:
+            lists = dict()
+            for log_id, leaf in enumerate(self.records):
+                for key, val in leaf.get_values().items():
+                    if key not in lists:
+                        lists[key] = [np.nan] * log_id
+                    lists[key].append(val)
+                for key, column in lists.items():
+                    if len(column) <= log_id:
+                        column.append(np.nan)
+            self._columns = {key: np.array(column, dtype=float)
+                             for key, column in lists.items()}
+        return self._columns
+
+    def category(self, position):
+        """Category values by code, and the code of each log (by id)"""
+        if not self.records:
+            return list(), np.zeros(0, dtype=np.int64)
+        column = position + 1
+        return self.index.values[column], self.index.matrix()[:, column]
+
+    def leaves(self):
+        """Yields (run, categories, data) for every log, in insertion order"""
+        for log_id in range(len(self.records)):
+            yield self.get_log(log_id)
+
+    def groups(self, position):
+        """Yields (key, members) for every group that varies the category in
+           'position' while keeping the run and all other categories fixed.
+           Members are (category, data) pairs, in insertion order"""
+        column = position + 1
+        values = self.index.values[column] if self.records else list()
+        rows = self.index.rows
+        for key, ids in self.index.groups(column):
+            yield key, [(values[rows[i][column]], self.records[i]) for i in ids]
+
+    def _neighbours(self, column, logs):
+        """Sorted array of the log ids in the same groups as logs, when
+           varying the category in 'column'"""
+        found = [np.zeros(0, dtype=np.int64)]
+        for log_id in logs:
+            pattern = list(self.index.path(log_id))
+            pattern[column] = None
+            found.append(self.index.find(pattern))
+        return np.unique(np.concatenate(found))
+
+    def results(self, positions=None, logs=None):
+        """Runs each category's analysis on all of its groups, for every
+           metric the group has in common, and every hotspot of the logs of
+           the group that have some (see _vectors). Yields (position, key,
+           ids, metric, vector, plugin) with the log ids and values in the
+           order they were analysed (numeric order for 'along'), and the
+           plugin that ran. Optionally, only the analyses of some category
+           positions, and only the groups of some log ids"""
+        for position, analysis in enumerate(self.analyses):
+            if analysis is None or not self.records:
+                continue
+            if positions is not None and position not in positions:
+                continue
+            column = position + 1
+            cats = self.index.values[column]
+            rows = self.index.rows
+            with STATS.timer('groups'):
+                ids = None if logs is None else self._neighbours(column, logs)
+                groups = list(self.index.groups(column, ids))
+            for key, ids in groups:
+                if len(ids) < 2:
+                    continue
+                STATS.count('groups analysed')
+                xaxis = None
+                if analysis.type == AnalysisType.along:
+                    xaxis = numeric(cats[rows[i][column]] for i in ids)
+                    if xaxis is not None:
+                        order = np.argsort(xaxis, kind='stable')
+                        ids = ids[order]
+                        xaxis = xaxis[order]
+                values = [self.records[i].get_values() for i in ids]
+                if getattr(analysis.plugin, 'multivariate', False):
+                    metrics = sorted(set.intersection(*[set(val)
+                                                        for val in values]))
+                    yield self._multivariate(position, key, ids, values,
+                                             metrics, analysis)
+                    continue
+                # Hotspots are of the logs with a report only
+                for found, along, metric, vector in _vectors(ids, xaxis, values):
+                    # Nothing to flag on constant values
+                    if min(vector) == max(vector):
+                        continue
+                    with STATS.timer('analysis: ' + str(analysis.plugin)):
+                        plugin = analysis.run_group(vector, along)
+                    yield position, key, found, metric, vector, plugin
+
+    def _multivariate(self, position, key, ids, values, metrics, analysis):
+        """Runs a multivariate analysis on all metrics of a group at once
+           (the plugin picks its columns), the result's metric is the one the
+           plugin reports for each log (ex. distance)"""
+        matrix = [[val[metric] for metric in metrics] for val in values]
+        with STATS.timer('analysis: ' + str(analysis.plugin)):
+            if metrics:
+                plugin = analysis.run_group(matrix, None, {'metrics': metrics})
             else:
-                if cat not in pointer:
-                    pointer[cat] = dict()
-                pointer = pointer[cat]
-        self.num_logs += 1
+                # Nothing in common, nothing to flag
+                plugin = analysis.run_group([[0.0]] * len(ids))
+        return (position, key, ids, plugin.get_value('metric'),
+                list(plugin.get_value('values')), plugin)
+
+    def analyse(self, positions=None, levels=1, logs=None):
+        """Runs all analyses (see results()), yields a Finding per flagged
+           value. With levels > 1, the group statistics are analysed again
+           with the opposite strategy, see hierarchy.py. Optionally, only
+           the groups of some log ids (and level 1)"""
+        hierarchy = Hierarchy(self) if levels > 1 and logs is None else None
+        results = self.results(positions, logs)
+        for position, key, ids, metric, vector, plugin in results:
+            if hierarchy:
+                hierarchy.add(position, key, metric, plugin)
+            flags = plugin.get_value('flags')
+            if isinstance(flags, str):
+                continue
+            reference = plugin.get_value('reference')
+            # Multivariate passes name what explains each flag
+            contributors = plugin.get_value('contributors')
+            for i in np.flatnonzero(flags):
+                leaf = self.records[ids[i]]
+                name = key[0] + "/" + leaf.get_value('name')
+                yield Finding(str(plugin), name, metric if isinstance(
+                    contributors, str) else contributors[i], vector[i],
+                              reference[i])
+        if hierarchy:
+            with STATS.timer('levels'):
+                yield from hierarchy.analyse(levels)
 
     def __str__(self):
         """Class name, for lists"""
@@ -200,23 +539,48 @@ class Data:
             print("")
 
         print(" + Logs:")
+        samples = {id(data): self.samples[log_id]
+                   for log_id, data in enumerate(self.records)}
         for run in self.logs:
             for cat in self.logs[run]:
-                _summary(self.logs[run][cat], "")
+                _summary(self.logs[run][cat], "", samples)
 
-def _summary(data, padding):
+def _summary(data, padding, samples):
     """Recurse through categories, dump last data"""
     # Dictionaries are categories
     if isinstance(data, dict):
         for cat, _ in data.items():
             print(padding + cat)
-            _summary(data[cat], padding + "  ")
+            _summary(data[cat], padding + "  ", samples)
 
-    # Data elements are leaf nodes
+    # Data elements are leaf nodes, repeats with their spread
     else:
-        # Hardcode to get all keys for now
-        for key, val in data.data.items():
-            print(padding + key + " = " + val)
-        for key, val in data.ext.items():
-            print(padding + key + " = " + val)
+        repeats = samples.get(id(data), [data])
+        spread = None
+        if len(repeats) > 1:
+            values = [sample.get_values() for sample in repeats]
+            matrix = np.array([[val.get(key, np.nan) for key in data.keys]
+                               for val in values])
+            # Metrics only some repeats have can have a single value
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                spread = zip(np.nanmin(matrix, axis=0),
+                             np.nanmax(matrix, axis=0),
+                             np.nanstd(matrix, axis=0, ddof=1))
+        for key, val in zip(data.keys, data.values):
+            line = padding + key + " = " + _format(val)
+            if spread is not None:
+                low, high, stdev = next(spread)
+                line += " (" + _format(float(low)) + " .. " + _format(float(high))
+                line += ", stdev " + _format(float(stdev)) + ")"
+            print(line)
+        if len(repeats) > 1:
+            print(padding + "repeats = " + repr(len(repeats)))
+        print(padding + "name = " + data.name)
         print('')
+
+def _format(value):
+    """Integers without the decimal point, other values as they were logged"""
+    if value.is_integer() and abs(value) < 1e18:
+        return str(int(value))
+    return repr(value)
@@ -0,0 +1,254 @@
+"""
+ Export - Writes parsed metrics and analysis results as columnar files
+
+ Three tables per Data:
+  * metrics : one row per log: run, categories, name, number of repeats and
+              every metric (median of the repeats)
+  * points  : one row per analysed value: analysis, category position, group,
+              metric, log, value, reference (median, cluster median, fitted
+              value), flag and cluster id (-1 if not clustered)
+  * groups  : one row per analysed group and metric: size, number flagged,
+              number of clusters, fit quality and coefficients
+
+ Formats, by file extension:
+  * .csv     : streamed, one row at a time
+  * .npz     : numpy arrays, one per column (typed arrays until the end)
+  * .parquet : streamed in row batches, needs the optional 'pyarrow' module
+
+ Usage:
+   paths = export(data, 'out/nightly.csv')
+   # -> ['out/nightly-metrics.csv', 'out/nightly-points.csv', ...]
+
+   with table_writer('out.csv', [('name', 'str'), ('cycles', 'float')]) as out:
+     out.write(['gcc-O2-4.log', 123.0])
+"""
+
+import csv
+import os
+from abc import ABCMeta, abstractmethod
+from array import array
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Column kinds -> numpy dtype
+KINDS = {'str': np.str_, 'int': np.int64, 'float': np.float64, 'bool': np.bool_}
+
+class TableWriter(metaclass=ABCMeta):
+    """Base class of all writers: a file with a fixed list of typed columns
+       (name, kind), rows are written in order"""
+    def __init__(self, path, columns):
+        for _, kind in columns:
+            if kind not in KINDS:
+                raise ValueError("Unknown column kind " + repr(kind))
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+
+    def write(self, row):
+        """Writes one row (a list of values, in column order)"""
+        if len(row) != len(self.columns):
+            raise ValueError("Row has " + repr(len(row)) + " values, table has " +
+                             repr(len(self.columns)) + " columns")
+        self._write(row)
+        self.rows += 1
+
+    @abstractmethod
+    def _write(self, row):
+        """Writes one validated row, in the writer's format"""
+
+    def close(self):
+        """Finishes the file"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "TableWriter"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        return "[ " + str(self) + ": " + self.path + ", " + repr(self.rows) + " row(s) ]"
+
+class CSVWriter(TableWriter):
+    """CSV with a header, one line per row as they come"""
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _ in columns])
+
+    @staticmethod
+    def _value(val):
+        """Empty for nan, 0/1 for bools, full precision for floats"""
+        if isinstance(val, bool):
+            return int(val)
+        if isinstance(val, float):
+            return '' if np.isnan(val) else repr(val)
+        return val
+
+    def _write(self, row):
+        self.writer.writerow([self._value(val) for val in row])
+
+    def close(self):
+        self.file.close()
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "CSVWriter"
+
+class NPZWriter(TableWriter):
+    """Compressed numpy archive, one array per column. Numbers are kept in
+       typed arrays (8 bytes a value) until the file is written on close"""
+    TYPECODES = {'int': 'q', 'float': 'd', 'bool': 'b'}
+
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self.values = [list() if kind == 'str' else array(self.TYPECODES[kind])
+                       for _, kind in columns]
+
+    def _write(self, row):
+        for values, val in zip(self.values, row):
+            values.append(val)
+
+    def close(self):
+        arrays = {name: np.array(values, dtype=KINDS[kind])
+                  for (name, kind), values in zip(self.columns, self.values)}
+        np.savez_compressed(self.path, **arrays)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "NPZWriter"
+
+class ParquetWriter(TableWriter):
+    """Parquet file, written in batches of rows"""
+    BATCH = 1 << 16
+    TYPES = {'str': 'string', 'int': 'int64', 'float': 'float64', 'bool': 'bool_'}
+
+    def __init__(self, path, columns):
+        if pyarrow is None:
+            raise RuntimeError("Writing " + path + " needs the pyarrow module")
+        super().__init__(path, columns)
+        self.schema = pyarrow.schema([(name, getattr(pyarrow, self.TYPES[kind])())
+                                      for name, kind in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch = [list() for _ in columns]
+
+    def _write(self, row):
+        for values, val in zip(self.batch, row):
+            values.append(val)
+        if len(self.batch[0]) >= self.BATCH:
+            self._flush()
+
+    def _flush(self):
+        """Writes the current batch"""
+        if self.batch[0]:
+            self.writer.write_table(pyarrow.table(self.batch, schema=self.schema))
+            self.batch = [list() for _ in self.columns]
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "ParquetWriter"
+
+FORMATS = {
+    '.csv': CSVWriter,
+    '.npz': NPZWriter,
+    '.parquet': ParquetWriter,
+}
+
+def table_writer(path, columns):
+    """Writer for a file, by its extension"""
+    _, ext = os.path.splitext(path)
+    if ext not in FORMATS:
+        raise ValueError("Unknown export format '" + ext + "', use one of " +
+                         ", ".join(FORMATS))
+    return FORMATS[ext](path, columns)
+
+def _fit_degree(data):
+    """Highest degree of all curve fits (number of coefficients - 1)"""
+    degree = -1
+    for analysis in data.analyses:
+        if analysis is not None and 'degree' in analysis.plugin.options:
+            degree = max(degree, analysis.plugin.options['degree'])
+    return degree
+
+def export_metrics(data, path):
+    """Writes one row per log with all its metrics"""
+    columns = data.columns()
+    metrics = sorted(columns)
+    header = [('run', 'str')]
+    header += [('cat' + str(pos), 'str') for pos in range(data.num_cat)]
+    header += [('name', 'str'), ('repeats', 'int')]
+    header += [(metric, 'float') for metric in metrics]
+    with table_writer(path, header) as out:
+        for log_id, (run, cats, leaf) in enumerate(data.leaves()):
+            out.write([run] + list(cats) + [leaf.get_value('name'),
+                                            len(data.samples[log_id])] +
+                      [float(columns[metric][log_id]) for metric in metrics])
+
+def export_results(data, points_path, groups_path):
+    """Runs all analyses, writes one row per value and one per group"""
+    degree = _fit_degree(data)
+    points = table_writer(points_path, [
+        ('analysis', 'str'), ('position', 'int'), ('group', 'str'),
+        ('metric', 'str'), ('log', 'int'), ('name', 'str'), ('value', 'float'),
+        ('reference', 'float'), ('flag', 'bool'), ('cluster', 'int')])
+    groups = table_writer(groups_path, [
+        ('analysis', 'str'), ('position', 'int'), ('group', 'str'),
+        ('metric', 'str'), ('size', 'int'), ('flagged', 'int'),
+        ('clusters', 'int'), ('quality', 'float')] +
+        [('coef' + str(num), 'float') for num in range(degree + 1)])
+    with points, groups:
+        for position, key, ids, metric, vector, plugin in data.results():
+            name = str(plugin)
+            group = '/'.join(key)
+            flags = plugin.get_value('flags')
+            if isinstance(flags, str):
+                flags = np.zeros(len(vector), dtype=bool)
+            reference = plugin.get_value('reference')
+            if isinstance(reference, str):
+                reference = np.full(len(vector), np.nan)
+            belongs = plugin.get_value('belongs')
+            for num, log_id in enumerate(ids):
+                points.write([name, position, group, metric, int(log_id),
+                              data.records[log_id].get_value('name'),
+                              float(vector[num]), float(reference[num]),
+                              bool(flags[num]),
+                              -1 if isinstance(belongs, str) else int(belongs[num])])
+            clusters = plugin.get_value('clusters')
+            quality = plugin.get_value('quality')
+            poly = plugin.get_value('poly')
+            coefs = [np.nan] * (degree + 1)
+            if not isinstance(poly, str):
+                # Highest power first, as numpy, aligned to the right
+                coefs[degree + 1 - len(poly):] = [float(coef) for coef in poly]
+            groups.write([name, position, group, metric, len(ids),
+                          int(np.count_nonzero(flags)),
+                          0 if isinstance(clusters, str) else len(clusters),
+                          np.nan if isinstance(quality, str) else float(quality)]
+                         + coefs)
+
+def export(data, path):
+    """Writes the metrics, points and groups tables of data next to path,
+       with the table name before the extension. Returns the paths"""
+    base, ext = os.path.splitext(path)
+    if ext not in FORMATS:
+        raise ValueError("Unknown export format '" + ext + "', use one of " +
+                         ", ".join(FORMATS))
+    paths = [base + '-' + table + ext for table in ('metrics', 'points', 'groups')]
+    export_metrics(data, paths[0])
+    export_results(data, paths[1], paths[2])
+    return paths
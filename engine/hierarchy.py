@@ -0,0 +1,204 @@
+"""
+ Hierarchy - Analyses the results of the group analyses again, level by level
+
+ As described in DataAnalysis.md, every group of the first level (ex. the
+ 1, 2, 4 cores of gcc-O2, fitted along) ends up with a statistic of its own
+ (ex. how far from the curve it was). Those are data too, and can be compared
+ again with the opposite strategy (across compilers / options). And so on.
+
+ A level is a table of group statistics: the category codes of each group
+ (-1 where a category was consumed by a previous level) and, for each
+ metric, an array of statistics by group. Level N+1 groups the rows of level
+ N that only differ on one (unconsumed) category and runs that category's
+ analysis on them, if its strategy is the opposite of level N's. Each run
+ gives a statistic to a level N+1 group, and flagged values are findings.
+
+ Statistic of each pass (a result key of the plugin):
+  * Outliers   : mean, without the outliers
+  * Clustering : centre of the biggest cluster
+  * CurveFit   : relative RMS error to the fitted curve
+  * Bootstrap  : value of the statistic
+
+ Usage:
+   levels = Hierarchy(data)
+   for position, key, ids, metric, vector, plugin in data.results():
+     levels.add(position, key, metric, plugin)
+   for finding in levels.analyse(3):   # levels 2 and 3
+     ...
+"""
+
+import numpy as np
+from ranking import Finding
+from index import group_ids, numeric
+
+# Pass name -> result used as the group statistic
+STATISTICS = {
+    'Outliers': 'mean',
+    'Clustering': 'centre',
+    'CurveFit': 'error',
+    'Bootstrap': 'value',
+}
+
+class Level:
+    """Group statistics of a level: codes by group, statistics by metric"""
+    def __init__(self, number, analysis_type, codes, stats, names):
+        self.number = number
+        self.type = analysis_type
+        self.codes = codes
+        self.stats = stats
+        self.names = names
+
+    def __len__(self):
+        """Number of groups"""
+        return len(self.codes)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Level " + repr(self.number)
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Level " + repr(self.number) + ": " + repr(len(self.codes))
+        string += " group(s), " + repr(len(self.stats)) + " metric(s) ]"
+        return string
+
+class Hierarchy:
+    """Collects level 1 statistics from Data.results(), runs further levels"""
+    def __init__(self, data):
+        self.data = data
+        # Level 1, by analysed position: key (codes) -> row, metric -> values
+        self.rows = dict()
+        self.values = dict()
+        self.names = dict()
+
+    def add(self, position, key, metric, plugin):
+        """Records the statistic of a level 1 group analysis"""
+        name = STATISTICS.get(str(plugin))
+        if name is None:
+            return
+        value = plugin.get_value(name)
+        if isinstance(value, str):
+            return
+        # Key is the path without 'position', as codes with -1 there
+        column = position + 1
+        index = self.data.index
+        codes = [index.codes[pos][cat]
+                 for pos, cat in zip([p for p in range(index.width)
+                                      if p != column], key)]
+        codes.insert(column, -1)
+        rows = self.rows.setdefault(position, dict())
+        row = rows.setdefault(tuple(codes), len(rows))
+        values = self.values.setdefault(position, dict())
+        values.setdefault(metric, dict())[row] = float(value)
+        self.names[position] = name
+
+    def _first(self, position):
+        """Level 1 table of the statistics of the analysis in 'position'"""
+        rows = self.rows[position]
+        codes = np.array(list(rows), dtype=np.int64).reshape(len(rows), -1)
+        stats = dict()
+        for metric, values in self.values[position].items():
+            column = np.full(len(rows), np.nan)
+            column[list(values)] = list(values.values())
+            stats[metric] = column
+        analysis = self.data.analyses[position]
+        return Level(1, analysis.type, codes, stats,
+                     [str(analysis.plugin) + ' ' + self.names[position]])
+
+    def _name(self, codes):
+        """Path of a group, '*' on consumed categories"""
+        values = self.data.index.values
+        return "/".join('*' if code < 0 else values[pos][code]
+                        for pos, code in enumerate(codes))
+
+    def _next(self, level, position):
+        """Runs the analysis in 'position' over the groups of level that
+           only differ on it. Returns the findings and the next level (or
+           None if no group had a statistic)"""
+        analysis = self.data.analyses[position]
+        column = position + 1
+        codes = level.codes
+        findings = list()
+        if not len(codes) or np.any(codes[:, column] < 0):
+            return findings, None
+        # Groups of rows that only differ on 'column' (codes + 1, as -1 is
+        # a valid code here)
+        sizes = [len(values) + 1 for values in self.data.index.values]
+        del sizes[column]
+        keys = np.delete(codes, column, axis=1) + 1
+        inverse = group_ids(keys, sizes)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+        cats = self.data.index.values[column]
+        groups = list()
+        stats = dict()
+        statistic = " (" + ", ".join(level.names) + ")"
+        for members in np.split(order, bounds):
+            if len(members) < 2:
+                continue
+            xaxis = None
+            if analysis.type.name == 'along':
+                xaxis = numeric(cats[code] for code in codes[members, column])
+                if xaxis is None:
+                    continue
+                sort = np.argsort(xaxis, kind='stable')
+                members = members[sort]
+                xaxis = xaxis[sort]
+            group = codes[members[0]].copy()
+            group[column] = -1
+            row = None
+            for metric, column_stats in level.stats.items():
+                vector = column_stats[members]
+                valid = ~np.isnan(vector)
+                if np.count_nonzero(valid) < 2:
+                    continue
+                vector = vector[valid]
+                if vector.min() == vector.max():
+                    continue
+                plugin = analysis.run_group(vector.tolist(),
+                                            None if xaxis is None else xaxis[valid])
+                flags = plugin.get_value('flags')
+                if not isinstance(flags, str):
+                    reference = plugin.get_value('reference')
+                    for i in np.flatnonzero(flags):
+                        member = members[valid][i]
+                        findings.append(Finding(
+                            str(plugin) + " (level " + repr(level.number + 1) + ")",
+                            self._name(codes[member]),
+                            metric + statistic, vector[i], reference[i]))
+                # Statistic of this group, for the next level
+                name = STATISTICS.get(str(plugin))
+                value = plugin.get_value(name) if name else ''
+                if isinstance(value, str):
+                    continue
+                if row is None:
+                    row = len(groups)
+                    groups.append(group)
+                stats.setdefault(metric, dict())[row] = float(value)
+        nxt = None
+        name = STATISTICS.get(str(analysis.plugin))
+        if groups and name:
+            columns = dict()
+            for metric, values in stats.items():
+                array = np.full(len(groups), np.nan)
+                array[list(values)] = list(values.values())
+                columns[metric] = array
+            nxt = Level(level.number + 1, analysis.type, np.array(groups),
+                        columns, level.names + [str(analysis.plugin) + ' ' + name])
+        return findings, nxt
+
+    def analyse(self, levels=2):
+        """Yields the findings of levels 2 to 'levels', starting from every
+           level 1 analysis and going on with the opposite strategy"""
+        pending = [self._first(position) for position in sorted(self.rows)]
+        while pending:
+            level = pending.pop(0)
+            if level.number >= levels:
+                continue
+            for position, analysis in enumerate(self.data.analyses):
+                if analysis is None or analysis.type == level.type:
+                    continue
+                findings, nxt = self._next(level, position)
+                yield from findings
+                if nxt is not None:
+                    pending.append(nxt)
@@ -0,0 +1,318 @@
+"""
+ History - Metrics of every night, kept to spot when performance shifted
+
+ Each aggregate.py run only sees its own logs, so slow drifts go unnoticed.
+ The history keeps, for each benchmark and date, the median of every metric
+ of every category path (runs and repeats are samples of the same path, as
+ in regression.py). It is append-only: one file per benchmark and date,
+ never rewritten, so nightly jobs can record concurrently.
+
+ Layout: <root>/<benchmark>/<YYYY-MM-DD>.history, compressed numpy archives
+ (no pickles) with the paths, the metric names and a paths x metrics matrix.
+
+ Change points: every (path, metric) series across all dates is a row of a
+ series x dates matrix, and all rows are split at once by binary segmentation
+ (CUSUM): each segment is split where the difference of the means on both
+ sides is the most significant, while that gains more than the penalty per
+ change (the penalised cost PELT minimises, for a shift in the mean). Values
+ are scaled by a robust estimate of the night-to-night noise of each series
+ (MAD of the differences), missing nights are skipped. The work per pass is
+ linear in the size of the matrix, with about log2(dates) passes.
+
+ Usage:
+   history = History('history')
+   history.record(data, '2026-10-19')
+   for change in history.changes('lulesh', {'threshold': 0.02}):
+     print(change)
+
+ Options:
+  * penalty   : per change, times log(dates) (default 3.0)
+  * min_size  : nights on each side of a change (default 3)
+  * threshold : minimum relative shift to report (default 0.01)
+  * noise     : minimum relative stdev of a series (default 0.005)
+  * higher    : metrics in which higher is better (default: FOM)
+  * metrics   : restrict to these metrics (default: all)
+"""
+
+import datetime
+import os
+import warnings
+import numpy as np
+from ranking import Finding
+from regression import HIGHER_IS_BETTER
+
+EXTENSION = '.history'
+VERSION = 1
+
+def _check_date(date):
+    """ISO date (YYYY-MM-DD) as a string, ValueError otherwise"""
+    if isinstance(date, datetime.date):
+        return date.isoformat()
+    if not isinstance(date, str):
+        raise TypeError("Date must be a string or a date")
+    datetime.date.fromisoformat(date)
+    if len(date) != 10:
+        raise ValueError("Date must be YYYY-MM-DD, not " + date)
+    return date
+
+def _medians(data):
+    """Category paths (without the run) and the median of every metric over
+       all samples of the path, as (paths, metrics, matrix)"""
+    rows = dict()
+    for log_id, (_, cats, _) in enumerate(data.leaves()):
+        rows.setdefault(tuple(cats), list()).extend(data.samples[log_id])
+    metrics = dict()
+    for samples in rows.values():
+        for sample in samples:
+            for key in sample.keys:
+                metrics.setdefault(key, len(metrics))
+    matrix = np.full((len(rows), len(metrics)), np.nan)
+    for num, samples in enumerate(rows.values()):
+        values = np.full((len(samples), len(metrics)), np.nan)
+        for pos, sample in enumerate(samples):
+            values[pos, [metrics[key] for key in sample.keys]] = sample.values
+        with warnings.catch_warnings():
+            # Metrics this path doesn't have stay nan
+            warnings.simplefilter('ignore', RuntimeWarning)
+            matrix[num] = np.nanmedian(values, axis=0)
+    return list(rows), list(metrics), matrix
+
+def change_points(matrix, penalty=3.0, min_size=3):
+    """Change points of every row of a (scaled) series x dates matrix, nan
+       where missing. Returns (rows, positions) arrays: the position is the
+       first date of the new level"""
+    if not isinstance(min_size, int) or min_size < 1:
+        raise ValueError("Minimum segment size must be a positive int")
+    series, dates = matrix.shape
+    valid = ~np.isnan(matrix)
+    # Prefix sums, so that any segment's count / sum is two lookups
+    count = np.zeros((series, dates + 1))
+    total = np.zeros((series, dates + 1))
+    count[:, 1:] = np.cumsum(valid, axis=1)
+    total[:, 1:] = np.cumsum(np.where(valid, matrix, 0.0), axis=1)
+    beta = penalty * np.log(max(dates, 2))
+
+    found_rows = list()
+    found_pos = list()
+    # Segments of all series: row, start, end (dates, end excluded)
+    enough = count[:, -1] >= 2 * min_size
+    rows = np.flatnonzero(enough)
+    start = np.zeros(len(rows), dtype=np.int64)
+    end = np.full(len(rows), dates, dtype=np.int64)
+    while True:
+        # Only segments with enough values for a split (at least two dates)
+        enough = count[rows, end] - count[rows, start] >= max(2 * min_size, 2)
+        rows, start, end = rows[enough], start[enough], end[enough]
+        if not len(rows):
+            break
+        # Every split of every segment, padded to the longest segment
+        split = start[:, None] + np.arange(1, int(np.max(end - start)))[None, :]
+        inside = split < end[:, None]
+        split = np.minimum(split, dates)
+        row = rows[:, None]
+        left = count[row, split] - count[row, start[:, None]]
+        right = count[row, end[:, None]] - count[row, split]
+        usable = inside & (left >= min_size) & (right >= min_size)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff = ((total[row, split] - total[row, start[:, None]]) / left -
+                    (total[row, end[:, None]] - total[row, split]) / right)
+            # Cost saved by splitting there, the squared CUSUM statistic
+            gain = np.where(usable, left * right / (left + right) * diff**2, -1.0)
+        # The last of equal splits (across missing nights), so that the
+        # change is on the first night of the new level
+        best = gain.shape[1] - 1 - np.argmax(gain[:, ::-1], axis=1)
+        accepted = gain[np.arange(len(rows)), best] > beta
+        where = split[np.arange(len(rows)), best][accepted]
+        found_rows.append(rows[accepted])
+        found_pos.append(where)
+        # Both sides are searched again
+        rows = np.concatenate([rows[accepted], rows[accepted]])
+        start, end = (np.concatenate([start[accepted], where]),
+                      np.concatenate([where, end[accepted]]))
+    if not found_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    found_rows = np.concatenate(found_rows)
+    found_pos = np.concatenate(found_pos)
+    order = np.lexsort((found_pos, found_rows))
+    return found_rows[order], found_pos[order]
+
+def _noise(matrix, noise):
+    """Robust stdev of each row, from night-to-night differences (MAD),
+       at least noise times the level"""
+    diffs = np.diff(matrix, axis=1)
+    with warnings.catch_warnings():
+        # All-nan rows (too few nights) have no noise estimate
+        warnings.simplefilter('ignore', RuntimeWarning)
+        centre = np.nanmedian(diffs, axis=1)
+        mad = np.nanmedian(np.abs(diffs - centre[:, None]), axis=1)
+        level = np.abs(np.nanmedian(matrix, axis=1))
+    sigma = 1.4826 * mad / np.sqrt(2.0)
+    return np.fmax(sigma, noise * level)
+
+class Change:
+    """A shift in the level of one metric of a category path"""
+    def __init__(self, path, metric, date, before, after, score, worse):
+        self.path = path
+        self.metric = metric
+        self.date = date
+        self.before = before
+        self.after = after
+        self.delta = (after - before) / before if before else np.inf
+        self.score = score
+        self.worse = worse
+
+    def finding(self):
+        """The change as a finding, for ranking"""
+        return Finding('Change', '-'.join(self.path) + '@' + self.date,
+                       self.metric, self.after, self.before)
+
+    def __str__(self):
+        """Class name, for lists"""
+        string = '-'.join(self.path) + " " + self.metric + ": "
+        string += repr(self.before) + " -> " + repr(self.after)
+        string += " on " + self.date
+        string += " ({:+.2%}, z={:.1f})".format(self.delta, self.score)
+        return string
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Change: " + '-'.join(self.path) + " " + self.metric
+        string += " on " + self.date + " {:+.2%} ]".format(self.delta)
+        return string
+
+class History:
+    """Append-only store of nightly metrics, by benchmark, path and date"""
+    def __init__(self, root):
+        if os.path.exists(root) and not os.path.isdir(root):
+            raise ValueError(root + " is not a directory")
+        self.root = root
+        self.options = {'penalty': 3.0, 'min_size': 3, 'threshold': 0.01,
+                        'noise': 0.005, 'higher': HIGHER_IS_BETTER,
+                        'metrics': None}
+
+    def _path(self, name, date):
+        """File of a benchmark's date"""
+        return os.path.join(self.root, name, date + EXTENSION)
+
+    def record(self, data, date):
+        """Adds the medians of a Data as its benchmark's metrics on date,
+           ValueError if that date was already recorded"""
+        date = _check_date(date)
+        paths, metrics, matrix = _medians(data)
+        depth = len(paths[0]) if paths else 0
+        arrays = {'version': np.array(VERSION), 'name': np.array(data.name),
+                  'datastr': np.array(data.datastr),
+                  'paths': np.array(paths, dtype=np.str_).reshape(len(paths), depth),
+                  'metrics': np.array(metrics, dtype=np.str_), 'matrix': matrix}
+        directory = os.path.join(self.root, data.name)
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(data.name, date)
+        # Written aside, then linked in place: never half a file, never over
+        # another one
+        partial = os.path.join(directory, '.' + date + '.' + repr(os.getpid()))
+        with open(partial, 'wb') as out:
+            np.savez_compressed(out, **arrays)
+        try:
+            os.link(partial, path)
+        except FileExistsError:
+            raise ValueError(data.name + " already has a history on " + date)
+        finally:
+            os.unlink(partial)
+        return path
+
+    def dates(self, name):
+        """Recorded dates of a benchmark, in order"""
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return list()
+        return sorted(entry[:-len(EXTENSION)] for entry in os.listdir(directory)
+                      if entry.endswith(EXTENSION) and not entry.startswith('.'))
+
+    def series(self, name, metrics=None):
+        """All series of a benchmark: (keys, dates, matrix), keys are (path,
+           metric) and the matrix is keys x dates, nan where missing"""
+        dates = self.dates(name)
+        keys = dict()
+        nights = list()
+        for date in dates:
+            with np.load(self._path(name, date), allow_pickle=False) as arrays:
+                if 'version' not in arrays or int(arrays['version']) != VERSION:
+                    raise ValueError(self._path(name, date) + " is not a history"
+                                     " file (version " + repr(VERSION) + ")")
+                paths = [tuple(path) for path in arrays['paths'].tolist()]
+                names = arrays['metrics'].tolist()
+                matrix = arrays['matrix']
+            rows, columns = np.nonzero(~np.isnan(matrix))
+            if metrics is not None:
+                wanted = np.array([names[col] in metrics for col in columns],
+                                  dtype=bool)
+                rows, columns = rows[wanted], columns[wanted]
+            ids = np.array([keys.setdefault((paths[row], names[col]), len(keys))
+                            for row, col in zip(rows.tolist(), columns.tolist())],
+                           dtype=np.int64)
+            nights.append((ids, matrix[rows, columns]))
+        result = np.full((len(keys), len(dates)), np.nan)
+        for num, (ids, values) in enumerate(nights):
+            result[ids, num] = values
+        return list(keys), dates, result
+
+    def changes(self, name, options=None):
+        """Significant changes of all series of a benchmark, biggest first"""
+        settings = dict(self.options)
+        if options is not None:
+            if not isinstance(options, dict):
+                raise TypeError("History options should be a dictionary")
+            settings.update(options)
+        keys, dates, matrix = self.series(name, settings['metrics'])
+        if not keys:
+            return list()
+        sigma = _noise(matrix, settings['noise'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scaled = matrix / sigma[:, None]
+        scaled[~np.isfinite(sigma)] = np.nan
+        rows, positions = change_points(scaled, settings['penalty'],
+                                        settings['min_size'])
+
+        # Levels on both sides: up to the previous / next change of the row
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = rows[1:] != rows[:-1]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+        previous = np.where(first, 0, np.roll(positions, 1))
+        following = np.where(last, len(dates), np.roll(positions, -1))
+        valid = ~np.isnan(matrix)
+        count = np.zeros((len(keys), len(dates) + 1))
+        total = np.zeros((len(keys), len(dates) + 1))
+        count[:, 1:] = np.cumsum(valid, axis=1)
+        total[:, 1:] = np.cumsum(np.where(valid, matrix, 0.0), axis=1)
+        before = ((total[rows, positions] - total[rows, previous]) /
+                  (count[rows, positions] - count[rows, previous]))
+        after = ((total[rows, following] - total[rows, positions]) /
+                 (count[rows, following] - count[rows, positions]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = np.abs(after - before) / np.abs(before)
+        score = np.abs(after - before) / sigma[rows]
+
+        changes = list()
+        for num in np.argsort(-score, kind='stable'):
+            if not relative[num] >= settings['threshold']:
+                continue
+            path, metric = keys[rows[num]]
+            higher = metric in settings['higher']
+            worse = bool(after[num] < before[num] if higher
+                         else after[num] > before[num])
+            changes.append(Change(path, metric, dates[positions[num]],
+                                  float(before[num]), float(after[num]),
+                                  float(score[num]), worse))
+        return changes
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "History"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        names = sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []
+        string = "[ History: " + self.root + ", "
+        string += repr(len(names)) + " benchmark(s) ]"
+        return string
@@ -0,0 +1,167 @@
+"""
+ Category Index - inverted index of log categories, for lookups by any part
+ of the category path
+
+ Each log gets an id (its insertion order) and its path (run + categories) is
+ dictionary encoded: every position keeps a list of values, a value -> code
+ map and, for each code, the sorted list of log ids with that value (the
+ posting list). Ids are appended in increasing order, so posting lists are
+ always sorted and queries are intersections of sorted arrays.
+
+ Usage:
+   index = CategoryIndex()
+   index.add(('run1', 'gcc', 'O2', '4'))
+   index.add(('run1', 'llvm', 'O2', '8'))
+   index.find([None, None, 'O2'])          # -> array([0, 1])
+   index.find([None, ['gcc', 'icc'], None]) # -> array([0])
+   for key, ids in index.groups(1): ...     # vary position 1, others fixed
+"""
+
+import numpy as np
+
+WILDCARD = '*'
+
+def group_ids(keys, sizes):
+    """Dense group number of each row of codes. Rows are packed into a single
+       integer (mixed radix) when that fits, which is faster than unique rows"""
+    if np.prod(np.array(sizes, dtype=float)) < 2**62:
+        packed = np.zeros(len(keys), dtype=np.int64)
+        for col, size in enumerate(sizes):
+            packed = packed * size + keys[:, col]
+        _, inverse = np.unique(packed, return_inverse=True)
+    else:
+        _, inverse = np.unique(keys, axis=0, return_inverse=True)
+    return inverse.reshape(-1)
+
+def numeric(values):
+    """Category values as a float array, or None if any is not a number"""
+    try:
+        return np.array([float(value) for value in values])
+    except ValueError:
+        return None
+
+class CategoryIndex:
+    """Dictionary encoded categories with per-value posting lists"""
+    def __init__(self):
+        self.values = list()
+        self.codes = list()
+        self.postings = list()
+        self.rows = list()
+        self.ids = dict()
+        self.width = 0
+        self._arrays = dict()
+        self._matrix = None
+
+    def add(self, path):
+        """Adds a path (tuple of category values), returns its log id"""
+        if not self.width:
+            self.width = len(path)
+            self.values = [list() for _ in path]
+            self.codes = [dict() for _ in path]
+            self.postings = [list() for _ in path]
+        if len(path) != self.width:
+            raise ValueError("Path length differs from the index width")
+        log_id = len(self.rows)
+        row = list()
+        for pos, value in enumerate(path):
+            codes = self.codes[pos]
+            if value not in codes:
+                codes[value] = len(self.values[pos])
+                self.values[pos].append(value)
+                self.postings[pos].append(list())
+            code = codes[value]
+            self.postings[pos][code].append(log_id)
+            self._arrays.pop((pos, code), None)
+            row.append(code)
+        self.rows.append(tuple(row))
+        self.ids[tuple(path)] = log_id
+        self._matrix = None
+        return log_id
+
+    def get(self, path):
+        """Returns the log id of an exact path, or None if not indexed"""
+        return self.ids.get(tuple(path))
+
+    def path(self, log_id):
+        """Returns the path of a log id"""
+        return tuple(self.values[pos][code]
+                     for pos, code in enumerate(self.rows[log_id]))
+
+    def lookup(self, position, value):
+        """Sorted array of log ids with 'value' at 'position'"""
+        code = self.codes[position].get(value)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        key = (position, code)
+        if key not in self._arrays:
+            self._arrays[key] = np.array(self.postings[position][code],
+                                         dtype=np.int64)
+        return self._arrays[key]
+
+    def find(self, pattern):
+        """Sorted array of log ids matching a (partial) pattern. Each position
+           is a value, a list of values (any of them) or None/'*' (any)"""
+        result = None
+        for pos, want in enumerate(pattern):
+            if want is None or want == WILDCARD:
+                continue
+            if pos >= self.width:
+                raise ValueError("Pattern longer than the category path")
+            if isinstance(want, (list, tuple, set)):
+                ids = [self.lookup(pos, value) for value in want]
+                ids.append(np.zeros(0, dtype=np.int64))
+                ids = np.unique(np.concatenate(ids))
+            else:
+                ids = self.lookup(pos, want)
+            if result is None:
+                result = ids
+            else:
+                result = np.intersect1d(result, ids, assume_unique=True)
+            if not len(result):
+                break
+        if result is None:
+            return np.arange(len(self.rows), dtype=np.int64)
+        return result
+
+    def matrix(self):
+        """All rows of codes as a 2D array (logs x positions)"""
+        if self._matrix is None:
+            self._matrix = np.array(self.rows, dtype=np.int64).reshape(
+                len(self.rows), self.width)
+        return self._matrix
+
+    def groups(self, position, ids=None):
+        """Yields (key, ids) for every group of logs that share all positions
+           but 'position', in order of first appearance. The key is the path
+           without 'position'. Optionally restricted to a subset of ids"""
+        matrix = self.matrix()
+        if ids is None:
+            ids = np.arange(len(matrix), dtype=np.int64)
+        if not len(ids):
+            return
+        keys = np.delete(matrix[ids], position, axis=1)
+        inverse = group_ids(keys, [len(self.values[pos])
+                                    for pos in range(self.width)
+                                    if pos != position])
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+        chunks = sorted(np.split(order, bounds), key=lambda chunk: chunk[0])
+        others = [pos for pos in range(self.width) if pos != position]
+        for chunk in chunks:
+            row = keys[chunk[0]]
+            key = tuple(self.values[pos][code] for pos, code in zip(others, row))
+            yield key, ids[chunk]
+
+    def __len__(self):
+        """Number of logs indexed"""
+        return len(self.rows)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "CategoryIndex"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ CategoryIndex: " + repr(len(self.rows)) + " log(s), "
+        string += repr([len(values) for values in self.values]) + " values ]"
+        return string
@@ -0,0 +1,165 @@
+"""
+ Instrument - Stage timers, counters and profiling for the pipeline
+
+ A single registry (STATS) collects wall/CPU time per stage and counters
+ (files read, bytes scanned, fields matched, groups analysed...). It is
+ disabled by default, in which case timers are a shared no-op context and
+ counters return immediately, so instrumented code pays almost nothing.
+
+ Note: modules must import this as 'instrument' (engine in PYTHONPATH), not
+ 'engine.instrument', or they would get a different registry.
+
+ Usage:
+   from instrument import STATS
+   STATS.enable()
+   with STATS.timer('parse'):
+     ...
+   STATS.count('files')
+   print(STATS.report())
+
+   # Worker processes have their own registry, they send it back:
+   stats = STATS.take()                # in the worker, (timers, counters)
+   STATS.merge(*stats)                 # in the parent (CPU and wall add up)
+
+   result = profile(func, arg1, arg2)  # cProfile + tracemalloc report
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import time
+import tracemalloc
+
+class _NullTimer:
+    """Does nothing, used when stats are disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    """Accumulates wall and CPU time of a block into the registry"""
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        entry = self.stats.timers.get(self.name)
+        if entry is None:
+            entry = self.stats.timers[self.name] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += wall
+        entry[2] += cpu
+        return False
+
+class Stats:
+    """Registry of timers (calls, wall, cpu) and counters"""
+    def __init__(self):
+        self.enabled = False
+        self.timers = dict()
+        self.counters = dict()
+
+    def enable(self, enabled=True):
+        """Turns collection on (or off)"""
+        self.enabled = enabled
+
+    def reset(self):
+        """Forgets everything collected so far"""
+        self.timers.clear()
+        self.counters.clear()
+
+    def take(self):
+        """Returns what was collected so far (timers, counters), and forgets
+           it, to be merged into another registry (of another process)"""
+        taken = (self.timers, self.counters)
+        self.timers = dict()
+        self.counters = dict()
+        return taken
+
+    def merge(self, timers, counters):
+        """Adds the timers and counters of another registry to this one"""
+        if not self.enabled:
+            return
+        for name, (calls, wall, cpu) in timers.items():
+            entry = self.timers.get(name)
+            if entry is None:
+                entry = self.timers[name] = [0, 0.0, 0.0]
+            entry[0] += calls
+            entry[1] += wall
+            entry[2] += cpu
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def timer(self, name):
+        """Context manager timing a stage (nested stages are fine)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def count(self, name, value=1):
+        """Adds value to counter name"""
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        """Human readable report, one line per timer / counter"""
+        lines = list()
+        for name, (calls, wall, cpu) in self.timers.items():
+            lines.append("{:<24} {:>10.4f}s wall {:>10.4f}s cpu {:>9} call(s)"
+                         .format(name, wall, cpu, calls))
+        for name, value in self.counters.items():
+            lines.append("{:<24} {:>10}".format(name, value))
+        return "\n".join(lines)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Stats"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Stats: " + repr(len(self.timers)) + " timer(s), "
+        string += repr(len(self.counters)) + " counter(s) ]"
+        return string
+
+STATS = Stats()
+
+def profile(func, *args, top=20, out=None):
+    """Runs func(*args) under cProfile and tracemalloc, prints the hottest
+       functions and the biggest allocations to out, returns func's result"""
+    if out is None:
+        out = sys.stdout
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(top)
+    print(" + Profile (top " + repr(top) + " by cumulative time):", file=out)
+    print(stream.getvalue().strip('\n'), file=out)
+    print(" + Memory (peak " + repr(peak // 1024) + " KiB, top " + repr(top) +
+          " allocation sites):", file=out)
+    for stat in snapshot.statistics('lineno')[:top]:
+        print(" - " + str(stat), file=out)
+    return result
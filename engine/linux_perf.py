@@ -10,25 +10,109 @@
   print app.cycles(),' +- ',app.cycles_stdev()
   print app.cache_misses()
 
+ Adaptive repeats: run until the confidence interval of the mean of some
+ metrics is narrow enough (relative width), or a maximum number of runs:
+  app.stat_adaptive(['cycles', 'FOM'], {'target': 0.01, 'max': 50})
+  app.get_value('cycles')       # mean of all runs
+  app.get_value('ci:cycles')    # relative width of its 95% CI
+  app.get_value('runs')         # number of runs
+
+ Counter groups: with more events than hardware counters, perf multiplexes
+ them and scales the counts, which adds noise. With counters=N, events are
+ scheduled in groups of N ({}-grouped, counted together), one run per group,
+ and the results merged. Software events (page-faults, ...) don't take a
+ counter and are counted in the first run:
+  app.stat(events=['cycles', 'instructions', 'cache-misses'], counters=2)
+  app.get_value('mux:cycles')   # fraction of the run it was counted (1.0)
+
+ Top-down (TMA) and memory events: cache, TLB and stall counters, the raw
+ top-down slot events (topdown-*, with or without a PMU, cpu_core/...), the
+ tma_* metrics perf computes (percentages, perf stat -M TopdownL1/L2) and
+ the table of perf stat --topdown (stored as tma_* too) are all parsed, see
+ analysis/topdown.py for the breakdown:
+  app.get_value('tma_backend_bound')     # 40.8 (%)
+  app.get_value('topdown-fetch-bubbles')
+
  Plugin: parses the output of a specific benchmark, returns a dictionary
  with data to be used for statistics later, will be combined with the perf
  data
+
+ Record: compact copy of the numeric values of a PerfData, what Data keeps
+ for each log (no raw text, no regex tables, no dictionaries)
 """
 
 import subprocess
 import re
+from array import array
 from pathlib import Path
 import shutil
+from instrument import STATS
+from analysis.distribution import RunningStats
+
+# Prefix of the achieved precision of a metric, in adaptive repeats
+CI_PREFIX = 'ci:'
+# Prefix of the fraction of the run an event was counted (multiplexing)
+MUX_PREFIX = 'mux:'
+
+# Counted by the kernel, don't need a hardware counter
+SOFTWARE = {'task-clock', 'cpu-clock', 'context-switches', 'cs',
+            'cpu-migrations', 'migrations', 'page-faults', 'faults',
+            'minor-faults', 'major-faults', 'alignment-faults',
+            'emulation-faults', 'duration_time'}
+
+# Cache, TLB and stall events, and the raw top-down events of Skylake
+# (topdown-total-slots, ...) and of Icelake onwards (slots, topdown-retiring)
+COUNTERS = ('cache-references', 'cache-misses', 'L1-dcache-loads',
+            'L1-dcache-load-misses', 'L1-icache-load-misses', 'LLC-loads',
+            'LLC-load-misses', 'dTLB-loads', 'dTLB-load-misses', 'iTLB-loads',
+            'iTLB-load-misses', 'stalled-cycles-frontend',
+            'stalled-cycles-backend', 'topdown-total-slots',
+            'topdown-slots-issued', 'topdown-slots-retired',
+            'topdown-fetch-bubbles', 'topdown-recovery-bubbles', 'slots',
+            'topdown-retiring', 'topdown-bad-spec', 'topdown-fe-bound',
+            'topdown-be-bound', 'topdown-heavy-ops', 'topdown-br-mispredict',
+            'topdown-fetch-lat', 'topdown-mem-bound')
+
+# Prefix of the top-down metrics (percentages), as perf names them
+TMA_PREFIX = 'tma_'
+# Labels of perf stat --topdown that don't match the tma_ names
+TOPDOWN_LABELS = {'branch mispredict': 'branch_mispredicts'}
+
+def _event_name(event):
+    """Event without its modifiers (cycles:u -> cycles)"""
+    return event.split(':')[0]
+
+def schedule(events, counters):
+    """Splits events in passes that fit in the hardware counters: lists of
+       at most 'counters' hardware events, software ones in the first"""
+    if not isinstance(counters, int) or counters < 1:
+        raise ValueError("Number of counters must be a positive integer")
+    software = [event for event in events if _event_name(event) in SOFTWARE]
+    hardware = [event for event in events if _event_name(event) not in SOFTWARE]
+    passes = [hardware[start:start + counters]
+              for start in range(0, len(hardware), counters)] or [[]]
+    passes[0].extend(software)
+    return passes
+
+def event_list(events):
+    """perf stat -e argument of a pass, hardware events in a group"""
+    hardware = [event for event in events if _event_name(event) not in SOFTWARE]
+    software = [event for event in events if _event_name(event) in SOFTWARE]
+    if len(hardware) > 1:
+        hardware = ['{' + ','.join(hardware) + '}']
+    return ','.join(hardware + software)
 
 class LinuxPerfPluginBase:
     """Base class for all linux_perf plugins"""
+    # Fields a valid log must have (ex. the benchmark's final score)
+    REQUIRED = ()
+
     def __init__(self):
         self.data = dict()
         self.fields = None
-        self.raw = None
 
     def parse(self, results):
-        """Parses the raw output, sets fields"""
+        """Parses the raw output, sets fields (raw text is not kept)"""
         self.data.clear()
         if not results:
             return self.data
@@ -36,9 +120,8 @@ class LinuxPerfPluginBase:
         if not isinstance(results, str):
             raise TypeError("Parseable results must be string")
 
-        self.raw = results
         for field, regex in self.fields.items():
-            match = re.search(regex, self.raw)
+            match = regex.search(results)
             if match:
                 # hardcoded clear up, better to add this to fields
                 self.data[field] = match.group(1).replace(',', '')
@@ -53,23 +136,81 @@ class LinuxPerfPluginBase:
 
 class PerfData(LinuxPerfPluginBase):
     """All data generated by perf as well as external dictionary"""
+    # Hard-coded list of perf events plus other data it spews
+    # well, the ones we support at least (compiled once, shared)
+    FIELDS = {
+        'instructions' : re.compile(r'([\d,]+)\s+instructions'),
+        'cycles' : re.compile(r'([\d,]+)\s+cycles'),
+        'cpu-migrations' : re.compile(r'([\d,]+)\s+cpu-migrations'),
+        'context-switches' : re.compile(r'([\d,]+)\s+context-switches'),
+        'page-faults' : re.compile(r'([\d,]+)\s+page-faults'),
+        'branches' : re.compile(r'([\d,]+)\s+branches'),
+        'branch-misses' : re.compile(r'([\d,]+)\s+branch-misses'),
+        'elapsed' : re.compile(r'(\d+\.\d+)\s+seconds time elapsed')
+    }
+    # Counts perf scaled because the event wasn't counted all the time:
+    # value (or <not counted>), event, ..., (percentage of the time)
+    MUX = re.compile(r'^\s*(?:[\d,.]+|<not counted>)\s+(\S+)[^\n]*?'
+                     r'\((\d+(?:\.\d+)?)%\)\s*$', re.M)
+    # All the other counters in one scan: value, [pmu/]event[/]
+    COUNTERS = re.compile(r'^\s*([\d,]+)\s+(?:[\w-]+/)?(' +
+                          '|'.join(map(re.escape, COUNTERS)) + r')/?(?![\w-])',
+                          re.M)
+    # Metrics: ... # 40.8 % tma_backend_bound
+    TMA = re.compile(r'#\s+(\d+(?:\.\d+)?)\s*%\s+(' + TMA_PREFIX + r'\w+)')
+    # perf stat --topdown: a line of labels and one of percentages (per
+    # core with -a, after the core and its number of CPUs)
+    TOPDOWN = re.compile(r'^\s*(retiring\s{2,}.*\S)[ \t]*\n((?:[^\n]*%[ \t]*\n?)+)',
+                         re.M)
+
     def __init__(self):
         super().__init__()
-        # Hard-coded list of perf events plus other data it spews
-        # well, the ones we support at least
-        self.fields = {
-            'instructions' : r'([\d,]+)\s+instructions',
-            'cycles' : r'([\d,]+)\s+cycles',
-            'cpu-migrations' : r'([\d,]+)\s+cpu-migrations',
-            'context-switches' : r'([\d,]+)\s+context-switches',
-            'page-faults' : r'([\d,]+)\s+page-faults',
-            'branches' : r'([\d,]+)\s+branches',
-            'branch-misses' : r'([\d,]+)\s+branch-misses',
-            'elapsed' : r'(\d+\.\d+)\s+seconds time elapsed'
-        }
+        self.fields = self.FIELDS
         # This plugin aggregates results from all other plugins
         self.ext = dict()
 
+    def add_events(self, events):
+        """Parses other events too (not in FIELDS)"""
+        for event in events:
+            name = _event_name(event)
+            if name in self.fields:
+                continue
+            if self.fields is self.FIELDS:
+                self.fields = dict(self.FIELDS)
+            self.fields[name] = re.compile(r'([\d,]+(?:\.\d+)?)\s+' +
+                                           re.escape(name) + r'(?![\w-])')
+
+    def parse(self, results):
+        """Parses the raw output, with the multiplexing ratios perf reports
+           (mux:<event>, fraction of the run it was counted)"""
+        super().parse(results)
+        if results:
+            for match in self.MUX.finditer(results):
+                ratio = float(match.group(2)) / 100
+                self.data[MUX_PREFIX + _event_name(match.group(1))] = repr(ratio)
+            for match in self.COUNTERS.finditer(results):
+                self.data.setdefault(match.group(2), match.group(1).replace(',', ''))
+            for match in self.TMA.finditer(results):
+                self.data[match.group(2)] = match.group(1)
+            self._topdown(results)
+        return self.data
+
+    def _topdown(self, results):
+        """Percentages of the perf stat --topdown table, as tma_* metrics
+           (averaged over the rows, one per core with -a)"""
+        match = self.TOPDOWN.search(results)
+        if not match:
+            return
+        labels = [label.lower() for label in re.split(r'\s{2,}', match.group(1))]
+        rows = [re.findall(r'(\d+(?:\.\d+)?)%', line)[-len(labels):]
+                for line in match.group(2).splitlines()]
+        rows = [row for row in rows if len(row) == len(labels)]
+        for num, label in enumerate(labels):
+            name = TMA_PREFIX + TOPDOWN_LABELS.get(label, label.replace(' ', '_'))
+            if rows and name not in self.data:
+                total = sum(float(row[num]) for row in rows)
+                self.data[name] = repr(total / len(rows))
+
     def get_value(self, key):
         """ Get the value from data or ext"""
         value = super().get_value(key)
@@ -90,6 +231,17 @@ class PerfData(LinuxPerfPluginBase):
         self.ext.clear()
         self.ext.update(data)
 
+    def get_values(self):
+        """Returns all numeric values (perf and ext) as a dictionary of floats"""
+        values = dict()
+        for source in (self.data, self.ext):
+            for key, val in source.items():
+                try:
+                    values[key] = float(val)
+                except (TypeError, ValueError):
+                    continue
+        return values
+
     def __str__(self):
         """Class name, for lists"""
         return "PerfData"
@@ -102,12 +254,58 @@ class PerfData(LinuxPerfPluginBase):
         string += repr(len(self.ext)) + " ext data ]"
         return string
 
+class PerfRecord:
+    """Numeric values of one log, as compact as possible: the name, a key
+       schema shared by all records with the same keys and an array of
+       doubles. About a hundred bytes plus eight per value"""
+    __slots__ = ('name', 'keys', 'values')
+
+    # Key tuple -> (same tuple, key -> position), shared between records
+    _schemas = dict()
+
+    def __init__(self, name, values):
+        if not isinstance(name, str):
+            raise TypeError("Name must be string")
+        if not isinstance(values, dict):
+            raise TypeError("Values must be dictionary")
+        keys = tuple(values)
+        schema = PerfRecord._schemas.get(keys)
+        if schema is None:
+            schema = PerfRecord._schemas[keys] = (
+                keys, {key: pos for pos, key in enumerate(keys)})
+        self.name = name
+        self.keys = schema[0]
+        self.values = array('d', values.values())
+
+    def get_value(self, key):
+        """Gets a value by name (or the log name), 0 if there isn't one"""
+        if key == 'name':
+            return self.name
+        pos = PerfRecord._schemas[self.keys][1].get(key)
+        if pos is None:
+            return 0
+        return self.values[pos]
+
+    def get_values(self):
+        """Returns all values as a dictionary of floats"""
+        return dict(zip(self.keys, self.values))
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "PerfRecord"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        return "[ PerfRecord: " + self.name + ", " + repr(len(self.keys)) + " value(s) ]"
+
 class LinuxPerf:
     """Main class, calls perf stat with some options, saves output for plugins
        to analyse, parses and stores the perf data in the object for later
        enquiry.
     """
-    def __init__(self, program=None, plugin=None):
+    def __init__(self, program=None, plugin=None, perf=None):
+        # perf command, found in the path by default
+        self.perf = perf
         # list of arguments
         self.program = list()
         if isinstance(program, list) and program:
@@ -121,6 +319,8 @@ class LinuxPerf:
         # raw output / stderr (perfdata)
         self.output = None
         self.perfdata = None
+        # values of each run, in adaptive repeats
+        self.runs = list()
 
     def append_argument(self, argument):
         """Appends argument(s) to the program list"""
@@ -130,6 +330,9 @@ class LinuxPerf:
             self.program.append(argument)
 
     def perf_command(self):
+        """Path of perf, checking it can be used (a given one is trusted)"""
+        if self.perf:
+            return self.perf
         # Verify that perf is actually installed
         command = shutil.which('perf')
         if not command:
@@ -140,30 +343,105 @@ class LinuxPerf:
             raise RuntimeError("Can't run perf with CAP_SYS_ADMIN higher than 2")
         return command
 
-    def stat(self, repeat=1, events=None):
-        """Runs perf stat on the process, saving the output"""
+    def stat(self, repeat=1, events=None, counters=None):
+        """Runs perf stat on the process, saving the output. With a number
+           of hardware counters, events are scheduled in groups that fit,
+           one run per group: the output is the first run's, the perf data
+           all of them"""
         call = [self.perf_command(), 'stat']
         # Repeat the run N times, reports stdev
         if repeat > 1:
-            call.extend(['-r', repeat])
+            call.extend(['-r', str(repeat)])
         # Collects only a few events (empty = all)
         if isinstance(events, list):
             self.events.extend(events)
-        if self.events:
-            call.append('-e')
-            ev_str = ''
-            for event in self.events:
-                ev_str += event
-                ev_str += ','
-            ev_str.pop()
-            print(ev_str)
-            call.append(ev_str)
-        # Adding program to perf
-        call.extend(self.program)
-        # Call and collect output
-        result = subprocess.run(call, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        self.output = result.stdout.decode('utf-8')
-        self.perfdata = result.stderr.decode('utf-8')
+        if counters is None:
+            passes = [self.events] if self.events else [None]
+        elif not self.events:
+            raise ValueError("Scheduling counters needs a list of events")
+        else:
+            passes = schedule(self.events, counters)
+
+        outputs = list()
+        perfdata = list()
+        for group in passes:
+            command = list(call)
+            if group:
+                command.append('-e')
+                command.append(','.join(group) if counters is None
+                               else event_list(group))
+            # Adding program to perf
+            command.extend(self.program)
+            # Call and collect output
+            result = subprocess.run(command, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            outputs.append(result.stdout.decode('utf-8'))
+            perfdata.append(result.stderr.decode('utf-8'))
+            STATS.count('perf passes')
+        self.output = outputs[0]
+        self.perfdata = ''.join(perfdata)
+
+    def stat_adaptive(self, metrics, options=None, events=None):
+        """Runs perf stat once at a time, until the confidence interval of the
+           mean of every metric is narrow enough, or the maximum number of
+           runs. Data is then the mean of all runs, with the number of runs
+           and the relative CI width of each metric (ci:<metric>). Returns
+           the CI widths. Options:
+            * target     : relative CI width to reach (default 0.02)
+            * confidence : of the interval (default 0.95)
+            * min, max   : number of runs (default 3, 30)
+            * counters   : hardware counters, to schedule events (default
+                           None, all at once)"""
+        if not isinstance(metrics, list) or not metrics:
+            raise TypeError("Adaptive repeats need a list of metrics")
+        settings = {'target': 0.02, 'confidence': 0.95, 'min': 3, 'max': 30,
+                    'counters': None}
+        if options is not None:
+            if not isinstance(options, dict):
+                raise TypeError("Adaptive repeat options must be a dictionary")
+            unknown = set(options) - set(settings)
+            if unknown:
+                raise ValueError("Unknown option(s): " + ", ".join(sorted(unknown)))
+            settings.update(options)
+        if not 2 <= settings['min'] <= settings['max']:
+            raise ValueError("Adaptive repeats need 2 <= min <= max runs")
+
+        running = {metric: RunningStats() for metric in metrics}
+        widths = dict()
+        self.runs = list()
+        # Nothing from previous runs
+        self.data.append(dict())
+        if isinstance(events, list):
+            self.events.extend(events)
+        while len(self.runs) < settings['max']:
+            self.stat(counters=settings['counters'])
+            values = self.parse().get_values()
+            self.runs.append(values)
+            for metric, stats in running.items():
+                if metric not in values:
+                    raise RuntimeError("No " + metric + " in run " +
+                                       repr(len(self.runs)))
+                stats.update(values[metric])
+            STATS.count('adaptive runs')
+            widths = {metric: stats.ci_width(settings['confidence'])
+                      for metric, stats in running.items()}
+            if len(self.runs) >= settings['min'] and \
+               max(widths.values()) <= settings['target']:
+                break
+
+        # Mean of every value all runs have, and the precision reached
+        keys = set.intersection(*[set(values) for values in self.runs])
+        means = {key: sum(values[key] for values in self.runs) / len(self.runs)
+                 for key in self.runs[0] if key in keys}
+        self.data.data = {key: repr(val) for key, val in means.items()
+                          if key in self.data.fields}
+        ext = {key: val for key, val in means.items()
+               if key not in self.data.fields}
+        ext['runs'] = len(self.runs)
+        for metric, width in widths.items():
+            ext[CI_PREFIX + metric] = width
+        self.data.append(ext)
+        return widths
 
     def parse(self, out=None, err=None):
         """Parses the output of perf stat / external output"""
@@ -185,9 +463,28 @@ class LinuxPerf:
             self.data.append(results)
 
         # Parses the stderr buffer (linux perf output)
+        self.data.add_events(self.events)
         self.data.parse(self.perfdata)
+        # Requested events perf didn't scale were counted all the time
+        for event in map(_event_name, self.events):
+            if event in self.data.data and MUX_PREFIX + event not in self.data.data:
+                self.data.data[MUX_PREFIX + event] = '1.0'
+        STATS.count('fields matched', len(self.data.data) + len(self.data.ext))
         return self.data
 
+    def check(self):
+        """Returns the problems of the parsed data (empty if there are none):
+           no perf stat output, required benchmark fields not found"""
+        problems = list()
+        if not self.data.data:
+            problems.append("no perf stat output")
+        if self.plugin:
+            missing = [field for field in self.plugin.REQUIRED
+                       if field not in self.data.ext]
+            if missing:
+                problems.append("missing " + ", ".join(missing))
+        return problems
+
     def get_value(self, key):
         """Gets a key from PerfData"""
         return self.data.get_value(key)
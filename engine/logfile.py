@@ -0,0 +1,134 @@
+"""
+ Log Files - Reads plain, compressed and archived logs
+
+ Logs can be plain text, compressed (.gz, .bz2, .xz/.lzma, .zst) or tar
+ archives of logs (.tar, .tgz, .tar.gz, .tar.xz, .tar.zst, ...). Archives
+ are streamed: members are decompressed and handed over one at a time, in
+ archive order, without extracting anything to disk. Members keep the
+ directory they're in inside the archive (reldir, as in a directory walk).
+
+ zstd needs the optional 'zstandard' module, everything else is in the
+ standard library.
+
+ Usage:
+   for name, text in read_logs('logs/gcc-O2-4.log.gz'):
+     ...
+   for name, text in read_logs('logs/matrix.tar.zst'):
+     ...
+   for reldir, name, stream in stream_logs('logs/matrix.tgz'):
+     for line in stream: ...            # one member at a time, in order
+   strip_extension('gcc-O2-4.log.gz')   # -> 'gcc-O2-4'
+   extension('gcc-O2-4.report.gz')      # -> '.report'
+"""
+
+import bz2
+import codecs
+import gzip
+import lzma
+import os
+import posixpath
+import re
+import tarfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _open_zstd(path):
+    """Binary stream of a zstd compressed file"""
+    if zstandard is None:
+        raise RuntimeError("Reading " + path + " needs the zstandard module")
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                      closefd=True)
+
+# Compression suffix -> function opening a binary stream of the contents
+COMPRESSION = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+    '.lzma': lzma.open,
+    '.zst': _open_zstd,
+}
+
+# Short forms of compressed archives
+ARCHIVES = {
+    '.tgz': '.tar.gz',
+    '.tbz2': '.tar.bz2',
+    '.txz': '.tar.xz',
+    '.tzst': '.tar.zst',
+}
+
+_EXTENSION = re.compile(r'\.[^-\.]+$')
+
+def _suffixes(name):
+    """Compression suffix (or None) and whether it's a tar archive"""
+    lower = name.lower()
+    for short, full in ARCHIVES.items():
+        if lower.endswith(short):
+            lower = lower[:-len(short)] + full
+    compression = None
+    for suffix in COMPRESSION:
+        if lower.endswith(suffix):
+            compression = suffix
+            lower = lower[:-len(suffix)]
+            break
+    return compression, lower.endswith('.tar')
+
+def is_archive(name):
+    """True if name is a (compressed or not) tar archive"""
+    return _suffixes(name)[1]
+
+def strip_extension(name):
+    """Log name without compression suffix and extension, so double
+       extensions (.log.gz) don't end up in the last category"""
+    compression, _ = _suffixes(name)
+    if compression:
+        name = name[:-len(compression)]
+    return _EXTENSION.sub('', name)
+
+def extension(name):
+    """Extension of a log name, ignoring the compression suffix"""
+    compression, _ = _suffixes(name)
+    if compression:
+        name = name[:-len(compression)]
+    match = _EXTENSION.search(name)
+    return match.group(0) if match else ''
+
+def _text(stream):
+    """Logs are text, but a bad byte shouldn't stop the whole corpus"""
+    return codecs.getreader('utf-8')(stream, errors='replace')
+
+def _members(stream):
+    """Yields (directory, name, text stream) for every regular, non hidden,
+       file in a tar stream, the directory relative to the archive's top
+       ('' there)"""
+    with tarfile.open(fileobj=stream, mode='r|*') as tar:
+        for member in tar:
+            reldir, name = posixpath.split(posixpath.normpath(member.name))
+            if not member.isfile() or name.startswith('.'):
+                continue
+            reldir = reldir.lstrip('/')
+            yield ('' if reldir == '.' else reldir), name, \
+                _text(tar.extractfile(member))
+
+def stream_logs(path):
+    """Yields (directory, name, text stream) of the log(s) in a file: itself
+       ('' directory) if it's a log, compressed or not, or all its members
+       (with their directory inside the archive) if it's an archive. Each
+       stream must be consumed before asking for the next one"""
+    compression, archive = _suffixes(path)
+    if compression:
+        stream = COMPRESSION[compression](path)
+    else:
+        stream = open(path, 'rb')
+    with stream:
+        if archive:
+            yield from _members(stream)
+        else:
+            yield '', os.path.basename(path), _text(stream)
+
+def read_logs(path):
+    """Yields (name, text) of the log(s) in a file, see stream_logs()"""
+    for _, name, stream in stream_logs(path):
+        yield name, stream.read()
@@ -13,33 +13,35 @@ from linux_perf import LinuxPerfPluginBase
 
 class LinuxPerfPlugin(LinuxPerfPluginBase):
     """Plugin for LinuxPerf, parses Lulesh output, return dictionary"""
+    # Hard-coded list of perf events plus other data it spews
+    # well, the ones we support at least (compiled once, shared)
+    FIELDS = {
+        'ProblemSize' : re.compile(r'Problem size\s+=\s+(\d+)'),
+        'IterationCount' : re.compile(r'Iteration count\s+=\s+(\d+)'),
+        'FinalEnergy' : re.compile(r'Final Origin Energy\s+=\s+(\d+[^\s]*)'),
+        'MaxAbsDiff' : re.compile(r'MaxAbsDiff\s+=\s+(\d+[^\s]*)'),
+        'TotalAbsDiff' : re.compile(r'TotalAbsDiff\s+=\s+(\d+[^\s]*)'),
+        'MaxRelDiff' : re.compile(r'MaxRelDiff\s+=\s+(\d+[^\s]*)'),
+        'Elements' : re.compile(r'Total number of elements:\s+(\d+)'),
+        'Threads' : re.compile(r'Num threads: (\d+)'),
+        'Grind' : re.compile(r'Grind time\(us\/z\/c\)\s+=\s+(\d+)'),
+        'FOM' : re.compile(r'FOM\s+=\s+(\d+)')
+    }
+    # No figure of merit, the run didn't complete
+    REQUIRED = ('FOM',)
+
     def __init__(self):
         super().__init__()
-        # Hard-coded list of perf events plus other data it spews
-        # well, the ones we support at least
-        self.fields = {
-            'ProblemSize' : r'Problem size\s+=\s+(\d+)',
-            'IterationCount' : r'Iteration count\s+=\s+(\d+)',
-            'FinalEnergy' : r'Final Origin Energy\s+=\s+(\d+[^\s]*)',
-            'MaxAbsDiff' : r'MaxAbsDiff\s+=\s+(\d+[^\s]*)',
-            'TotalAbsDiff' : r'TotalAbsDiff\s+=\s+(\d+[^\s]*)',
-            'MaxRelDiff' : r'MaxRelDiff\s+=\s+(\d+[^\s]*)',
-            'Elements' : r'Total number of elements:\s+(\d+)',
-            'Threads' : r'Num threads: (\d+)',
-            'Grind' : r'Grind time\(us\/z\/c\)\s+=\s+(\d+)',
-            'FOM' : r'FOM\s+=\s+(\d+)'
-        }
+        self.fields = self.FIELDS
         self.data = dict()
-        self.raw = None
 
     def parse(self, results):
-        """Parses raw output"""
-        if isinstance(results, str):
-            self.raw = results
-        else:
+        """Parses raw output (not kept), nothing from the previous one"""
+        if not isinstance(results, str):
             return None
+        self.data.clear()
         for field, regex in self.fields.items():
-            match = re.search(regex, self.raw)
+            match = regex.search(results)
             if match:
                 self.data[field] = match.group(1)
         return self.data
@@ -0,0 +1,119 @@
+"""
+ Perf Report - Per-symbol hotspots from perf report / perf script output
+
+ Parses pre-captured text (no perf needed) of:
+  * perf report --stdio   : one line per symbol with its overhead (with
+                            --children, the 'Self' column is used)
+  * perf script           : one sample per header line, followed by its call
+                            chain (or the leaf on the same line); the leaf
+                            symbol gets the sample's period (or 1)
+
+ Both are parsed line by line from any iterable (an open file, a stream from
+ logfile.stream_logs()), so dumps are never loaded whole in memory.
+
+ Results are percentages of samples per symbol, as 'sym:<name>' keys, ready
+ to be added to a log's values. Symbols below a threshold are dropped, so
+ records stay small: analyses take them as 0% in the logs with a report
+ (and leave out the logs without one), so that a symbol's share moving
+ between logs is still seen (see Data.results()).
+
+ Report/script files sit next to the logs, with the same name and a .report
+ or .script extension (compressed or not): gcc-O2-4.log + gcc-O2-4.report
+
+ Usage:
+   with open('gcc-O2-4.report') as report:
+     values = hotspots(report)   # -> {'sym:CalcFoo': 45.2, ...}
+"""
+
+import re
+from itertools import chain
+from logfile import extension
+
+PREFIX = 'sym:'
+EXTENSIONS = ('.report', '.script')
+THRESHOLD = 0.5
+
+# perf report: [children%] self% command dso [x] symbol
+_REPORT = re.compile(r'^\s*(\d+\.\d+)%\s+(?:(\d+\.\d+)%\s+)?.*?\[[.kgu]\]\s+(.+?)\s*$')
+# perf script: comm pid [cpu] time: [period] event: [inline leaf]
+_SAMPLE = re.compile(r'^\S.*?\s\d+\.\d+:\s+(?:(\d+)\s+)?[^\s:]+(?::\w+)?:\s*(.*)$')
+# perf script: ip symbol[+offset] (dso)
+_FRAME = re.compile(r'^\s*[0-9a-f]+\s+(.+?)(?:\+0x[0-9a-f]+)?\s+\(.*\)\s*$')
+
+def is_report(name):
+    """True if the file name is a perf report / script dump"""
+    return extension(name) in EXTENSIONS
+
+def _percentages(weights, total, threshold):
+    """Symbol -> weight as 'sym:' percentages above threshold"""
+    if not total:
+        return dict()
+    values = dict()
+    for symbol, weight in sorted(weights.items(), key=lambda item: -item[1]):
+        percent = 100.0 * weight / total
+        if percent < threshold:
+            break
+        values[PREFIX + symbol] = percent
+    return values
+
+def parse_report(lines, threshold=THRESHOLD):
+    """Percentage of samples per symbol from perf report --stdio"""
+    weights = dict()
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        match = _REPORT.match(line)
+        if not match:
+            continue
+        percent = float(match.group(2) or match.group(1))
+        symbol = match.group(3)
+        weights[symbol] = weights.get(symbol, 0.0) + percent
+    # Report lines are already percentages (of the whole profile)
+    return _percentages(weights, 100.0, threshold)
+
+def parse_script(lines, threshold=THRESHOLD):
+    """Percentage of samples (weighted by period) per leaf symbol from perf
+       script"""
+    weights = dict()
+    total = 0
+    pending = 0
+    for line in lines:
+        if not line.strip() or line.startswith('#'):
+            continue
+        # Call chain lines are indented, only the first (leaf) one counts
+        if line[0].isspace():
+            if pending:
+                match = _FRAME.match(line)
+                if match:
+                    symbol = match.group(1)
+                    weights[symbol] = weights.get(symbol, 0) + pending
+                    pending = 0
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        weight = int(match.group(1) or 1)
+        total += weight
+        pending = weight
+        # Without call chains, the leaf is on the same line
+        if match.group(2):
+            frame = _FRAME.match(match.group(2))
+            if frame:
+                symbol = frame.group(1)
+                weights[symbol] = weights.get(symbol, 0) + weight
+                pending = 0
+    return _percentages(weights, total, threshold)
+
+def hotspots(lines, threshold=THRESHOLD):
+    """Percentage of samples per symbol from either perf report --stdio or
+       perf script, told apart by the first line with data"""
+    lines = iter(lines)
+    header = list()
+    for line in lines:
+        header.append(line)
+        if line.strip() and not line.startswith('#'):
+            break
+    lines = chain(header, lines)
+    if header and _REPORT.match(header[-1]):
+        return parse_report(lines, threshold)
+    return parse_script(lines, threshold)
@@ -0,0 +1,387 @@
+"""
+ Query - A small query language over Data, for filtering, grouping and
+ aggregating metrics without exporting to spreadsheets
+
+ Syntax (keywords are case insensitive):
+   select <fields> [where <cond> [and <cond> ...]] [group by <fields>]
+                   [agg <function>]
+
+  * fields    : metric names (FOM, cycles, ...), '*' for all metrics, catN for
+                the N-th category (from 0) or run
+  * cond      : <field> <op> <value>, op is one of = != < <= > >=, or
+                <field> [not] in (<value>, <value>, ...)
+                Categories compare as text on = != in, as numbers on < <= > >=
+  * group by  : categories (catN / run) to group on
+  * function  : count, sum, mean, median, min, max, stdev (default: mean)
+                stdev is the sample one (ddof=1), as in the log summary
+
+ Filtering and aggregation are vectorised over Data's columns and category
+ codes: no per-log Python work other than building the columns once.
+
+ Example:
+   select FOM, cycles where cat1 in (gcc6, llvm5) and cat3 >= 4
+          group by cat2 agg median
+
+ Usage:
+   result = Query("select FOM where cat3 = 8").run(data)
+   print(result)
+"""
+
+import re
+import numpy as np
+
+KEYWORDS = ('select', 'where', 'and', 'not', 'in', 'group', 'by', 'agg')
+OPERATORS = ('=', '==', '!=', '<', '<=', '>', '>=', 'in', 'not in')
+AGGREGATES = ('count', 'sum', 'mean', 'median', 'min', 'max', 'stdev')
+
+_TOKEN = re.compile(r'''\s*(?:(<=|>=|!=|==|[=<>(),*])|'([^']*)'|"([^"]*)"|([^\s=<>!(),'"]+))''')
+
+def _tokenize(text):
+    """Splits the query into tokens: ('op', x), ('str', x) or ('word', x)"""
+    tokens = list()
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError("Invalid query near '" + text[pos:] + "'")
+        pos = match.end()
+        if match.group(1):
+            tokens.append(('op', match.group(1)))
+        elif match.group(2) is not None:
+            tokens.append(('str', match.group(2)))
+        elif match.group(3) is not None:
+            tokens.append(('str', match.group(3)))
+        else:
+            tokens.append(('word', match.group(4)))
+    return tokens
+
+def _integers(column):
+    """True if all numbers of a column (nan aside) print as integers"""
+    return all(isinstance(value, str) or np.isnan(value) or
+               (float(value).is_integer() and abs(value) < 1e18)
+               for value in column)
+
+def _format(value, integer=False):
+    """Formats a number for the result table, as an integer or not, the same
+       for all the column"""
+    if isinstance(value, str):
+        return value
+    if np.isnan(value):
+        return '-'
+    if integer:
+        return str(int(value))
+    return '{:.6g}'.format(value)
+
+class QueryResult:
+    """Table of results: a header and rows of values"""
+    def __init__(self, header, rows):
+        self.header = header
+        self.rows = rows
+
+    def __str__(self):
+        """Aligned table, one number format per column"""
+        integers = [_integers(column) for column in zip(*self.rows)]
+        table = [self.header] + [[_format(val, integer) for val, integer
+                                  in zip(row, integers)] for row in self.rows]
+        widths = [max(len(row[col]) for row in table)
+                  for col in range(len(self.header))]
+        lines = list()
+        for row in table:
+            lines.append("  ".join(val.ljust(width)
+                                   for val, width in zip(row, widths)).rstrip())
+        return "\n".join(lines)
+
+    def __repr__(self):
+        """Pretty-printing"""
+        return "[ QueryResult: " + repr(len(self.rows)) + " row(s) ]"
+
+class Query:
+    """Parsed query, can be run against any Data"""
+    def __init__(self, text):
+        if not isinstance(text, str):
+            raise TypeError("Query must be a string")
+        self.text = text
+        self.fields = list()
+        self.conditions = list()
+        self.group = list()
+        self.agg = None
+        self._tokens = _tokenize(text)
+        self._pos = 0
+        self._parse()
+
+    # Parser
+
+    def _peek(self):
+        """Next token, without consuming it"""
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return (None, None)
+
+    def _next(self):
+        """Consumes and returns the next token"""
+        token = self._peek()
+        if token[0] is None:
+            raise ValueError("Unexpected end of query")
+        self._pos += 1
+        return token
+
+    def _keyword(self, word):
+        """Consumes keyword 'word' if it's next, returns True if it was"""
+        kind, value = self._peek()
+        if kind == 'word' and value.lower() == word:
+            self._pos += 1
+            return True
+        return False
+
+    def _expect(self, word):
+        """Consumes keyword 'word', or fails"""
+        if not self._keyword(word):
+            raise ValueError("Expected '" + word + "' in query")
+
+    def _name(self):
+        """Consumes a field name"""
+        kind, value = self._next()
+        if kind == 'op' and value == '*':
+            return value
+        if kind not in ('word', 'str') or (kind == 'word' and
+                                           value.lower() in KEYWORDS):
+            raise ValueError("Expected a field name, got '" + value + "'")
+        return value
+
+    def _value(self):
+        """Consumes a value (word or quoted string)"""
+        kind, value = self._next()
+        if kind == 'op':
+            raise ValueError("Expected a value, got '" + value + "'")
+        return value
+
+    def _list(self, parse):
+        """Consumes a comma separated list of items"""
+        items = [parse()]
+        while self._peek() == ('op', ','):
+            self._pos += 1
+            items.append(parse())
+        return items
+
+    def _condition(self):
+        """Consumes one condition: field, operator and values"""
+        field = self._name()
+        if self._keyword('not'):
+            self._expect('in')
+            operator = 'not in'
+        elif self._keyword('in'):
+            operator = 'in'
+        else:
+            kind, operator = self._next()
+            if kind != 'op' or operator not in OPERATORS:
+                raise ValueError("Invalid operator '" + operator + "'")
+            if operator == '==':
+                operator = '='
+        if operator in ('in', 'not in'):
+            if self._next() != ('op', '('):
+                raise ValueError("Expected '(' after " + operator)
+            values = self._list(self._value)
+            if self._next() != ('op', ')'):
+                raise ValueError("Expected ')' to close " + operator)
+        else:
+            values = [self._value()]
+        return (field, operator, values)
+
+    def _parse(self):
+        """select ... [where ...] [group by ...] [agg ...]"""
+        self._expect('select')
+        self.fields = self._list(self._name)
+        if self._keyword('where'):
+            self.conditions.append(self._condition())
+            while self._keyword('and'):
+                self.conditions.append(self._condition())
+        if self._keyword('group'):
+            self._expect('by')
+            self.group = self._list(self._name)
+        if self._keyword('agg'):
+            self.agg = self._name().lower()
+            if self.agg not in AGGREGATES:
+                raise ValueError("Unknown aggregate '" + self.agg + "'")
+        if self._peek()[0] is not None:
+            raise ValueError("Unexpected '" + self._peek()[1] + "' in query")
+        if self.group and not self.agg:
+            self.agg = 'mean'
+
+    # Execution
+
+    @staticmethod
+    def _position(data, field):
+        """Category position of a field (-1 = run), None if it's a metric"""
+        if field.lower() == 'run':
+            return -1
+        match = re.fullmatch(r'cat(\d+)', field.lower())
+        if match:
+            position = int(match.group(1))
+            if position >= data.num_cat:
+                raise ValueError("No category " + field + " in " + str(data))
+            return position
+        return None
+
+    def _mask(self, data, field, operator, values):
+        """Boolean mask over all logs for one condition"""
+        position = self._position(data, field)
+        if position is None:
+            column = data.columns().get(field)
+            if column is None:
+                raise ValueError("Unknown metric '" + field + "'")
+            numbers = np.array([float(val) for val in values])
+            if operator in ('in', 'not in'):
+                mask = np.isin(column, numbers)
+                return ~mask if operator == 'not in' else mask
+            return _compare(column, operator, numbers[0])
+
+        # Categories: evaluate once per distinct value, then expand by code
+        names, codes = data.category(position)
+        if operator in ('=', '!=', 'in', 'not in'):
+            hits = np.array([name in values for name in names], dtype=bool)
+            if operator in ('!=', 'not in'):
+                hits = ~hits
+        else:
+            numbers = np.array([_float(name) for name in names])
+            with np.errstate(invalid='ignore'):
+                hits = _compare(numbers, operator, float(values[0]))
+        if not len(hits):
+            return np.zeros(len(codes), dtype=bool)
+        return hits[codes]
+
+    def _metrics(self, data):
+        """Metric names selected, in order"""
+        metrics = list()
+        for field in self.fields:
+            if field == '*':
+                metrics.extend(sorted(data.columns()))
+            elif self._position(data, field) is None:
+                if field not in data.columns():
+                    raise ValueError("Unknown metric '" + field + "'")
+                metrics.append(field)
+        return metrics
+
+    def run(self, data):
+        """Runs the query on data, returns a QueryResult"""
+        mask = np.ones(len(data.records), dtype=bool)
+        for field, operator, values in self.conditions:
+            mask &= self._mask(data, field, operator, values)
+        ids = np.flatnonzero(mask)
+        metrics = self._metrics(data)
+        columns = data.columns()
+        cats = [field for field in self.fields
+                if field != '*' and self._position(data, field) is not None]
+
+        # Plain selection: one row per log
+        if not self.group and not self.agg:
+            header = ['name'] + cats + metrics
+            cat_values = [data.category(self._position(data, field))
+                          for field in cats]
+            rows = list()
+            for log_id in ids:
+                run, _, leaf = data.get_log(log_id)
+                row = [run + "/" + leaf.get_value('name')]
+                row += [names[codes[log_id]] for names, codes in cat_values]
+                row += [columns[metric][log_id] for metric in metrics]
+                rows.append(row)
+            return QueryResult(header, rows)
+
+        # Aggregation, over groups of category codes (or everything)
+        header = list(self.group)
+        group_names = list()
+        if self.group:
+            group_codes = list()
+            for field in self.group:
+                position = self._position(data, field)
+                if position is None:
+                    raise ValueError("Can only group by categories, not " + field)
+                names, codes = data.category(position)
+                group_codes.append(codes[ids])
+                group_names.append(names)
+            keys = np.array(group_codes, dtype=np.int64).reshape(
+                len(group_codes), len(ids)).T
+            uniq, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            uniq = np.zeros((1, 0), dtype=np.int64)
+            inverse = np.zeros(len(ids), dtype=np.int64)
+
+        aggregated = [_aggregate(columns[metric][ids], inverse, len(uniq),
+                                 self.agg) for metric in metrics]
+        header += [self.agg + "(" + metric + ")" for metric in metrics]
+        rows = list()
+        for num, key in enumerate(uniq):
+            row = [group_names[col][code] for col, code in enumerate(key)]
+            row += [values[num] for values in aggregated]
+            rows.append(row)
+        return QueryResult(header, rows)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Query"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        return "[ Query: " + self.text + " ]"
+
+def _float(value):
+    """Category as number, nan if it isn't one"""
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def _compare(column, operator, value):
+    """Vectorised comparison (nan never matches)"""
+    if operator == '=':
+        return column == value
+    if operator == '!=':
+        return ~np.isnan(column) & (column != value)
+    with np.errstate(invalid='ignore'):
+        if operator == '<':
+            return column < value
+        if operator == '<=':
+            return column <= value
+        if operator == '>':
+            return column > value
+        return column >= value
+
+def _aggregate(values, groups, num_groups, function):
+    """Aggregates values by group number, ignoring nan, one pass per group
+       set (bincount) or one sort (order statistics)"""
+    valid = ~np.isnan(values)
+    values = values[valid]
+    groups = groups[valid]
+    count = np.bincount(groups, minlength=num_groups).astype(float)
+    if function == 'count':
+        return count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = np.bincount(groups, values, minlength=num_groups)
+        if function == 'sum':
+            return total
+        mean = np.where(count > 0, total / count, np.nan)
+        if function == 'mean':
+            return mean
+        if function == 'stdev':
+            # Sample stdev (ddof=1) as Data.sample_stats, nan below two values
+            dev = (values - mean[groups])**2
+            return np.where(count > 1, np.sqrt(
+                np.bincount(groups, dev, minlength=num_groups) / (count - 1)),
+                            np.nan)
+    # Order statistics: sort by (group, value) once, pick by offset
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    counts = count.astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full(num_groups, np.nan)
+    has = counts > 0
+    if function == 'min':
+        result[has] = ordered[starts[has]]
+    elif function == 'max':
+        result[has] = ordered[starts[has] + counts[has] - 1]
+    else:
+        lower = ordered[starts[has] + (counts[has] - 1) // 2]
+        upper = ordered[starts[has] + counts[has] // 2]
+        result[has] = (lower + upper) / 2.0
+    return result
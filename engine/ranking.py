@@ -0,0 +1,92 @@
+"""
+ Ranking - Keeps only the biggest "low hanging fruits" out of all findings
+
+ Every analysis pass can flag values (outliers, points far from a fit,
+ significant deltas against a baseline). Each flag is a Finding, scored by
+ its relative distance to what was expected, so that findings on different
+ metrics can be compared. The absolute distance (ex. cycles lost) is kept as
+ the impact.
+
+ The ranking streams over findings and keeps the top K in a min-heap, so it
+ never holds (or sorts) more than K of them, however large the corpus.
+
+ Usage:
+   rank = Ranking(10)
+   rank.extend(data.analyse())
+   for finding in rank.results():
+     print(finding)
+"""
+
+import heapq
+import math
+
+class Finding:
+    """A flagged value: what was found, where and how far from expected"""
+    def __init__(self, kind, name, metric, value, reference):
+        self.kind = kind
+        self.name = name
+        self.metric = metric
+        self.value = float(value)
+        self.reference = float(reference)
+        self.impact = self.value - self.reference
+        if self.reference:
+            self.score = abs(self.impact / self.reference)
+        else:
+            self.score = math.inf if self.impact else 0.0
+
+    def __str__(self):
+        """Class name, for lists"""
+        string = self.kind + ": " + self.name + " " + self.metric + " = "
+        string += repr(self.value) + " (expected " + repr(self.reference)
+        string += ", {:+.2%})".format(self.impact / self.reference
+                                      if self.reference else math.inf)
+        return string
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Finding: " + self.kind + " " + self.name + " "
+        string += self.metric + " score " + repr(self.score) + " ]"
+        return string
+
+class Ranking:
+    """Streaming top-K of findings, by score"""
+    def __init__(self, size=10):
+        if not isinstance(size, int):
+            raise TypeError("Ranking size must be int")
+        if size < 1:
+            raise ValueError("Ranking size must be at least 1")
+        self.size = size
+        self.heap = list()
+        self.count = 0
+
+    def push(self, finding):
+        """Considers one finding, keeps it if in the top K so far"""
+        if math.isnan(finding.score):
+            return
+        self.count += 1
+        # Equal scores: the first one seen wins (stable output)
+        item = (finding.score, -self.count, finding)
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, item)
+        elif item[:2] > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, item)
+
+    def extend(self, findings):
+        """Considers all findings from an iterable"""
+        for finding in findings:
+            self.push(finding)
+
+    def results(self):
+        """Returns the top K findings, highest score first"""
+        return [item[2] for item in sorted(self.heap, reverse=True,
+                                           key=lambda item: item[:2])]
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Ranking"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Ranking: top " + repr(len(self.heap)) + " of "
+        string += repr(self.count) + " finding(s) ]"
+        return string
@@ -0,0 +1,201 @@
+"""
+ Regression - Compares a candidate corpus against a baseline corpus
+
+ Logs are matched by category path (the run/log dir they came from is ignored),
+ so the same configuration on both sides is compared metric by metric. Logs
+ with the same path in more than one run of a corpus, and the samples of
+ repeated logs (see data.py), are treated as repeats, and their variance is
+ used in a Welch t-test. When either side has a single sample, the test
+ falls back to a z-test with an assumed relative noise.
+
+ Only deltas that are both significant (p < alpha) and larger than the
+ relative threshold are reported.
+
+ Usage:
+   reg = Regression(baseline_data, candidate_data, {'alpha': 0.01})
+   reg.run()
+   for delta in reg.get_value('regressions'):
+     print(delta)
+
+ Options:
+  * alpha     : significance level (default 0.05)
+  * threshold : minimum relative difference to report (default 0.01)
+  * noise     : assumed relative stdev when there are no repeats (default 0.02)
+  * higher    : metrics in which higher is better (default: FOM)
+  * metrics   : restrict comparison to these metrics (default: all numeric)
+"""
+
+import numpy as np
+from analysis.distribution import t_pvalue, norm_pvalue
+from ranking import Finding
+
+HIGHER_IS_BETTER = ['FOM']
+
+class Delta:
+    """A significant difference of one metric between baseline and candidate"""
+    def __init__(self, path, metric, baseline, candidate, pvalue, worse):
+        self.path = path
+        self.metric = metric
+        self.baseline = baseline
+        self.candidate = candidate
+        self.delta = (candidate - baseline) / baseline
+        self.pvalue = pvalue
+        self.worse = worse
+
+    def __str__(self):
+        """Class name, for lists"""
+        string = '-'.join(self.path) + " " + self.metric + ": "
+        string += repr(self.baseline) + " -> " + repr(self.candidate)
+        string += " ({:+.2%}, p={:.2g})".format(self.delta, self.pvalue)
+        return string
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Delta: " + '-'.join(self.path) + " " + self.metric
+        string += " {:+.2%} ]".format(self.delta)
+        return string
+
+def _samples(data):
+    """Collects numeric values for each category path, runs and the samples
+       of each leaf are repeats"""
+    samples = dict()
+    for log_id, (_, cats, _) in enumerate(data.leaves()):
+        if cats not in samples:
+            samples[cats] = list()
+        samples[cats].extend(leaf.get_values() for leaf in data.samples[log_id])
+    return samples
+
+def _matrix(rows):
+    """Pads a list of sample lists into a 2D array (nan on missing)"""
+    width = max(len(row) for row in rows)
+    matrix = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+def _stats(matrix):
+    """Row-wise count, mean and sample variance (nan if single sample)"""
+    count = np.sum(~np.isnan(matrix), axis=1)
+    mean = np.nanmean(matrix, axis=1)
+    sqsum = np.nansum((matrix - mean[:, None])**2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = np.where(count > 1, sqsum / (count - 1), np.nan)
+    return count, mean, var
+
+class Regression:
+    """Baseline vs. candidate comparison, reports significant deltas"""
+    def __init__(self, baseline, candidate, options=None):
+        if options is None:
+            options = dict()
+        if not isinstance(options, dict):
+            raise TypeError("Regression options should be a dictionary")
+        self.baseline = baseline
+        self.candidate = candidate
+        self.options = {'alpha': 0.05, 'threshold': 0.01, 'noise': 0.02,
+                        'higher': HIGHER_IS_BETTER, 'metrics': None}
+        self.options.update(options)
+        self.results = {'regressions': list(), 'improvements': list(),
+                        'compared': 0}
+
+    def _pairs(self):
+        """Matches paths and metrics on both sides, returns samples per pair"""
+        base = _samples(self.baseline)
+        cand = _samples(self.candidate)
+        pairs = list()
+        base_rows = list()
+        cand_rows = list()
+        for path, base_logs in base.items():
+            if path not in cand:
+                continue
+            cand_logs = cand[path]
+            metrics = self.options['metrics']
+            if metrics is None:
+                metrics = sorted(set.intersection(
+                    *[set(log) for log in base_logs + cand_logs]))
+            for metric in metrics:
+                base_vals = [log[metric] for log in base_logs if metric in log]
+                cand_vals = [log[metric] for log in cand_logs if metric in log]
+                if not base_vals or not cand_vals:
+                    continue
+                pairs.append((path, metric))
+                base_rows.append(base_vals)
+                cand_rows.append(cand_vals)
+        return pairs, base_rows, cand_rows
+
+    def run(self):
+        """Computes deltas and significance for all matching pairs at once"""
+        self.results['regressions'] = list()
+        self.results['improvements'] = list()
+        pairs, base_rows, cand_rows = self._pairs()
+        self.results['compared'] = len(pairs)
+        if not pairs:
+            return
+
+        base_n, base_mean, base_var = _stats(_matrix(base_rows))
+        cand_n, cand_mean, cand_var = _stats(_matrix(cand_rows))
+        repeats = (base_n > 1) & (cand_n > 1)
+
+        # Without repeats, assume the configured relative noise
+        noise = self.options['noise']
+        base_var = np.where(np.isnan(base_var), (noise * base_mean)**2, base_var)
+        cand_var = np.where(np.isnan(cand_var), (noise * cand_mean)**2, cand_var)
+        base_se = base_var / base_n
+        cand_se = cand_var / cand_n
+        stderr = np.sqrt(base_se + cand_se)
+        diff = cand_mean - base_mean
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = diff / base_mean
+            stat = np.where(stderr > 0, diff / stderr,
+                            np.where(diff == 0, 0.0, np.inf))
+            # Welch-Satterthwaite degrees of freedom
+            dof = (base_se + cand_se)**2 / (base_se**2 / (base_n - 1) +
+                                            cand_se**2 / (cand_n - 1))
+        dof = np.where(repeats & np.isfinite(dof), dof, 1.0)
+        pvalue = np.where(repeats, t_pvalue(stat, dof), norm_pvalue(stat))
+        pvalue = np.where(np.isinf(stat), 0.0, pvalue)
+
+        significant = ((pvalue < self.options['alpha']) &
+                       (np.abs(rel) >= self.options['threshold']) &
+                       np.isfinite(rel))
+        higher = np.array([metric in self.options['higher']
+                           for _, metric in pairs])
+        worse = np.where(higher, rel < 0, rel > 0)
+
+        # Biggest changes first, stable on input order
+        for i in np.argsort(-np.abs(np.nan_to_num(rel)), kind='stable'):
+            if not significant[i]:
+                continue
+            path, metric = pairs[i]
+            delta = Delta(path, metric, float(base_mean[i]),
+                          float(cand_mean[i]), float(pvalue[i]),
+                          bool(worse[i]))
+            if delta.worse:
+                self.results['regressions'].append(delta)
+            else:
+                self.results['improvements'].append(delta)
+
+    def findings(self):
+        """Yields all significant deltas as findings, for ranking"""
+        for kind, results in (('Regression', self.results['regressions']),
+                              ('Improvement', self.results['improvements'])):
+            for delta in results:
+                yield Finding(kind, '-'.join(delta.path), delta.metric,
+                              delta.candidate, delta.baseline)
+
+    def get_value(self, key):
+        """Return the value of the property named key"""
+        if key in self.results:
+            return self.results[key]
+        return ''
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Regression"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Regression: " + repr(self.results['compared']) + " pairs, "
+        string += repr(len(self.results['regressions'])) + " regression(s), "
+        string += repr(len(self.results['improvements'])) + " improvement(s) ]"
+        return string
@@ -0,0 +1,245 @@
+"""
+ Server - Answers queries about a parsed corpus over HTTP, in JSON
+
+ The corpus is parsed once and kept in memory with its caches (columns,
+ category index, analysis results), so dashboards and notebooks get answers
+ in milliseconds instead of running aggregate.py for each question. Clients
+ are served concurrently (one thread each), work on the data is serialised.
+
+ Listens on TCP ([host:]port, localhost by default) or on a Unix socket (a
+ path, ex. /tmp/aggregate.sock).
+
+ Requests (GET, parameters in the query string, 'bench' can be left out when
+ there's only one benchmark):
+  * /benchmarks                     : names, number of logs, runs, metrics
+  * /summary?bench=B                : analyses and category values too
+  * /query?bench=B&q=<query>        : query.py result (header and rows)
+  * /analysis?bench=B&top=N&levels=L: top N findings (ranking.py)
+  * /groups?bench=B&position=P&metric=M : results of the analysis of
+                                      category P on each group (flags,
+                                      references), optionally one metric
+
+ Responses are JSON objects, errors are {"error": <message>} with a 4xx code,
+ or 500 (and the traceback on stderr) if anything else went wrong answering.
+
+ Usage:
+   server = make_server(QueryServer(datas), '8080')
+   server.serve_forever()
+
+   $ curl 'localhost:8080/query?q=select+FOM+group+by+cat1'
+   $ curl --unix-socket /tmp/aggregate.sock 'http://x/analysis?top=5'
+"""
+
+import json
+import os
+import socketserver
+import stat
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from query import Query
+from ranking import Ranking
+
+def _json(value):
+    """Plain JSON value of numbers, arrays and containers (nan is null)"""
+    if isinstance(value, dict):
+        return {str(key): _json(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json(val) for val in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) or np.isinf(value) else float(value)
+    return value
+
+def _integer(params, name, default):
+    """Positive integer parameter"""
+    value = params.get(name, str(default))
+    if not value.isdigit():
+        raise ValueError("'" + name + "' must be a positive integer")
+    return int(value)
+
+def _failure(error):
+    """500 answer to an unexpected error, whose traceback goes to stderr"""
+    traceback.print_exc()
+    return 500, {'error': type(error).__name__ + ": " + str(error)}
+
+class QueryServer:
+    """Answers requests (path and parameters) about Data, by benchmark name"""
+    def __init__(self, datas):
+        if not isinstance(datas, dict) or not datas:
+            raise ValueError("Nothing to serve")
+        self.datas = datas
+        self.lock = threading.Lock()
+        # (benchmark, levels) -> all findings, the data doesn't change
+        self.findings = dict()
+        self.requests = 0
+        self.routes = {
+            '/benchmarks': self.benchmarks,
+            '/summary': self.summary,
+            '/query': self.query,
+            '/analysis': self.analysis,
+            '/groups': self.groups,
+        }
+
+    def _data(self, params):
+        """Data of the 'bench' parameter (optional with a single one)"""
+        name = params.get('bench')
+        if name is None:
+            if len(self.datas) > 1:
+                raise ValueError("Which benchmark? 'bench' is one of " +
+                                 ", ".join(self.datas))
+            return next(iter(self.datas.values()))
+        if name not in self.datas:
+            raise KeyError("No benchmark " + name)
+        return self.datas[name]
+
+    @staticmethod
+    def _describe(data):
+        """Counts of a Data"""
+        return {'name': data.name, 'logs': data.num_logs,
+                'leaves': len(data.records), 'runs': list(data.logs),
+                'categories': data.num_cat, 'metrics': sorted(data.columns())}
+
+    def benchmarks(self, params):
+        """All benchmarks"""
+        return {'benchmarks': [self._describe(data)
+                               for data in self.datas.values()]}
+
+    def summary(self, params):
+        """One benchmark: counts, analyses and category values"""
+        data = self._data(params)
+        result = self._describe(data)
+        result['datastr'] = data.datastr
+        result['analyses'] = [None if analysis is None else str(analysis.plugin)
+                              for analysis in data.analyses]
+        result['values'] = [list(values) for values in data.index.values[1:]]
+        return result
+
+    def query(self, params):
+        """Result of a query"""
+        if 'q' not in params:
+            raise ValueError("Missing query 'q'")
+        data = self._data(params)
+        result = Query(params['q']).run(data)
+        return {'header': result.header, 'rows': result.rows}
+
+    def analysis(self, params):
+        """Top findings"""
+        data = self._data(params)
+        top = _integer(params, 'top', 10)
+        levels = _integer(params, 'levels', 1)
+        if not top or not levels:
+            raise ValueError("'top' and 'levels' must be at least 1")
+        key = (data.name, levels)
+        if key not in self.findings:
+            self.findings[key] = list(data.analyse(levels=levels))
+        ranking = Ranking(top)
+        ranking.extend(self.findings[key])
+        return {'count': ranking.count,
+                'findings': [{'kind': finding.kind, 'name': finding.name,
+                              'metric': finding.metric, 'value': finding.value,
+                              'reference': finding.reference,
+                              'score': finding.score}
+                             for finding in ranking.results()]}
+
+    def groups(self, params):
+        """Analysis results of each group of a category position"""
+        data = self._data(params)
+        position = _integer(params, 'position', 0)
+        if position >= len(data.analyses) or data.analyses[position] is None:
+            raise ValueError("No analysis on category " + repr(position))
+        metric = params.get('metric')
+        groups = list()
+        for _, key, ids, name, vector, plugin in data.results([position]):
+            if metric is not None and name != metric:
+                continue
+            group = {'key': list(key), 'metric': name, 'analysis': str(plugin),
+                     'logs': [data.records[log_id].name for log_id in ids],
+                     'values': vector}
+            for result in ('flags', 'reference', 'belongs', 'quality'):
+                value = plugin.get_value(result)
+                if not isinstance(value, str):
+                    group[result] = value
+            groups.append(group)
+        return {'groups': groups}
+
+    def handle(self, path, params):
+        """Answers a request, returns (HTTP status, JSON object)"""
+        route = self.routes.get(path.rstrip('/') or '/benchmarks')
+        if route is None:
+            return 404, {'error': "Unknown request " + path + ", use one of " +
+                                  ", ".join(self.routes)}
+        try:
+            with self.lock:
+                self.requests += 1
+                result = route(params)
+            # Results are only read, outside the lock
+            return 200, _json(result)
+        except KeyError as error:
+            return 404, {'error': error.args[0]}
+        except (TypeError, ValueError) as error:
+            # Bad parameters, but numpy's LinAlgError is a ValueError too
+            if not isinstance(error, np.linalg.LinAlgError):
+                return 400, {'error': str(error)}
+            return _failure(error)
+        # Anything else (ex. a failing analysis) is this request's problem:
+        # the client gets an answer, the server goes on
+        except Exception as error:
+            return _failure(error)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "QueryServer"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ QueryServer: " + ", ".join(self.datas) + ", "
+        string += repr(self.requests) + " request(s) ]"
+        return string
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP GET -> QueryServer.handle() -> JSON"""
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        status, result = self.server.app.handle(url.path, params)
+        body = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Quiet, clients are not our business"""
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP on a Unix socket, a thread per client"""
+    daemon_threads = True
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+def make_server(app, address):
+    """HTTP server for app on '[host:]port' (localhost by default) or a Unix
+       socket path (anything with a '/'), ready to serve_forever()"""
+    if '/' in address:
+        # A stale socket of a previous server, not any other file
+        if os.path.exists(address) and stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address)
+        server = _UnixHTTPServer(address, _Handler)
+    else:
+        host, _, port = address.rpartition(':')
+        if not port.isdigit():
+            raise ValueError("Address must be [host:]port or a socket path")
+        server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), _Handler)
+        server.daemon_threads = True
+    server.app = app
+    return server
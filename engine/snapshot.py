@@ -0,0 +1,187 @@
+"""
+ Snapshot - Partial Data of one node, saved to disk and merged with others
+
+ When logs are produced on many nodes, each node parses its own log dirs and
+ saves a snapshot of its Data (every sample, not just the medians), and one
+ host merges any number of snapshots into a single corpus to analyse.
+
+ A snapshot is a compressed numpy archive (no pickles) with:
+  * name, datastr : benchmark name and data string (must match to merge)
+  * runs, run     : run names, and the run (by code) of each sample
+  * names         : log name of each sample, its categories are taken from
+                    it again when it's added to a Data, as any log's
+  * metrics       : metric names
+  * columns, sizes: metrics (by code) of each schema, one per set of keys of
+                    the samples (as PerfRecord's), concatenated
+  * schema, data  : the schema of each sample, and their values concatenated
+
+ Samples only store the values they have, so metrics few logs have (ex.
+ perf report symbols) don't grow every sample. Merging re-codes the runs,
+ metrics and schemas of every snapshot into one and concatenates the values,
+ linear in the total number of values.
+
+ Usage:
+   Snapshot.from_data(data).save('node1.snapshot')
+   shards = [Snapshot.load(path) for path in paths]
+   data = merge(shards).to_data()
+"""
+
+from array import array
+import numpy as np
+from data import Data
+from linux_perf import PerfRecord
+
+EXTENSION = '.snapshot'
+VERSION = 2
+
+def is_snapshot(path):
+    """True if a file name is a Data snapshot"""
+    return path.endswith(EXTENSION)
+
+class Snapshot:
+    """All samples of a Data, as their run, name and values by key schema"""
+    def __init__(self, name, datastr, runs, run, names, metrics, schemas,
+                 schema, data):
+        self.run = np.asarray(run, dtype=np.int64)
+        self.schema = np.asarray(schema, dtype=np.int64)
+        if len(self.run) != len(names) or len(names) != len(self.schema):
+            raise ValueError("Snapshot runs, names and schemas differ in length")
+        self.sizes = np.array([len(columns) for columns in schemas],
+                              dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.sizes[self.schema])])
+        if self.offsets[-1] != len(data):
+            raise ValueError("Snapshot values don't fit their schemas")
+        self.name = name
+        self.datastr = datastr
+        self.runs = runs
+        self.names = names
+        self.metrics = metrics
+        self.schemas = schemas
+        self.data = np.asarray(data, dtype=float)
+
+    @classmethod
+    def from_data(cls, data):
+        """Snapshot of all samples of a Data"""
+        index = data.index
+        run = list()
+        names = list()
+        metrics = dict()
+        # Key tuple -> schema code
+        schemas = dict()
+        schema = list()
+        values = array('d')
+        for log_id, samples in enumerate(data.samples):
+            for sample in samples:
+                run.append(index.rows[log_id][0])
+                names.append(sample.name)
+                code = schemas.get(sample.keys)
+                if code is None:
+                    code = schemas[sample.keys] = len(schemas)
+                    for key in sample.keys:
+                        metrics.setdefault(key, len(metrics))
+                schema.append(code)
+                values.extend(sample.values)
+        columns = [[metrics[key] for key in keys] for keys in schemas]
+        runs = list(index.values[0]) if index.values else list()
+        return cls(data.name, data.datastr, runs, run, names, list(metrics),
+                   columns, schema, np.frombuffer(values, dtype=float))
+
+    @classmethod
+    def load(cls, path):
+        """Reads a snapshot file"""
+        with np.load(path, allow_pickle=False) as arrays:
+            if 'version' not in arrays or int(arrays['version']) != VERSION:
+                raise ValueError(path + " is not a snapshot (version " +
+                                 repr(VERSION) + ")")
+            bounds = np.concatenate([[0], np.cumsum(arrays['sizes'])])
+            columns = arrays['columns'].tolist()
+            return cls(str(arrays['name']), str(arrays['datastr']),
+                       arrays['runs'].tolist(), arrays['run'],
+                       arrays['names'].tolist(), arrays['metrics'].tolist(),
+                       [columns[bounds[num]:bounds[num + 1]]
+                        for num in range(len(bounds) - 1)],
+                       arrays['schema'], arrays['data'])
+
+    def save(self, path):
+        """Writes the snapshot (to exactly path, no extension is added)"""
+        columns = [column for schema in self.schemas for column in schema]
+        arrays = {'version': np.array(VERSION), 'name': np.array(self.name),
+                  'datastr': np.array(self.datastr),
+                  'runs': np.array(self.runs, dtype=np.str_), 'run': self.run,
+                  'names': np.array(self.names, dtype=np.str_),
+                  'metrics': np.array(self.metrics, dtype=np.str_),
+                  'columns': np.array(columns, dtype=np.int64),
+                  'sizes': self.sizes, 'schema': self.schema, 'data': self.data}
+        with open(path, 'wb') as out:
+            np.savez_compressed(out, **arrays)
+
+    def logs(self, run=None):
+        """Yields (run, log name, record) of every sample, optionally all in
+           the same run"""
+        keys = [[self.metrics[column] for column in columns]
+                for columns in self.schemas]
+        offsets = self.offsets.tolist()
+        for num, name in enumerate(self.names):
+            values = self.data[offsets[num]:offsets[num + 1]].tolist()
+            record = PerfRecord(name, dict(zip(keys[self.schema[num]], values)))
+            yield (run or self.runs[self.run[num]]), name, record
+
+    def to_data(self, data=None, run=None):
+        """Adds all samples to data (or a new Data), optionally all in the
+           same run, returns it"""
+        if data is None:
+            data = Data(self.name, self.datastr)
+        elif data.datastr != self.datastr:
+            raise ValueError("Snapshot of '" + self.datastr + "' doesn't fit data"
+                             " of '" + data.datastr + "'")
+        data.add_logs(self.logs(run))
+        return data
+
+    def __len__(self):
+        """Number of samples"""
+        return len(self.names)
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Snapshot: " + self.name
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Snapshot: " + self.name + ", " + repr(len(self.names))
+        string += " sample(s), " + repr(len(self.metrics)) + " metric(s) ]"
+        return string
+
+def _recode(table, codes):
+    """Codes through a translation table (list of new codes)"""
+    return np.array(table, dtype=np.int64)[codes] if len(codes) else codes
+
+def merge(snapshots):
+    """One snapshot with the samples of all, in order. Runs, metrics and
+       schemas are re-coded into merged dictionaries"""
+    if not snapshots:
+        raise ValueError("Nothing to merge")
+    first = snapshots[0]
+    runs = dict()
+    metrics = dict()
+    schemas = dict()
+    run, schema = list(), list()
+    for shard in snapshots:
+        if shard.name != first.name or shard.datastr != first.datastr:
+            raise ValueError("Cannot merge " + repr(shard) + " into " +
+                             repr(first) + ": different benchmark or data string")
+        # Shard code -> merged code, of runs, metrics and schemas
+        run.append(_recode([runs.setdefault(name, len(runs))
+                            for name in shard.runs], shard.run))
+        table = [metrics.setdefault(metric, len(metrics))
+                 for metric in shard.metrics]
+        recoded = list()
+        for columns in shard.schemas:
+            columns = tuple(table[column] for column in columns)
+            recoded.append(schemas.setdefault(columns, len(schemas)))
+        schema.append(_recode(recoded, shard.schema))
+
+    names = [name for shard in snapshots for name in shard.names]
+    data = np.concatenate([shard.data for shard in snapshots])
+    return Snapshot(first.name, first.datastr, list(runs), np.concatenate(run),
+                    names, list(metrics), [list(columns) for columns in schemas],
+                    np.concatenate(schema), data)
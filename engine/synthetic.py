@@ -0,0 +1,141 @@
+"""
+ Synthetic - Deterministic generator of perf stat + LULESH logs
+
+ Generates a full test matrix of log files, with realistic looking (but fake)
+ perf counters and benchmark output, to measure how the tool itself scales.
+ The same arguments always produce the same logs (seeded generator).
+
+ Log names are <bench>-<cat1>-...-<catN>.log, where the last category is a
+ number of threads (1, 2, 4, ... up to MAX_POWER, then in steps of it, so
+ that wide levels stay realistic numbers) and the others are named after their level
+ (c1v0, c1v1, ...). Each level has about num_logs^(1/depth) values.
+
+ Usage:
+   for name, text in logs(1000, depth=3):
+     ...
+   write('/tmp/corpus', 1000, depth=3, counters=20)
+   data_string(3)   # -> 'sep=-,none,outlier=3.5,cluster=2,fit=1/al'
+"""
+
+import math
+import os
+import numpy as np
+
+BENCH = 'synth'
+# Thread counts are powers of two up to this, then its multiples
+MAX_POWER = 64
+
+# Counters PerfData knows about, plus elapsed time
+COUNTERS = ['context-switches', 'cpu-migrations', 'page-faults', 'cycles',
+            'instructions', 'branches', 'branch-misses']
+
+PERF_HEADER = """ Performance counter stats for './{bench} -s 50':
+
+     {clock:16.6f}      task-clock (msec)         #    {threads:.3f} CPUs utilized
+"""
+PERF_LINE = "{value:>18,}      {event:<25} #    {ratio:.3f} M/sec\n"
+PERF_FOOTER = "\n     {elapsed:.9f} seconds time elapsed\n\n"
+
+LULESH = """Running problem size 50^3 per domain until completion
+Num processors: 1
+Num threads: {threads}
+Total number of elements: 125000
+
+Run completed:
+   Problem size        =  50
+   MPI tasks           =  1
+   Iteration count     =  {iterations}
+   Final Origin Energy = {energy:e}
+   Testing Plane 0 of Energy Array on rank 0:
+        MaxAbsDiff   = {absdiff:e}
+        TotalAbsDiff = {totdiff:e}
+        MaxRelDiff   = {reldiff:e}
+
+
+Elapsed time         =     {elapsed:.2f} (s)
+Grind time (us/z/c)  =  {grind:.7f} (per dom)  ( {grind:.7f} overall)
+FOM                  =  {fom:.5f} (z/s)
+"""
+
+def categories(num_logs, depth):
+    """Category values for each level, so that their product is >= num_logs"""
+    if depth < 1:
+        raise ValueError("Depth must be at least 1")
+    per_level = max(1, int(math.ceil(num_logs ** (1.0 / depth) - 1e-9)))
+    levels = [['c' + str(level + 1) + 'v' + str(val) for val in range(per_level)]
+              for level in range(depth - 1)]
+    levels.append([str(thread_count(val)) for val in range(per_level)])
+    return levels
+
+def thread_count(val):
+    """Number of threads of the val-th value of the last level"""
+    powers = MAX_POWER.bit_length()
+    if val < powers:
+        return 2**val
+    return MAX_POWER * (val - powers + 2)
+
+def data_string(depth):
+    """A data string that analyses every level of the generated logs"""
+    passes = ['none'] + ['outlier=3.5'] * min(depth - 1, 1)
+    passes += ['cluster=2'] * max(depth - 2, 0) + ['fit=1/al']
+    return 'sep=-,' + ','.join(passes)
+
+def _log(rng, codes, threads, counters):
+    """Text of one log for a configuration (list of value codes per level)"""
+    # Each category value shifts performance a bit, threads scale it
+    factor = 1.0 + 0.05 * sum(codes)
+    noise = rng.normal(1.0, 0.01, len(COUNTERS) + counters + 1)
+    elapsed = 200.0 * factor / (threads ** 0.8) * noise[0]
+    cycles = int(3.2e9 * elapsed * threads * noise[1])
+    values = {
+        'context-switches': int(300 * threads * noise[2]),
+        'cpu-migrations': int(abs(rng.normal(2.0, 2.0))),
+        'page-faults': int(1.9e7 * noise[3]),
+        'cycles': cycles,
+        'instructions': int(cycles * 1.9 * noise[4]),
+        'branches': int(cycles * 0.08 * noise[5]),
+        'branch-misses': int(cycles * 0.0002 * noise[6]),
+    }
+    text = PERF_HEADER.format(bench=BENCH, clock=elapsed * 1000 * threads,
+                              threads=float(threads))
+    for event, value in values.items():
+        text += PERF_LINE.format(value=value, event=event,
+                                 ratio=value / elapsed / 1e6)
+    # Extra counters are text to scan, even if not parsed
+    for num in range(counters):
+        value = int(cycles * 0.01 * noise[len(COUNTERS) + num])
+        text += PERF_LINE.format(value=value, event='r' + format(num, '04x'),
+                                 ratio=value / elapsed / 1e6)
+    text += PERF_FOOTER.format(elapsed=elapsed)
+    text += LULESH.format(threads=threads, iterations=1662,
+                          energy=5.124778e+05 * noise[-1],
+                          absdiff=1.5e-10, totdiff=4.0e-09, reldiff=6.6e-13,
+                          elapsed=elapsed, grind=elapsed / 207.75,
+                          fom=125000 * 1662 / elapsed / 1e3)
+    return text
+
+def logs(num_logs, depth=3, counters=0, seed=0):
+    """Yields (file name, text) of num_logs synthetic logs, deterministic"""
+    rng = np.random.default_rng(seed)
+    levels = categories(num_logs, depth)
+    sizes = [len(level) for level in levels]
+    for num in range(num_logs):
+        codes = list()
+        rest = num
+        for size in reversed(sizes):
+            codes.append(rest % size)
+            rest //= size
+        codes.reverse()
+        cats = [levels[pos][code] for pos, code in enumerate(codes)]
+        threads = int(cats[-1])
+        name = '-'.join([BENCH] + cats) + '.log'
+        yield name, _log(rng, codes[:-1], threads, counters)
+
+def write(directory, num_logs, depth=3, counters=0, seed=0):
+    """Writes the logs into directory (created if needed), returns bytes"""
+    os.makedirs(directory, exist_ok=True)
+    total = 0
+    for name, text in logs(num_logs, depth, counters, seed):
+        with open(os.path.join(directory, name), 'w') as log:
+            total += log.write(text)
+    return total
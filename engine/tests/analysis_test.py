@@ -3,9 +3,15 @@
 """Testing script for Outlier/Curve fit functionality"""
 
 import unittest
-from analysis.outlier import Outliers
+import numpy as np
+from analysis.outlier import Outliers, median, quartiles, dixon_critical
 from analysis.cluster import Clustering
 from analysis.fit import CurveFit
+from analysis.multivariate import Multivariate
+from analysis.topdown import TopDown, breakdown
+from analysis.distribution import t_pvalue, norm_pvalue, chi2_ppf, f_ppf
+from analysis.bootstrap import Bootstrap, batch_intervals, permutation_test
+from analysis.cache import AnalysisCache, ENTRY_SIZE
 
 class TestAnalysis(unittest.TestCase):
     """Analysys tests"""
@@ -56,6 +62,184 @@ class TestAnalysis(unittest.TestCase):
         outliers = out.get_value('outliers')
         self.assertEqual(outliers, '')
 
+    def test_outlier_methods(self):
+        """Outlier Test / Methods"""
+        # Rosner (1983), 54 values with 3 outliers
+        data = [-0.25, 0.68, 0.94, 1.15, 1.20, 1.26, 1.26, 1.34, 1.38, 1.43,
+                1.49, 1.49, 1.55, 1.56, 1.58, 1.65, 1.69, 1.70, 1.76, 1.77,
+                1.81, 1.91, 1.94, 1.96, 1.99, 2.06, 2.09, 2.10, 2.14, 2.15,
+                2.23, 2.24, 2.26, 2.35, 2.37, 2.40, 2.47, 2.54, 2.62, 2.64,
+                2.90, 2.92, 2.92, 2.93, 3.21, 3.26, 3.30, 3.59, 3.68, 4.30,
+                4.64, 5.34, 5.42, 6.01]
+        out = Outliers({'method': 'esd', 'max_outliers': 10})
+        self.assertEqual(out.options['threshold'], 0.05)
+        out.set_data(list(reversed(data)))
+        out.run()
+        self.assertEqual(out.get_value('outliers'), [[6.01], [5.42], [5.34]])
+        self.assertEqual(list(np.flatnonzero(out.get_value('flags'))), [0, 1, 2])
+
+        out = Outliers({'method': 'iqr'})
+        out.set_data(data)
+        out.run()
+        self.assertEqual(out.get_value('outliers'), [[5.34], [5.42], [6.01]])
+
+        # Most values equal (MAD = 0), only the different one is an outlier
+        out = Outliers()
+        out.set_data([1.0] * 8 + [1.5])
+        out.run()
+        self.assertEqual(out.get_value('outliers'), [[1.5]])
+        out = Outliers()
+        out.set_data([1.0] * 8)
+        out.run()
+        self.assertEqual(out.get_value('num_outliers'), 0)
+
+        # Small groups: Dixon's Q test, whatever the method
+        for method in ('mzs', 'esd', 'iqr'):
+            out = Outliers({'method': method})
+            out.set_data([10.0, 10.2, 30.0, 10.1])
+            out.run()
+            self.assertEqual(out.get_value('outliers'), [[30.0]])
+            out = Outliers({'method': method})
+            out.set_data([10.0, 10.2, 11.0, 10.1])
+            out.run()
+            self.assertEqual(out.get_value('outliers'), [])
+        # ... at the configured significance (Q = 0.8: above 90%, not 95%)
+        for options in ({'method': 'esd', 'threshold': 0.1},
+                        {'method': 'mzs', 'significance': 0.1}):
+            out = Outliers(options)
+            out.set_data([10.0, 10.2, 11.0, 10.1])
+            out.run()
+            self.assertEqual(out.get_value('outliers'), [[11.0]])
+        self.assertAlmostEqual(dixon_critical(4, 0.05), 0.829)
+        self.assertTrue(0.829 < dixon_critical(4, 0.02) < 0.926)
+        self.assertAlmostEqual(dixon_critical(4, 0.001), 0.926)
+
+        # Selection gives the same as sorting
+        for size in (5, 8, 101):
+            values = np.random.default_rng(size).normal(size=size)
+            self.assertAlmostEqual(median(values), np.median(values))
+            np.testing.assert_allclose(quartiles(values),
+                                       np.percentile(values, [25, 75]))
+
+        with self.assertRaises(ValueError):
+            Outliers({'method': 'grubbs'})
+
+    def test_multivariate(self):
+        """Multivariate Test / Joint outliers"""
+        rng = np.random.default_rng(4)
+        # Cycles follow instructions, page-faults don't
+        instructions = rng.normal(1e9, 5e7, 30)
+        cycles = 0.8 * instructions + rng.normal(0, 5e6, 30)
+        faults = rng.normal(1000, 20, 30)
+        # Log 7: normal cycles, but not for its instructions
+        cycles[7] = 0.8 * instructions[7] + 6e7
+        data = np.column_stack([cycles, instructions, faults]).tolist()
+
+        # Each counter on its own sees nothing
+        out = Outliers()
+        out.set_data([row[0] for row in data])
+        out.run()
+        self.assertFalse(out.get_value('flags')[7])
+
+        options = {'metrics': ['cycles', 'instructions', 'faults']}
+        multi = Multivariate(options)
+        self.assertEqual(multi.options['alpha'], 0.01)
+        multi.set_data(data)
+        multi.run()
+        self.assertEqual(multi.get_value('outliers'), [7])
+        distances = multi.get_value('distances')
+        self.assertGreater(distances[7], 2 * multi.get_value('reference')[7])
+        self.assertEqual(multi.get_value('contributors')[7], 'cycles+instructions')
+        # Same input, same output
+        again = Multivariate(dict(options))
+        again.set_data(data)
+        again.run()
+        np.testing.assert_array_equal(again.get_value('distances'), distances)
+
+        # Clean correlated data, default alpha: about 1% of the logs flagged
+        # in small groups (small-sample correction), large groups sampled
+        for count, dims, groups in ((10, 3, 40), (20, 5, 20), (40, 5, 10),
+                                    (3000, 10, 1)):
+            rng = np.random.default_rng(count)
+            flagged = 0
+            for _ in range(groups):
+                mixing = rng.normal(size=(dims, dims))
+                multi = Multivariate()
+                multi.set_data((rng.normal(size=(count, dims)) @ mixing).tolist())
+                multi.run()
+                flagged += multi.get_value('num_outliers')
+            self.assertLessEqual(flagged / (count * groups), 0.02)
+
+        # Too few logs, or nothing varies
+        for data in ([[1.0, 2.0], [1.1, 2.2], [5.0, 1.0]], [[1.0, 2.0]] * 10):
+            multi = Multivariate()
+            multi.set_data(data)
+            multi.run()
+            self.assertFalse(multi.get_value('flags').any())
+
+        with self.assertRaises(ValueError):
+            Multivariate({'alpha': 2.0})
+        with self.assertRaises(ValueError):
+            Multivariate().set_data([1.0, 2.0])
+
+    def test_topdown(self):
+        """TopDown Test / Breakdown and attribution"""
+        # Same two logs from the three sources: 30/10/20/40%, then 20/10/20/50%
+        tma = {'tma_retiring': np.array([30.0, 20.0]),
+               'tma_bad_speculation': np.array([10.0, 10.0]),
+               'tma_frontend_bound': np.array([20.0, 20.0]),
+               'tma_backend_bound': np.array([40.0, 50.0]),
+               'tma_memory_bound': np.array([10.0, 30.0])}
+        slots = {'topdown-retiring': np.array([300.0, 400.0]),
+                 'topdown-bad-spec': np.array([100.0, 200.0]),
+                 'topdown-fe-bound': np.array([200.0, 400.0]),
+                 'topdown-be-bound': np.array([400.0, 1000.0]),
+                 'topdown-mem-bound': np.array([100.0, 600.0])}
+        bubbles = {'topdown-total-slots': np.array([1000.0, 2000.0]),
+                   'topdown-slots-issued': np.array([350.0, 500.0]),
+                   'topdown-slots-retired': np.array([300.0, 400.0]),
+                   'topdown-fetch-bubbles': np.array([200.0, 400.0]),
+                   'topdown-recovery-bubbles': np.array([50.0, 100.0])}
+        expected = [[0.3, 0.1, 0.2, 0.4], [0.2, 0.1, 0.2, 0.5]]
+        for columns in (tma, slots, bubbles):
+            fracs, names = breakdown(columns)
+            self.assertEqual(names, ['retiring', 'bad_speculation',
+                                     'frontend_bound', 'backend_bound'])
+            np.testing.assert_allclose(fracs, expected)
+        # Level 2 where both children are known (one is the rest)
+        fracs, names = breakdown(tma, 2)
+        self.assertEqual(names[-2:], ['backend_bound/memory_bound',
+                                      'backend_bound/core_bound'])
+        np.testing.assert_allclose(fracs[:, -2:], [[0.1, 0.3], [0.3, 0.2]])
+        self.assertEqual(breakdown(bubbles, 2)[1][-1], 'backend_bound')
+        self.assertEqual(breakdown({'cycles': np.ones(2)}), (None, []))
+
+        # Log 1 is 25% slower, its retired slots are the same: the rest is
+        # backend, frontend and speculation in proportion to before
+        metrics = ['cycles'] + list(tma)
+        top = TopDown({'metrics': metrics})
+        top.set_data([[1000.0, 30.0, 10.0, 20.0, 40.0, 10.0],
+                      [1250.0, 24.0, 10.0, 20.0, 46.0, 14.0],
+                      [1000.0, 30.0, 10.0, 20.0, 40.0, 10.0]])
+        top.run()
+        self.assertEqual(top.get_value('metric'), 'cycles')
+        self.assertEqual(list(top.get_value('flags')), [False, True, False])
+        self.assertEqual(top.get_value('contributors')[1], 'cycles (backend_bound)')
+        np.testing.assert_allclose(top.get_value('attribution')[1],
+                                   [0.0, 25.0, 50.0, 175.0])
+        self.assertAlmostEqual(top.get_value('slowdown')[1], 0.25)
+
+        # Nothing to break down: nothing flagged
+        top = TopDown({'level': 2, 'metrics': ['cycles']})
+        top.set_data([[1000.0], [2000.0], [1000.0]])
+        top.run()
+        self.assertFalse(top.get_value('flags').any())
+
+        with self.assertRaises(ValueError):
+            TopDown({'level': 3})
+        with self.assertRaises(ValueError):
+            TopDown({'threshold': 1})
+
     def test_clustering_simple(self):
         """Clustering Test / Simple"""
 
@@ -132,6 +316,105 @@ class TestAnalysis(unittest.TestCase):
         quadfit.set_option('optimal', xval)
         self.assertEqual(quadfit.get_value('quality'), 59.94661192602033)
 
+    def test_curve_fit_zero(self):
+        """Curve Fit Test / References near zero"""
+        # All zero: the fit is float noise, nothing is off the curve
+        fit = CurveFit({'degree': 3})
+        fit.set_data([0.0, 0.0, 0.0, 0.0, 0.0])
+        fit.run()
+        self.assertFalse(fit.get_value('flags').any())
+        self.assertEqual(fit.get_value('error'), 0.0)
+        # Exact fit through zeros and a few counts (cpu-migrations)
+        fit = CurveFit({'degree': 3})
+        fit.set_data([0.0, 0.0, 9.0, 2.0])
+        fit.run()
+        self.assertFalse(fit.get_value('flags').any())
+        # Away from zero, still relative to the curve
+        fit = CurveFit({'degree': 1})
+        fit.set_data([1.0, 2.0, 3.0, 4.0, 6.0, 6.0, 7.0])
+        fit.run()
+        self.assertEqual(list(np.flatnonzero(fit.get_value('flags'))), [4])
+
+    def test_distribution(self):
+        """Distribution Test / Critical values"""
+
+        # Two-sided 5% critical values from standard tables
+        pval = t_pvalue([12.706205, 2.228139, 1.983972], [1, 10, 100])
+        for val in pval:
+            self.assertAlmostEqual(val, 0.05, places=6)
+        self.assertAlmostEqual(float(t_pvalue(0, 3)), 1.0)
+        self.assertAlmostEqual(float(norm_pvalue(1.959964)), 0.05, places=6)
+        # Chi-square (within 1%) and F, 95% and 99%
+        np.testing.assert_allclose(chi2_ppf([0.95, 0.99], [3, 20]),
+                                   [7.815, 37.566], rtol=0.01)
+        np.testing.assert_allclose(f_ppf([0.95, 0.99], [3, 4], [10, 26]),
+                                   [3.708, 4.140], rtol=1e-3)
+
+    def test_bootstrap(self):
+        """Bootstrap Test / Intervals"""
+
+        data = [-0.17924, 0.13555605, -0.71446764, -0.12500689,
+                -0.02595668, -0.39844776, 0.29403318, 0.39041369]
+        boot = Bootstrap({'statistic': 'mean', 'resamples': 2000})
+        boot.set_data(data)
+        boot.run()
+        low, high = boot.get_value('ci')
+        self.assertTrue(low < boot.get_value('value') < high)
+        self.assertTrue(low > -0.5 and high < 0.3)
+
+        # Same seed, same answer, batched or not
+        other = Bootstrap({'statistic': 'mean', 'resamples': 2000})
+        other.set_data(data)
+        other.run()
+        self.assertEqual(other.get_value('ci'), boot.get_value('ci'))
+        groups = [data, [1., 2., 3.], [x * 2 for x in data]]
+        batch = batch_intervals(groups, 'mean', 2000)
+        self.assertAlmostEqual(batch[0][0], boot.get_value('ci')[0])
+        self.assertAlmostEqual(batch[0][1], boot.get_value('ci')[1])
+        self.assertAlmostEqual(batch[2][0], 2 * batch[0][0])
+
+        # Outlier pass can report intervals too
+        out = Outliers({'bootstrap': 500})
+        out.set_data(data)
+        low, high = out.get_value('mean_ci')
+        self.assertTrue(low < out.get_value('mean') < high)
+
+    def test_permutation(self):
+        """Bootstrap Test / Permutation"""
+        same = permutation_test([1., 2., 3., 4.], [1.5, 2.5, 3.5, 2.])
+        diff = permutation_test([1., 1.1, 0.9, 1.05], [2., 2.1, 1.9, 2.05])
+        self.assertTrue(same > 0.5)
+        self.assertTrue(diff < 0.05)
+
+    def test_cache(self):
+        """Cache Test / LRU and budget"""
+        cache = AnalysisCache()
+        data = [1., 2., 3., 2., 1., 9.]
+        first = cache.run(Outliers, {'threshold': 3.5}, data)
+        self.assertTrue(first.get_value('flags')[-1])
+        # Same pass, options and data: same plugin, didn't run again
+        self.assertIs(cache.run(Outliers, {'threshold': 3.5}, list(data)), first)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Anything different runs again
+        self.assertIsNot(cache.run(Outliers, {'threshold': 9.0}, data), first)
+        self.assertIsNot(cache.run(Outliers, {'threshold': 3.5}, data[:-1]), first)
+        fit = cache.run(CurveFit, {'degree': 1}, data, xaxis=[1, 2, 3, 4, 5, 6])
+        self.assertIsNot(cache.run(CurveFit, {'degree': 1}, data,
+                                   xaxis=[1, 2, 4, 8, 16, 32]), fit)
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+        self.assertEqual(len(cache), 5)
+
+        # Least recently used go first when over budget
+        cache.set_budget(3 * ENTRY_SIZE + 300)
+        self.assertTrue(len(cache) < 5)
+        self.assertTrue(cache.size <= cache.budget)
+        self.assertTrue(cache.evictions > 0)
+        cache.run(Outliers, {'threshold': 3.5}, data)
+        self.assertEqual(cache.hits, 1)
+        cache.set_budget(0)
+        self.assertEqual(len(cache), 0)
+        with self.assertRaises(ValueError):
+            cache.set_budget(-1)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""Testing script for multi-benchmark configuration"""
+
+import unittest
+from config import Benchmark, parse_config, find_benchmark
+
+CONFIG = """
+[Lulesh]
+plugin = lulesh
+data = sep=-,none,outlier=1,cluster=2,fit=3
+dirs = lulesh proxies/lulesh*
+
+[Synth]
+data = sep=-,none,fit=1/al   # perf only
+pattern = synth-* other-*
+"""
+
+class TestConfig(unittest.TestCase):
+    """Config tests"""
+
+    def test_parse(self):
+        """Config Test / Parse"""
+        lulesh, synth = parse_config(CONFIG)
+        self.assertEqual(lulesh.name, 'Lulesh')
+        self.assertEqual(lulesh.plugin, 'lulesh')
+        self.assertEqual(lulesh.data_string, 'sep=-,none,outlier=1,cluster=2,fit=3')
+        self.assertEqual(lulesh.patterns, ['*'])
+        self.assertEqual(lulesh.dirs, ['lulesh', 'proxies/lulesh*'])
+        self.assertIsNone(synth.plugin)
+        self.assertEqual(synth.data_string, 'sep=-,none,fit=1/al')
+        self.assertEqual(synth.patterns, ['synth-*', 'other-*'])
+
+    def test_match(self):
+        """Config Test / Match files to benchmarks"""
+        benchmarks = parse_config(CONFIG)
+        self.assertEqual(find_benchmark(benchmarks, 'lulesh', 'a-1.log').name,
+                         'Lulesh')
+        self.assertEqual(find_benchmark(benchmarks, 'proxies/lulesh2',
+                                        'synth-1.log').name, 'Lulesh')
+        self.assertEqual(find_benchmark(benchmarks, '', 'synth-1.log').name,
+                         'Synth')
+        self.assertIsNone(find_benchmark(benchmarks, '', 'a-1.log'))
+        # Compression suffixes don't get in the way of patterns
+        bench = Benchmark('b', patterns=['*.log'])
+        self.assertTrue(bench.matches('', 'a-1.log.gz'))
+        self.assertFalse(bench.matches('', 'a-1.report'))
+
+    def test_errors(self):
+        """Config Test / Errors"""
+        for text in ('', 'plugin = lulesh', '[A]\nplugins = lulesh'):
+            with self.assertRaises(ValueError):
+                parse_config(text)
+        with self.assertRaises(TypeError):
+            Benchmark('')
+
+if __name__ == '__main__':
+    unittest.main()
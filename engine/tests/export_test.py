@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""Testing script for columnar exports"""
+
+import csv
+import os
+import tempfile
+import unittest
+import numpy as np
+from linux_perf import PerfData
+from data import Data
+from export import export, table_writer, pyarrow, TableWriter
+
+class TestExport(unittest.TestCase):
+    """Export tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # One outlier on O3, linear scaling with cores
+        self.data = Data('data', 'sep=-,none,outlier=3.5,fit=1/al')
+        for opt in ('O1', 'O2', 'O3', 'Os'):
+            for cores in ('1', '2', '4'):
+                cycles = 1000 * int(cores) * (3 if opt == 'O3' else 1)
+                perf = PerfData()
+                perf.parse(str(cycles + len(opt)) + " cycles")
+                self.data.add_log('run', 'gcc-' + opt + '-' + cores + '.log', perf)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, path):
+        """Rows of a CSV file, as dictionaries"""
+        with open(path, newline='') as table:
+            return list(csv.DictReader(table))
+
+    def test_csv(self):
+        """Export Test / CSV"""
+        paths = export(self.data, os.path.join(self.tmp.name, 'out.csv'))
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['out-metrics.csv', 'out-points.csv', 'out-groups.csv'])
+        metrics = self._read(paths[0])
+        self.assertEqual(len(metrics), 12)
+        self.assertEqual(metrics[0]['cat1'], 'O1')
+        self.assertEqual(float(metrics[0]['cycles']), 1002.0)
+        points = self._read(paths[1])
+        flagged = [row for row in points if row['flag'] == '1']
+        self.assertTrue(flagged)
+        self.assertTrue(all(row['name'].startswith('gcc-O3') for row in flagged))
+        groups = self._read(paths[2])
+        fits = [row for row in groups if row['analysis'] == 'CurveFit']
+        self.assertEqual(len(fits), 4)
+        # Slope of gcc-O1 cycles is 1000 per core
+        self.assertAlmostEqual(float(fits[0]['coef0']), 1000.0)
+        self.assertEqual(fits[0]['size'], '3')
+        outliers = [row for row in groups if row['analysis'] == 'Outliers']
+        self.assertEqual(outliers[0]['coef0'], '')
+
+    def test_npz(self):
+        """Export Test / NPZ"""
+        paths = export(self.data, os.path.join(self.tmp.name, 'out.npz'))
+        with np.load(paths[1]) as points:
+            self.assertEqual(points['flag'].dtype, np.bool_)
+            self.assertEqual(points['log'].dtype, np.int64)
+            self.assertEqual(len(points['value']), len(points['name']))
+        with np.load(paths[0]) as metrics:
+            self.assertEqual(list(metrics['cycles'][:3]), [1002.0, 2002.0, 4002.0])
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_parquet(self):
+        """Export Test / Parquet"""
+        import pyarrow.parquet
+        paths = export(self.data, os.path.join(self.tmp.name, 'out.parquet'))
+        table = pyarrow.parquet.read_table(paths[0])
+        self.assertEqual(table.num_rows, 12)
+
+    def test_errors(self):
+        """Export Test / Errors"""
+        with self.assertRaises(ValueError):
+            export(self.data, os.path.join(self.tmp.name, 'out.xls'))
+        with self.assertRaises(ValueError):
+            table_writer(os.path.join(self.tmp.name, 'a.csv'), [('a', 'date')])
+        with table_writer(os.path.join(self.tmp.name, 'a.csv'),
+                          [('a', 'int')]) as out:
+            with self.assertRaises(ValueError):
+                out.write([1, 2])
+        # The base class has no format
+        with self.assertRaises(TypeError):
+            TableWriter(os.path.join(self.tmp.name, 'a.txt'), [('a', 'int')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Testing script for multi-level analysis"""
+
+import unittest
+from linux_perf import PerfData
+from data import Data
+from hierarchy import Hierarchy
+
+NOISE = [1.0, 1.01, 0.99, 1.02, 0.98, 1.005, 0.995, 1.015]
+
+class TestHierarchy(unittest.TestCase):
+    """Hierarchy tests"""
+
+    def setUp(self):
+        # Linear scaling with cores, except icc on 8 cores
+        self.data = Data('data', 'sep=-,outlier=3.5,outlier=3.5,fit=1/al')
+        num = 0
+        for comp in ('gcc', 'llvm', 'icc', 'xlc', 'armcc'):
+            for opt in ('O1', 'O2'):
+                for cores in (1, 2, 4, 8):
+                    cycles = 1000 * cores * NOISE[num % len(NOISE)]
+                    num += 1
+                    if comp == 'icc' and cores == 8:
+                        cycles *= 1.5
+                    perf = PerfData()
+                    perf.parse(str(int(cycles)) + " cycles")
+                    self.data.add_log('run', comp + '-' + opt + '-' +
+                                      str(cores) + '.log', perf)
+
+    def test_levels(self):
+        """Hierarchy Test / Level 1 statistics"""
+        levels = Hierarchy(self.data)
+        for position, key, _, metric, _, plugin in self.data.results():
+            levels.add(position, key, metric, plugin)
+        # One fit per compiler and option, its error is the statistic
+        fits = levels._first(2)
+        self.assertEqual(len(fits), 10)
+        self.assertEqual(fits.names, ['CurveFit error'])
+        errors = fits.stats['cycles']
+        worst = errors.argmax()
+        self.assertEqual(levels._name(fits.codes[worst])[:-2], 'run/icc/O1')
+        self.assertTrue(levels._name(fits.codes[worst]).endswith('/*'))
+
+    def test_analyse(self):
+        """Hierarchy Test / Opposite strategy on group statistics"""
+        first = list(self.data.analyse())
+        findings = list(self.data.analyse(levels=2))
+        self.assertEqual([str(f) for f in findings[:len(first)]],
+                         [str(f) for f in first])
+        second = findings[len(first):]
+        self.assertTrue(second)
+        self.assertTrue(all('(level 2)' in f.kind for f in second))
+        # Fit error is an outlier across compilers, only for icc
+        errors = [f for f in second if f.metric == 'cycles (CurveFit error)']
+        self.assertEqual(sorted(f.name for f in errors),
+                         ['run/icc/O1/*', 'run/icc/O2/*'])
+        self.assertTrue(all(f.kind == 'Outliers (level 2)' for f in errors))
+        # Level 3 only adds to it
+        third = list(self.data.analyse(levels=3))[len(findings):]
+        self.assertTrue(all('(level 3)' in f.kind for f in third))
+
+if __name__ == '__main__':
+    unittest.main()
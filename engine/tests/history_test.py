@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""Testing script for the history of nightly metrics"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from linux_perf import PerfData
+from data import Data
+from history import History, change_points
+
+def _night(cycles, fom):
+    """One night: cycles of gcc-O2 / gcc-O3 (two runs each), FOM of gcc-O2"""
+    data = Data('bench', 'sep=-,none,outlier=3.5')
+    for run in ('node1', 'node2'):
+        for opt, value in (('O2', cycles), ('O3', 2000)):
+            perf = PerfData()
+            perf.parse(repr(value) + " cycles")
+            if opt == 'O2':
+                perf.append({'FOM': fom})
+            data.add_log(run, 'gcc-' + opt + '.log', perf)
+    return data
+
+class TestHistory(unittest.TestCase):
+    """History tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = History(os.path.join(self.tmp.name, 'history'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_store(self):
+        """History Test / Append-only store"""
+        self.assertEqual(self.history.dates('bench'), [])
+        self.history.record(_night(1000, 5.0), '2026-10-02')
+        self.history.record(_night(1010, 5.5), '2026-10-01')
+        self.assertEqual(self.history.dates('bench'), ['2026-10-01', '2026-10-02'])
+        with self.assertRaises(ValueError):
+            self.history.record(_night(1000, 5.0), '2026-10-02')
+        with self.assertRaises(ValueError):
+            self.history.record(_night(1000, 5.0), '2026-13-01')
+        with self.assertRaises(ValueError):
+            self.history.record(_night(1000, 5.0), '20261003')
+        # Nothing left behind by the failed records
+        self.assertEqual(len(os.listdir(os.path.join(self.history.root, 'bench'))), 2)
+
+        keys, dates, matrix = self.history.series('bench')
+        self.assertEqual(dates, ['2026-10-01', '2026-10-02'])
+        # Runs are samples of the same path
+        self.assertEqual(sorted(keys), [(('gcc', 'O2'), 'FOM'),
+                                        (('gcc', 'O2'), 'cycles'),
+                                        (('gcc', 'O3'), 'cycles')])
+        row = keys.index((('gcc', 'O2'), 'cycles'))
+        self.assertEqual(matrix[row].tolist(), [1010.0, 1000.0])
+        keys, _, matrix = self.history.series('bench', ['FOM'])
+        self.assertEqual(keys, [(('gcc', 'O2'), 'FOM')])
+        self.assertEqual(matrix.shape, (1, 2))
+
+    def test_changes(self):
+        """History Test / Change points"""
+        rng = np.random.default_rng(0)
+        for night in range(30):
+            cycles = 1000 + int(rng.integers(-5, 6)) + (100 if night >= 20 else 0)
+            fom = 5.0 if night < 10 else 4.0
+            self.history.record(_night(cycles, fom),
+                                '2026-09-{:02d}'.format(night + 1))
+        changes = self.history.changes('bench')
+        found = {(change.path, change.metric, change.date) for change in changes}
+        self.assertEqual(found, {(('gcc', 'O2'), 'cycles', '2026-09-21'),
+                                 (('gcc', 'O2'), 'FOM', '2026-09-11')})
+        self.assertTrue(all(change.worse for change in changes))
+        fom = [change for change in changes if change.metric == 'FOM'][0]
+        self.assertEqual((fom.before, fom.after), (5.0, 4.0))
+        self.assertAlmostEqual(fom.delta, -0.2)
+        self.assertEqual(fom.finding().name, 'gcc-O2@2026-09-11')
+        # Small shifts are not reported
+        self.assertEqual(self.history.changes('bench', {'threshold': 0.5}), [])
+
+    def test_change_points(self):
+        """History Test / Vectorised segmentation"""
+        matrix = np.array([[0.0] * 8 + [10.0] * 8 + [0.0] * 8,
+                           [0.0, 1.0] * 12,
+                           [np.nan] * 20 + [1.0] * 4])
+        matrix[0, 7] = np.nan
+        rows, positions = change_points(matrix)
+        self.assertEqual(rows.tolist(), [0, 0])
+        self.assertEqual(positions.tolist(), [8, 16])
+        # Single nights are segments too small to split
+        rows, positions = change_points(np.array([[0.0, 100.0]]), 0.01, 1)
+        self.assertEqual(positions.tolist(), [1])
+        rows, positions = change_points(np.array([[0.0, 100.0, 0.0, 100.0]]),
+                                        0.01, 1)
+        self.assertEqual(positions.tolist(), [1, 2, 3])
+        with self.assertRaises(ValueError):
+            change_points(matrix, min_size=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""Testing script for the category index"""
+
+import unittest
+from index import CategoryIndex
+from linux_perf import PerfData
+from data import Data
+
+class TestIndex(unittest.TestCase):
+    """Category index tests"""
+
+    def setUp(self):
+        self.index = CategoryIndex()
+        for comp in ['gcc6', 'llvm4', 'llvm5']:
+            for opt in ['generic', 'native']:
+                for cores in ['1', '2', '4', '8']:
+                    self.index.add(('run', comp, opt, cores))
+
+    def test_find(self):
+        """Index Test / Find"""
+        index = self.index
+        self.assertEqual(len(index), 24)
+        self.assertEqual(index.find([None, None, None, '8']).tolist(),
+                         [3, 7, 11, 15, 19, 23])
+        self.assertEqual(index.find(['*', 'llvm5', 'native']).tolist(),
+                         [20, 21, 22, 23])
+        self.assertEqual(index.find([None, ['gcc6', 'llvm4'], None, '1']).tolist(),
+                         [0, 4, 8, 12])
+        self.assertEqual(index.find([None, 'icc']).tolist(), [])
+        self.assertEqual(len(index.find([])), 24)
+        self.assertEqual(index.path(13), ('run', 'llvm4', 'native', '2'))
+        self.assertEqual(index.get(('run', 'llvm4', 'native', '2')), 13)
+
+    def test_groups(self):
+        """Index Test / Groups"""
+        groups = list(self.index.groups(1))
+        self.assertEqual(len(groups), 8)
+        self.assertEqual(groups[0][0], ('run', 'generic', '1'))
+        self.assertEqual(groups[0][1].tolist(), [0, 8, 16])
+        groups = list(self.index.groups(3, self.index.find([None, 'gcc6'])))
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(groups[1][0], ('run', 'gcc6', 'native'))
+        self.assertEqual(groups[1][1].tolist(), [4, 5, 6, 7])
+
+    def test_data(self):
+        """Index Test / Data"""
+        data = Data('test', 'sep=-')
+        for log in ['gcc-O2-1.log', 'gcc-O3-1.log', 'llvm-O2-1.log']:
+            data.add_log('run', log, PerfData())
+        # Same path is one more sample (a repeat) of the same leaf
+        data.add_log('run', 'gcc-O2-1.log', PerfData())
+        self.assertEqual(len(data.records), 3)
+        self.assertEqual([len(samples) for samples in data.samples], [2, 1, 1])
+        self.assertEqual(data.find(['gcc']).tolist(), [0, 1])
+        self.assertEqual(data.find([None, 'O2']).tolist(), [0, 2])
+        self.assertEqual(data.find(run='other').tolist(), [])
+        run, cats, leaf = data.get_log(0)
+        self.assertEqual((run, cats), ('run', ('gcc', 'O2', '1')))
+        self.assertTrue(leaf is data.logs['run']['gcc']['O2']['1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
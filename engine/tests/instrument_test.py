@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""Testing script for stage timers, counters and profiling"""
+
+import io
+import unittest
+from instrument import Stats, profile
+
+class TestInstrument(unittest.TestCase):
+    """Instrument tests"""
+
+    def test_disabled(self):
+        """Instrument Test / Disabled is a no-op"""
+        stats = Stats()
+        with stats.timer('parse'):
+            stats.count('files')
+        self.assertEqual(stats.timers, {})
+        self.assertEqual(stats.counters, {})
+        self.assertEqual(stats.report(), '')
+
+    def test_timers_counters(self):
+        """Instrument Test / Timers and counters"""
+        stats = Stats()
+        stats.enable()
+        for _ in range(3):
+            with stats.timer('parse'):
+                with stats.timer('read'):
+                    sum(range(1000))
+            stats.count('files')
+        stats.count('bytes', 1024)
+        calls, wall, cpu = stats.timers['parse']
+        self.assertEqual(calls, 3)
+        self.assertGreaterEqual(wall, stats.timers['read'][1])
+        self.assertGreaterEqual(cpu, 0.0)
+        self.assertEqual(stats.counters, {'files': 3, 'bytes': 1024})
+        report = stats.report().split('\n')
+        self.assertEqual(len(report), 4)
+        self.assertTrue(report[0].startswith('read'))
+        self.assertTrue(report[3].startswith('bytes'))
+        stats.reset()
+        self.assertEqual(repr(stats), '[ Stats: 0 timer(s), 0 counter(s) ]')
+
+    def test_merge(self):
+        """Instrument Test / Registries of worker processes"""
+        worker = Stats()
+        worker.enable()
+        with worker.timer('parse'):
+            worker.count('fields matched', 18)
+        taken = worker.take()
+        self.assertEqual(repr(worker), '[ Stats: 0 timer(s), 0 counter(s) ]')
+        parent = Stats()
+        parent.merge(*taken)
+        self.assertEqual(parent.timers, {})
+        parent.enable()
+        with parent.timer('parse'):
+            parent.count('fields matched', 2)
+        parent.merge(*taken)
+        parent.merge(*taken)
+        self.assertEqual(parent.timers['parse'][0], 3)
+        self.assertEqual(parent.counters, {'fields matched': 38})
+
+    def test_profile(self):
+        """Instrument Test / Profile"""
+        out = io.StringIO()
+        result = profile(sorted, [3, 1, 2], top=5, out=out)
+        self.assertEqual(result, [1, 2, 3])
+        text = out.getvalue()
+        self.assertIn(' + Profile (top 5 by cumulative time):', text)
+        self.assertIn(' + Memory (peak ', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,12 @@
 import unittest
 import os
 from pathlib import Path
-from linux_perf import LinuxPerf, PerfData
+import sys
+import tempfile
+import numpy as np
+from linux_perf import LinuxPerf, PerfData, PerfRecord, schedule, event_list
 from data import Data
+import lulesh
 
 RAW = """
  Performance counter stats for 'date':
@@ -23,6 +27,74 @@ RAW = """
        0.001128531 seconds time elapsed
 """
 
+# Top-down as perf stat -M TopdownL1,TopdownL2 (Icelake, hybrid PMU)
+TMA = """
+     1,000,000      cycles
+ 6,000,000,000      cpu_core/slots/                  #     40.0 %  tma_backend_bound
+                                                  #     10.0 %  tma_bad_speculation
+                                                  #     20.0 %  tma_frontend_bound
+                                                  #     30.0 %  tma_retiring
+   900,000,000      cpu_core/topdown-mem-bound/      #     15.0 %  tma_memory_bound
+        12,345      LLC-load-misses           #    3.21% of all LL-cache accesses
+         6,789      dTLB-load-misses
+"""
+
+# perf stat --topdown -a (Skylake): per core, after its number of CPUs
+TOPDOWN = """
+        retiring      bad speculation       frontend bound        backend bound
+S0-D0-C0           2        37.6%                 9.5%                 8.5%                44.4%
+S0-D0-C1           2        36.6%                 9.5%                 9.5%                44.4%
+
+       1.001426264 seconds time elapsed
+"""
+
+# Stand-in for perf: prints the next cycles value of a file (and a Lulesh
+# FOM after it, cycles/FOM), runs nothing
+STUB = """#!{python}
+import sys
+with open({values!r}) as values:
+    lines = values.read().split()
+with open({values!r}, 'w') as values:
+    values.write(' '.join(lines[1:] + lines[:1]))
+cycles, _, fom = lines[0].partition('/')
+sys.stderr.write(cycles + ' cycles\\n1000 instructions\\n')
+sys.stdout.write(' '.join(sys.argv[1:]))
+if fom:
+    sys.stdout.write('\\nFOM                  =  ' + fom + ' (z/s)\\n')
+"""
+
+def _stub(directory, values):
+    """Fake perf command printing values, in a loop"""
+    path = os.path.join(directory, 'perf')
+    with open(os.path.join(directory, 'values'), 'w') as out:
+        out.write(' '.join(values))
+    with open(path, 'w') as stub:
+        stub.write(STUB.format(python=sys.executable,
+                               values=os.path.join(directory, 'values')))
+    os.chmod(path, 0o755)
+    return path
+
+# Stand-in for perf on a PMU with two counters: more hardware events in a run
+# are multiplexed, their counts scaled (and off by 10%)
+PMU = """#!{python}
+import sys
+COUNTS = {{'cycles': 1000, 'instructions': 2000, 'cache-misses': 30,
+          'branches': 400, 'page-faults': 7}}
+events = sys.argv[sys.argv.index('-e') + 1]
+with open({calls!r}, 'a') as calls:
+    calls.write(events + '\\n')
+events = events.replace('{{', '').replace('}}', '').split(',')
+hardware = [event for event in events if event != 'page-faults']
+ratio = min(1.0, 2.0 / len(hardware))
+for event in events:
+    if event in hardware and ratio < 1.0:
+        sys.stderr.write('%d %s (%.2f%%)\\n' % (COUNTS[event] * 1.1, event, ratio * 100))
+    else:
+        sys.stderr.write('%d %s\\n' % (COUNTS[event], event))
+sys.stderr.write('0.5 seconds time elapsed\\n')
+sys.stdout.write('FOM 42')
+"""
+
 class TestLinuxPerf(unittest.TestCase):
     """LinuxPerf tests"""
 
@@ -40,6 +112,47 @@ class TestLinuxPerf(unittest.TestCase):
         elapsed = float(raw.get_value('elapsed'))
         self.assertEqual(elapsed, 0.001128531)
 
+    def test_topdown(self):
+        """LinuxPerf Test / Top-down and memory events"""
+        example = PerfData()
+        example.parse(TMA)
+        values = example.get_values()
+        self.assertEqual(values['tma_backend_bound'], 40.0)
+        self.assertEqual(values['tma_memory_bound'], 15.0)
+        self.assertEqual(values['slots'], 6e9)
+        self.assertEqual(values['topdown-mem-bound'], 9e8)
+        self.assertEqual(values['LLC-load-misses'], 12345.0)
+        self.assertEqual(values['dTLB-load-misses'], 6789.0)
+        # Benchmark output that looks like a counter is not one
+        example.parse("Allocated 64 slots\n100 cycles")
+        self.assertNotIn('slots', example.get_values())
+
+        example.parse(TOPDOWN)
+        values = example.get_values()
+        self.assertEqual(values['tma_retiring'], 37.1)
+        self.assertEqual(values['tma_frontend_bound'], 9.0)
+        self.assertEqual(values['tma_backend_bound'], 44.4)
+
+        # Slower configuration, all of it memory bound
+        data = Data('data', 'sep=-,none,topdown=2')
+        for opt, cycles, memory in (('O1', 1000000, 15.0), ('O2', 1010000, 15.0),
+                                    ('O3', 1300000, 32.0), ('Os', 990000, 15.0)):
+            backend = 40.0 * cycles / 1000000 if opt == 'O3' else 40.0
+            text = TMA.replace('40.0 %', repr(backend) + ' %')
+            text = text.replace('15.0 %', repr(memory) + ' %')
+            example = PerfData()
+            example.parse(text.replace('1,000,000', repr(cycles)))
+            data.add_log('run', 'gcc-' + opt + '.log', example)
+        results = list(data.results())
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][3], 'cycles')
+        self.assertEqual(results[0][4], [1000000.0, 1010000.0, 1300000.0, 990000.0])
+        findings = list(data.analyse())
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings[0].name, 'run/gcc-O3.log')
+        self.assertEqual(findings[0].metric, 'cycles (backend_bound/memory_bound)')
+        self.assertEqual(findings[0].reference, 1005000.0)
+
     def test_simple_exec(self):
         """LinuxPerf Test / Simple Exec"""
         date = LinuxPerf(['date'])
@@ -151,5 +264,210 @@ class TestLinuxPerf(unittest.TestCase):
         self.assertTrue(str(data1.analyses[2]).endswith('Clustering'))
         self.assertTrue(str(data1.analyses[3]).endswith('CurveFit'))
 
+        # Outlier method in the data string
+        data2 = Data('data2', 'sep=-,none,outlier=esd:0.01,outlier=3.0')
+        self.assertEqual(data2.analyses[1].plugin.options['method'], 'esd')
+        self.assertEqual(data2.analyses[1].plugin.options['threshold'], 0.01)
+        self.assertEqual(data2.analyses[2].plugin.options['method'], 'mzs')
+        with self.assertRaises(ValueError):
+            Data('data3', 'sep=-,outlier=best:1')
+        with self.assertRaises(ValueError):
+            Data('data3', 'sep=-,cluster=esd:2')
+
+        # Multivariate: one result per group, all counters at once
+        data4 = Data('data4', 'sep=-,none,multivariate=0.01')
+        for num in range(12):
+            example = PerfData()
+            cycles = 1000000 + 20000 * num + (200000 if num == 5 else num % 3)
+            example.parse(repr(cycles) + " cycles\n" +
+                          repr(1250000 + 25000 * num) + " instructions")
+            data4.add_log('run', 'gcc-' + repr(num) + '.log', example)
+        results = list(data4.results())
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0][3], 'distance')
+        self.assertEqual(len(results[0][4]), 12)
+        findings = list(data4.analyse())
+        self.assertEqual([finding.name for finding in findings], ['run/gcc-5.log'])
+        self.assertIn('cycles', findings[0].metric)
+
+    def test_record(self):
+        """PerfRecord test / Compact leaves"""
+        example = PerfData()
+        example.parse(RAW)
+        example.append({'FOM': '962.63', 'Threads': '8'})
+        first = PerfRecord('a.log', example.get_values())
+        second = PerfRecord('b.log', example.get_values())
+        # Schema is shared, values are doubles, no dictionaries per record
+        self.assertIs(first.keys, second.keys)
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertEqual(first.get_value('cycles'), 383614.0)
+        self.assertEqual(first.get_value('FOM'), 962.63)
+        self.assertEqual(first.get_value('name'), 'a.log')
+        self.assertEqual(first.get_value('nothing'), 0)
+        self.assertEqual(first.get_values(), example.get_values())
+        size = sys.getsizeof(first) + sys.getsizeof(first.values)
+        self.assertLess(size, 300)
+
+        data = Data('data', 'sep=-,none,none')
+        data.add_log('run', 'gcc-1.log', example)
+        _, _, leaf = data.get_log(0)
+        self.assertEqual(str(leaf), 'PerfRecord')
+        self.assertEqual(leaf.get_value('instructions'), 300826.0)
+
+    def test_stat_command(self):
+        """LinuxPerf Test / perf stat command line"""
+        with tempfile.TemporaryDirectory() as tmp:
+            app = LinuxPerf(['bench', '-s', '10'], perf=_stub(tmp, ['5']))
+            app.stat(3, ['cycles', 'instructions'])
+            self.assertEqual(app.output,
+                             'stat -r 3 -e cycles,instructions bench -s 10')
+            self.assertEqual(app.parse().get_value('cycles'), '5')
+
+    def test_schedule(self):
+        """LinuxPerf Test / Counter groups"""
+        events = ['cycles', 'instructions', 'page-faults', 'cache-misses',
+                  'branches:u']
+        self.assertEqual(schedule(events, 2),
+                         [['cycles', 'instructions', 'page-faults'],
+                          ['cache-misses', 'branches:u']])
+        self.assertEqual(schedule(events, 4), [events[:2] + events[3:] + events[2:3]])
+        self.assertEqual(schedule(['page-faults'], 2), [['page-faults']])
+        self.assertEqual(event_list(['cycles', 'instructions', 'page-faults']),
+                         '{cycles,instructions},page-faults')
+        self.assertEqual(event_list(['cycles']), 'cycles')
+        with self.assertRaises(ValueError):
+            schedule(events, 0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            calls = os.path.join(tmp, 'calls')
+            perf = os.path.join(tmp, 'perf')
+            with open(perf, 'w') as stub:
+                stub.write(PMU.format(python=sys.executable, calls=calls))
+            os.chmod(perf, 0o755)
+            events = ['cycles', 'instructions', 'cache-misses', 'branches',
+                      'page-faults']
+
+            # All at once: multiplexed, scaled counts
+            app = LinuxPerf(['bench'], perf=perf)
+            app.stat(events=events)
+            app.parse()
+            self.assertEqual(app.get_value('cycles'), '1100')
+            self.assertEqual(app.get_value('mux:cycles'), '0.5')
+            self.assertEqual(app.get_value('mux:page-faults'), '1.0')
+
+            # Scheduled: one run per group, exact counts, merged
+            Path(calls).unlink()
+            app = LinuxPerf(['bench'], perf=perf)
+            app.stat(events=events, counters=2)
+            self.assertEqual(Path(calls).read_text().split(),
+                             ['{cycles,instructions},page-faults',
+                              '{cache-misses,branches}'])
+            self.assertEqual(app.output, 'FOM 42')
+            data = app.parse()
+            for event in ('cycles', 'instructions', 'cache-misses', 'branches',
+                          'page-faults'):
+                self.assertEqual(app.get_value('mux:' + event), '1.0')
+            self.assertEqual(app.get_value('cache-misses'), '30')
+            self.assertEqual(app.get_value('elapsed'), '0.5')
+            self.assertEqual(data.get_values()['branches'], 400.0)
+            with self.assertRaises(ValueError):
+                LinuxPerf(['bench'], perf=perf).stat(counters=2)
+
+    def test_stat_adaptive(self):
+        """LinuxPerf Test / Adaptive repeats"""
+        with tempfile.TemporaryDirectory() as tmp:
+            # Stable: stops at the minimum
+            app = LinuxPerf(['bench'], perf=_stub(tmp, ['1000']))
+            widths = app.stat_adaptive(['cycles', 'instructions'])
+            self.assertEqual(widths, {'cycles': 0.0, 'instructions': 0.0})
+            self.assertEqual(len(app.runs), 3)
+            self.assertEqual(app.get_value('runs'), 3)
+            self.assertEqual(app.get_value('ci:cycles'), 0.0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Noisy: runs until the interval is narrow enough
+            app = LinuxPerf(['bench'], perf=_stub(tmp, ['990', '1010']))
+            widths = app.stat_adaptive(['cycles'], {'target': 0.02})
+            runs = len(app.runs)
+            self.assertGreater(runs, 3)
+            self.assertLessEqual(widths['cycles'], 0.02)
+            self.assertEqual(app.get_value('runs'), runs)
+            # One more run and it would not have been needed
+            self.assertAlmostEqual(float(app.get_value('cycles')),
+                                   1000.0 if runs % 2 == 0 else
+                                   1000.0 - 10.0 / runs)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # Too noisy: stops at the maximum, with the precision it got
+            app = LinuxPerf(['bench'], perf=_stub(tmp, ['500', '1500']))
+            widths = app.stat_adaptive(['cycles'], {'target': 0.01, 'max': 6})
+            self.assertEqual(app.get_value('runs'), 6)
+            self.assertGreater(app.get_value('ci:cycles'), 0.01)
+            self.assertEqual(app.get_value('ci:cycles'), widths['cycles'])
+
+            with self.assertRaises(RuntimeError):
+                app.stat_adaptive(['FOM'])
+            with self.assertRaises(ValueError):
+                app.stat_adaptive(['cycles'], {'tolerance': 1})
+            with self.assertRaises(ValueError):
+                app.stat_adaptive(['cycles'], {'min': 1})
+            with self.assertRaises(TypeError):
+                app.stat_adaptive('cycles')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # A later run crashed (no FOM): not the FOM of the run before
+            app = LinuxPerf(['bench'], lulesh.LinuxPerfPlugin(),
+                            perf=_stub(tmp, ['1000/950', '1000/960', '1000']))
+            with self.assertRaises(RuntimeError) as error:
+                app.stat_adaptive(['FOM'])
+            self.assertEqual(str(error.exception), "No FOM in run 3")
+
+    def test_check_log(self):
+        """Data test / Logs that don't fit"""
+        example = PerfData()
+        example.parse(RAW)
+        data = Data('data', 'sep=-,none,outlier=1')
+        self.assertIsNone(data.check_log('gcc-1.log'))
+        self.assertIn('-d argument', data.check_log('gcc-O2-1.log'))
+        with self.assertRaises(ValueError):
+            data.add_log('run', 'gcc.log', example)
+        self.assertEqual(data.num_logs, 0)
+        data = Data('data', 'sep=-')
+        data.add_log('run', 'gcc-1.log', example)
+        self.assertIn('separators', data.check_log('gcc-O2-1.log'))
+        self.assertIsNone(data.check_log('llvm-2.log'))
+
+    def test_repeats(self):
+        """Data test / Repeated runs are samples of one leaf"""
+        data = Data('data', 'sep=-,none,outlier=1')
+        for num, cycles in enumerate(['100', '130', '110']):
+            example = PerfData()
+            example.parse(cycles + ' cycles')
+            data.add_log('run', 'gcc-1-r' + repr(num + 1) + '.log', example)
+        example = PerfData()
+        example.parse('200 cycles')
+        data.add_log('run', 'gcc-2.log', example)
+        self.assertEqual(data.num_logs, 4)
+        self.assertEqual(len(data.records), 2)
+        self.assertEqual([len(samples) for samples in data.samples], [3, 1])
+        _, cats, leaf = data.get_log(0)
+        self.assertEqual(cats, ('gcc', '1'))
+        self.assertEqual(leaf.get_value('name'), 'gcc-1.log')
+        self.assertEqual(leaf.get_value('cycles'), 110.0)
+        self.assertEqual(list(data.columns()['cycles']), [110.0, 200.0])
+
+        stats = data.sample_stats('cycles')
+        self.assertEqual(list(stats['count']), [3, 1])
+        self.assertEqual(list(stats['min']), [100.0, 200.0])
+        self.assertEqual(list(stats['median']), [110.0, 200.0])
+        self.assertAlmostEqual(stats['stdev'][0], 15.275252, places=5)
+        self.assertTrue(np.isnan(stats['stdev'][1]))
+        stats = data.sample_stats('instructions')
+        self.assertEqual(list(stats['count']), [0, 0])
+        self.assertTrue(np.all(np.isnan(stats['median'])))
+
+        # A category that happens to look like a repeat number is kept
+        self.assertEqual(data._categories('gcc-r1.log'), (['gcc', 'r1'], 'gcc-r1.log'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""Testing script for compressed and archived logs"""
+
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import tempfile
+import unittest
+from logfile import read_logs, stream_logs, is_archive, strip_extension, \
+    zstandard
+
+LOGS = {
+    'gcc-O2-1.log': "123 cycles\n",
+    'gcc-O2-2.log': "456 cycles\n",
+}
+
+class TestLogFile(unittest.TestCase):
+    """Log file tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _path(self, name):
+        """Path in the temporary directory"""
+        return os.path.join(self.tmp.name, name)
+
+    def _tar(self, name, mode):
+        """Writes LOGS (plus a hidden file and a directory) to an archive"""
+        with tarfile.open(self._path(name), mode) as tar:
+            directory = tarfile.TarInfo('run')
+            directory.type = tarfile.DIRTYPE
+            tar.addfile(directory)
+            for log, text in list(LOGS.items()) + [('.hidden', 'x')]:
+                info = tarfile.TarInfo('run/' + log)
+                info.size = len(text)
+                tar.addfile(info, io.BytesIO(text.encode()))
+        return self._path(name)
+
+    def test_names(self):
+        """LogFile Test / Names"""
+        self.assertEqual(strip_extension('gcc-O2-1.log'), 'gcc-O2-1')
+        self.assertEqual(strip_extension('gcc-O2-1.log.gz'), 'gcc-O2-1')
+        self.assertEqual(strip_extension('gcc-O2-1.log.zst'), 'gcc-O2-1')
+        self.assertEqual(strip_extension('lulesh2.0-gcc-1'), 'lulesh2.0-gcc-1')
+        self.assertTrue(is_archive('logs.tar'))
+        self.assertTrue(is_archive('logs.tgz'))
+        self.assertTrue(is_archive('logs.TAR.XZ'))
+        self.assertFalse(is_archive('gcc-O2-1.log.gz'))
+
+    def test_compressed(self):
+        """LogFile Test / Compressed logs"""
+        with gzip.open(self._path('gcc-O2-1.log.gz'), 'wt') as log:
+            log.write(LOGS['gcc-O2-1.log'])
+        with lzma.open(self._path('gcc-O2-2.log.xz'), 'wt') as log:
+            log.write(LOGS['gcc-O2-2.log'])
+        self.assertEqual(list(read_logs(self._path('gcc-O2-1.log.gz'))),
+                         [('gcc-O2-1.log.gz', "123 cycles\n")])
+        self.assertEqual(list(read_logs(self._path('gcc-O2-2.log.xz'))),
+                         [('gcc-O2-2.log.xz', "456 cycles\n")])
+
+    def test_archives(self):
+        """LogFile Test / Archives"""
+        for name, mode in (('a.tar', 'w'), ('a.tgz', 'w:gz'),
+                           ('a.tar.xz', 'w:xz')):
+            path = self._tar(name, mode)
+            self.assertEqual(dict(read_logs(path)), LOGS)
+            # Members keep their directory
+            self.assertEqual([(reldir, name) for reldir, name, _
+                              in stream_logs(path)],
+                             [('run', log) for log in LOGS])
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        """LogFile Test / zstd archive"""
+        path = self._tar('a.tar', 'w')
+        with open(path, 'rb') as src, open(path + '.zst', 'wb') as dst:
+            zstandard.ZstdCompressor().copy_stream(src, dst)
+        self.assertEqual(dict(read_logs(path + '.zst')), LOGS)
+
+if __name__ == '__main__':
+    unittest.main()
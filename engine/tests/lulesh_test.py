@@ -117,6 +117,18 @@ class TestLulesh(unittest.TestCase):
         diff3 = float(perf.get_value('MaxRelDiff'))
         self.assertEqual(diff3, 1.566182e-14)
 
+    def test_check(self):
+        """Lulesh Test / Incomplete runs"""
+        perf = LinuxPerf(plugin=LinuxPerfPlugin())
+        perf.parse(RAW, '123 instructions')
+        self.assertEqual(perf.check(), [])
+        perf = LinuxPerf(plugin=LinuxPerfPlugin())
+        perf.parse(RAW.replace('FOM', 'Foo'), '123 instructions')
+        self.assertEqual(perf.check(), ['missing FOM'])
+        perf = LinuxPerf(plugin=LinuxPerfPlugin())
+        perf.parse(RAW.replace('FOM', 'Foo'))
+        self.assertEqual(perf.check(), ['no perf stat output', 'missing FOM'])
+
 
 if __name__ == '__main__':
     unittest.main()
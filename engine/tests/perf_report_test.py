@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""Testing script for perf report / perf script hotspots"""
+
+import io
+import unittest
+from linux_perf import PerfData
+from data import Data
+from perf_report import hotspots, parse_report, parse_script, is_report
+
+REPORT = """# To display the perf.data header info, please use --header/--header-only options.
+#
+# Samples: 1M of event 'cycles:u'
+# Event count (approx.): 2169148902642
+#
+# Overhead  Command    Shared Object      Symbol
+# ........  .........  .................  ..................................
+#
+    45.23%  lulesh2.0  lulesh2.0          [.] CalcHourglassControlForElems
+    20.10%  lulesh2.0  lulesh2.0          [.] IntegrateStressForElems
+     9.00%  lulesh2.0  libm-2.27.so       [.] __pow_finite
+     1.00%  lulesh2.0  lulesh2.0          [.] __pow_finite
+     0.10%  lulesh2.0  [kernel.kallsyms]  [k] page_fault
+"""
+
+CHILDREN = """# Children      Self  Command    Shared Object  Symbol
+    99.00%     0.00%  lulesh2.0  lulesh2.0      [.] main
+            |
+            ---main
+               |--50.00%--CalcHourglassControlForElems
+    50.00%    50.00%  lulesh2.0  lulesh2.0      [.] CalcHourglassControlForElems
+"""
+
+SCRIPT = """lulesh2.0 12345 [001] 1234.567890:     300000 cycles:u: 
+\t          4005d6 CalcHourglassControlForElems+0x26 (/usr/bin/lulesh2.0)
+\t          400a10 main+0x100 (/usr/bin/lulesh2.0)
+
+lulesh2.0 12345 [001] 1234.567990:     100000 cycles:u: 
+\t          4007d6 IntegrateStressForElems+0x12 (/usr/bin/lulesh2.0)
+\t          400a10 main+0x100 (/usr/bin/lulesh2.0)
+
+lulesh2.0 12345 [002] 1234.568090:     100000 cycles:u:  4005d6 CalcHourglassControlForElems+0x30 (/usr/bin/lulesh2.0)
+"""
+
+class TestPerfReport(unittest.TestCase):
+    """Perf report tests"""
+
+    def test_report(self):
+        """PerfReport Test / perf report --stdio"""
+        values = parse_report(io.StringIO(REPORT))
+        self.assertEqual(list(values), ['sym:CalcHourglassControlForElems',
+                                        'sym:IntegrateStressForElems',
+                                        'sym:__pow_finite'])
+        self.assertAlmostEqual(values['sym:__pow_finite'], 10.0)
+        # Self column, when children are there
+        values = parse_report(CHILDREN.splitlines())
+        self.assertEqual(values, {'sym:CalcHourglassControlForElems': 50.0})
+
+    def test_script(self):
+        """PerfReport Test / perf script"""
+        values = parse_script(SCRIPT.splitlines())
+        self.assertAlmostEqual(values['sym:CalcHourglassControlForElems'], 80.0)
+        self.assertAlmostEqual(values['sym:IntegrateStressForElems'], 20.0)
+        self.assertNotIn('sym:main', values)
+        self.assertEqual(parse_script([]), {})
+
+    def test_detect(self):
+        """PerfReport Test / Format detection"""
+        self.assertEqual(hotspots(io.StringIO(REPORT)), parse_report(REPORT.splitlines()))
+        self.assertEqual(hotspots(io.StringIO(SCRIPT)), parse_script(SCRIPT.splitlines()))
+        self.assertEqual(hotspots(REPORT.splitlines(), threshold=15.0),
+                         {'sym:CalcHourglassControlForElems': 45.23,
+                          'sym:IntegrateStressForElems': 20.1})
+        self.assertTrue(is_report('gcc-O2-1.report'))
+        self.assertTrue(is_report('gcc-O2-1.script.gz'))
+        self.assertFalse(is_report('gcc-O2-1.log'))
+
+    def test_attach(self):
+        """PerfReport Test / Hotspots in Data"""
+        data = Data('data', 'sep=-,none,outlier=1')
+        for opt in ('O1', 'O2', 'O3'):
+            perf = PerfData()
+            perf.parse("1000 cycles")
+            data.add_log('run', 'gcc-' + opt + '.log', perf)
+        self.assertTrue(data.attach('run', 'gcc-O2.report.gz',
+                                    parse_report(REPORT.splitlines())))
+        self.assertFalse(data.attach('run', 'gcc-O4.report', {'sym:x': 1.0}))
+        _, _, leaf = data.get_log(1)
+        self.assertEqual(leaf.get_value('cycles'), 1000.0)
+        self.assertAlmostEqual(leaf.get_value('sym:IntegrateStressForElems'), 20.1)
+        self.assertIs(data.logs['run']['gcc']['O2'], leaf)
+        self.assertEqual(len(data.columns()['sym:__pow_finite']), 3)
+
+    def test_analyse(self):
+        """PerfReport Test / Symbols below the threshold in some logs"""
+        data = Data('data', 'sep=-,none,outlier=1')
+        shares = {'O1': 40.0, 'O2': 41.0, 'O3': 39.5, 'O4': 40.5, 'O5': 0.2}
+        for opt in list(shares) + ['Os']:
+            perf = PerfData()
+            perf.parse("1000 cycles")
+            data.add_log('run', 'gcc-' + opt + '.log', perf)
+        line = "  {:.2f}%  lulesh2.0  lulesh2.0  [.] {}"
+        for opt, share in shares.items():
+            report = [line.format(share, 'CalcFoo'),
+                      line.format(100.0 - share, 'main')]
+            data.attach('run', 'gcc-' + opt + '.report', parse_report(report))
+        # O5's CalcFoo isn't in its report, gcc-Os has no report at all
+        self.assertEqual(data.get_log(4)[2].get_value('sym:CalcFoo'), 0)
+        findings = [(finding.name, finding.metric) for finding in data.analyse()]
+        self.assertIn(('run/gcc-O5.log', 'sym:CalcFoo'), findings)
+        self.assertFalse([name for name, _ in findings if 'Os' in name])
+
+if __name__ == '__main__':
+    unittest.main()
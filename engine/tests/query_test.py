@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Testing script for the query language"""
+
+import unittest
+import math
+import numpy as np
+from linux_perf import PerfData
+from data import Data
+from query import Query, QueryResult
+
+class TestQuery(unittest.TestCase):
+    """Query tests"""
+
+    def setUp(self):
+        self.data = Data('test', 'sep=-')
+        for comp, base in [('gcc', 1000), ('llvm', 2000), ('icc', 4000)]:
+            for opt in ['O2', 'O3']:
+                for cores in ['1', '2', '4', '8']:
+                    perf = PerfData()
+                    cycles = base * int(cores) + (opt == 'O3')
+                    perf.parse(str(cycles) + " cycles")
+                    self.data.add_log('run', comp + '-' + opt + '-' + cores,
+                                      perf)
+
+    def test_select(self):
+        """Query Test / Select"""
+        result = Query("select cat0, cycles where cat1 = O3 and "
+                       "cat2 >= 4 and cat0 not in (icc)").run(self.data)
+        self.assertEqual(result.header, ['name', 'cat0', 'cycles'])
+        self.assertEqual([row[2] for row in result.rows],
+                         [4001, 8001, 8001, 16001])
+        result = Query("select cycles where cycles > 16000").run(self.data)
+        self.assertEqual(len(result.rows), 4)
+
+    def test_group(self):
+        """Query Test / Group"""
+        result = Query("SELECT cycles WHERE cat0 IN (gcc, llvm) "
+                       "GROUP BY cat0, cat1 AGG median").run(self.data)
+        self.assertEqual(result.header, ['cat0', 'cat1', 'median(cycles)'])
+        self.assertEqual(len(result.rows), 4)
+        self.assertEqual(result.rows[0][:2], ['gcc', 'O2'])
+        self.assertEqual(result.rows[0][2], 3000)
+        for agg, expected in [('count', 8), ('min', 1000), ('max', 8001),
+                              ('sum', 30004), ('mean', 3750.5)]:
+            result = Query("select cycles where cat0 = gcc agg " + agg)
+            self.assertEqual(result.run(self.data).rows[0][0], expected)
+        result = Query("select cycles where cat0 = gcc group by cat2 "
+                       "agg stdev").run(self.data)
+        # Sample stdev, as Data.sample_stats
+        self.assertAlmostEqual(result.rows[0][1], math.sqrt(0.5))
+        self.assertTrue(str(result).startswith("cat2  stdev(cycles)"))
+        result = Query("select cycles where cat0 = gcc and cat1 = O2 "
+                       "group by cat2 agg stdev").run(self.data)
+        self.assertTrue(all(math.isnan(row[1]) for row in result.rows))
+        # One number format per column
+        table = QueryResult(['a', 'b'], [[1511449795496.0, 2.0],
+                                         [1478900000000.5, np.nan]])
+        self.assertEqual(str(table).split("\n")[1:],
+                         ["1.51145e+12  2", "1.4789e+12   -"])
+        # Empty results
+        result = Query("select cycles where cat0 = xlc agg mean").run(self.data)
+        self.assertTrue(math.isnan(result.rows[0][0]))
+
+    def test_errors(self):
+        """Query Test / Errors"""
+        for text in ["cycles", "select", "select cycles where cat0",
+                     "select cycles where cat0 ~ 1", "select cycles agg avg",
+                     "select cycles where cat0 in (gcc"]:
+            with self.assertRaises(ValueError):
+                Query(text)
+        with self.assertRaises(ValueError):
+            Query("select cycles where cat5 = 1").run(self.data)
+        with self.assertRaises(ValueError):
+            Query("select foo").run(self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""Testing script for group analysis and top-K ranking"""
+
+import unittest
+from linux_perf import PerfData
+from data import Data
+from ranking import Finding, Ranking
+
+def _perf(cycles):
+    """PerfData with just cycles"""
+    perf = PerfData()
+    perf.parse(str(cycles) + " cycles")
+    return perf
+
+class TestRanking(unittest.TestCase):
+    """Ranking tests"""
+
+    def test_top(self):
+        """Ranking Test / Top K"""
+        rank = Ranking(3)
+        for i in range(100):
+            rank.push(Finding('Test', 'log' + str(i), 'cycles', 100 + i % 10, 100))
+        self.assertEqual(rank.count, 100)
+        top = rank.results()
+        self.assertEqual(len(top), 3)
+        # Highest scores first, ties keep the first seen
+        self.assertEqual([f.name for f in top], ['log9', 'log19', 'log29'])
+        self.assertEqual(top[0].impact, 9.0)
+        self.assertAlmostEqual(top[0].score, 0.09)
+
+    def test_analyse(self):
+        """Ranking Test / Group analysis"""
+        data = Data('test', 'sep=-,outlier=3.5,fit=1/al')
+        cycles = {'gcc': [100, 200, 400, 800], 'llvm': [100, 200, 400, 800],
+                  'icc': [100, 201, 399, 810], 'xlc': [100, 200, 400, 450],
+                  'armclang': [101, 199, 402, 790]}
+        for comp, values in cycles.items():
+            for cores, cyc in zip(['1', '2', '4', '8'], values):
+                data.add_log('run', comp + '-' + cores + '.log', _perf(cyc))
+        self.assertEqual(len(list(data.groups(0))), 4)
+        self.assertEqual(len(list(data.groups(1))), 5)
+
+        rank = Ranking(5)
+        rank.extend(data.analyse())
+        top = rank.results()
+        # xlc doesn't scale to 8 cores, across compilers and along cores
+        self.assertEqual(top[0].kind, 'Outliers')
+        self.assertEqual(top[0].name, 'run/xlc-8.log')
+        self.assertEqual(top[0].reference, 800.0)
+        fits = [f.name for f in top if f.kind == 'CurveFit']
+        self.assertTrue(fits)
+        self.assertTrue(all(name.startswith('run/xlc-') for name in fits))
+
+
+if __name__ == '__main__':
+    unittest.main()
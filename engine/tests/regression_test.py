@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""Testing script for baseline vs. candidate comparison"""
+
+import unittest
+from linux_perf import PerfData
+from data import Data
+from regression import Regression
+
+RAW = """
+ Performance counter stats for 'date':
+
+           {cycles:,}      cycles:u                  #    0.522 GHz
+             300,826      instructions:u            #    0.78  insn per cycle
+              65,455      branches:u                #   89.045 M/sec
+
+       {elapsed} seconds time elapsed
+"""
+
+def _corpus(name, runs):
+    """Builds a Data with one log per (run, config) from (cycles, elapsed)"""
+    data = Data(name, 'sep=-')
+    for run, configs in enumerate(runs):
+        for config, (cycles, elapsed) in configs.items():
+            perf = PerfData()
+            perf.parse(RAW.format(cycles=cycles, elapsed=elapsed))
+            data.add_log('run' + str(run), config + '.log', perf)
+    return data
+
+class TestRegression(unittest.TestCase):
+    """Regression tests"""
+
+    def test_single_samples(self):
+        """Regression Test / No repeats"""
+        base = _corpus('base', [{'gcc-O2': (1000000, '1.000'),
+                                 'gcc-O3': (1000000, '1.000')}])
+        cand = _corpus('cand', [{'gcc-O2': (1300000, '1.001'),
+                                 'gcc-O3': (700000, '1.000'),
+                                 'llvm-O3': (1, '1.000')}])
+        reg = Regression(base, cand)
+        reg.run()
+        # cycles * 2 configs, instructions and branches are identical
+        self.assertEqual(reg.get_value('compared'), 8)
+        regressions = reg.get_value('regressions')
+        improvements = reg.get_value('improvements')
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(len(improvements), 1)
+        self.assertEqual(regressions[0].path, ('gcc', 'O2'))
+        self.assertEqual(regressions[0].metric, 'cycles')
+        self.assertAlmostEqual(regressions[0].delta, 0.3)
+        self.assertEqual(improvements[0].path, ('gcc', 'O3'))
+
+    def test_repeats(self):
+        """Regression Test / Repeats"""
+        # Noisy repeats: a 2% shift is not significant
+        base = _corpus('base', [{'gcc-O2': (1000000, '1.00')},
+                                {'gcc-O2': (1100000, '1.10')},
+                                {'gcc-O2': (900000, '0.90')}])
+        cand = _corpus('cand', [{'gcc-O2': (1020000, '1.02')},
+                                {'gcc-O2': (1120000, '1.12')},
+                                {'gcc-O2': (920000, '0.92')}])
+        reg = Regression(base, cand)
+        reg.run()
+        self.assertFalse(reg.get_value('regressions'))
+
+        # Tight repeats: the same 2% shift is
+        base = _corpus('base', [{'gcc-O2': (1000000, '1.000')},
+                                {'gcc-O2': (1001000, '1.001')},
+                                {'gcc-O2': (999000, '0.999')}])
+        cand = _corpus('cand', [{'gcc-O2': (1020000, '1.020')},
+                                {'gcc-O2': (1021000, '1.021')},
+                                {'gcc-O2': (1019000, '1.019')}])
+        reg = Regression(base, cand)
+        reg.run()
+        metrics = [delta.metric for delta in reg.get_value('regressions')]
+        self.assertEqual(metrics, ['cycles', 'elapsed'])
+        self.assertTrue(reg.get_value('regressions')[0].pvalue < 0.001)
+
+    def test_higher_is_better(self):
+        """Regression Test / Direction"""
+        base = _corpus('base', [{'gcc-O2': (1000000, '1.000')}])
+        cand = _corpus('cand', [{'gcc-O2': (1500000, '1.000')}])
+        reg = Regression(base, cand, {'higher': ['cycles']})
+        reg.run()
+        self.assertFalse(reg.get_value('regressions'))
+        self.assertEqual(len(reg.get_value('improvements')), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""Testing script for the query server"""
+
+import json
+import os
+import contextlib
+import io
+import socket
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+import numpy as np
+from linux_perf import PerfData
+from data import Data
+from server import QueryServer, make_server
+
+def _data(name):
+    """One outlier on O3, linear scaling with cores"""
+    data = Data(name, 'sep=-,none,outlier=1.5,fit=1/al')
+    for opt in ('O1', 'O2', 'O3', 'Os'):
+        for cores in ('1', '2', '4'):
+            cycles = 1000 * int(cores) * (3 if opt == 'O3' else 1)
+            perf = PerfData()
+            perf.parse(repr(cycles + len(opt)) + " cycles")
+            data.add_log('run', 'gcc-' + opt + '-' + cores + '.log', perf)
+    return data
+
+class TestServer(unittest.TestCase):
+    """Query server tests"""
+
+    def setUp(self):
+        self.app = QueryServer({'bench': _data('bench')})
+
+    def test_requests(self):
+        """Server Test / Requests"""
+        status, result = self.app.handle('/', {})
+        self.assertEqual(status, 200)
+        self.assertEqual(result['benchmarks'][0]['logs'], 12)
+        self.assertEqual(result['benchmarks'][0]['metrics'], ['cycles'])
+
+        status, result = self.app.handle('/summary', {'bench': 'bench'})
+        self.assertEqual(result['analyses'], [None, 'Outliers', 'CurveFit'])
+        self.assertEqual(result['values'][1], ['O1', 'O2', 'O3', 'Os'])
+
+        status, result = self.app.handle('/query', {
+            'q': 'select cycles where cat2 = 4 group by cat1 agg max'})
+        self.assertEqual(status, 200)
+        self.assertEqual(result['header'], ['cat1', 'max(cycles)'])
+        self.assertEqual(result['rows'][2], ['O3', 12002.0])
+
+        status, result = self.app.handle('/analysis', {'top': '2'})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(result['findings']), 2)
+        self.assertTrue(all('O3' in finding['name']
+                            for finding in result['findings']))
+        # Same answer from the warm findings
+        self.assertEqual(self.app.handle('/analysis', {'top': '2'}),
+                         (status, result))
+
+        status, result = self.app.handle('/groups', {'position': '1'})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(result['groups']), 3)
+        self.assertEqual(result['groups'][0]['flags'],
+                         [False, False, True, False])
+        json.dumps(result)
+
+    def test_errors(self):
+        """Server Test / Errors"""
+        self.assertEqual(self.app.handle('/nothing', {})[0], 404)
+        self.assertEqual(self.app.handle('/summary', {'bench': 'x'})[0], 404)
+        self.assertEqual(self.app.handle('/query', {})[0], 400)
+        self.assertEqual(self.app.handle('/query', {'q': 'select'})[0], 400)
+        self.assertEqual(self.app.handle('/analysis', {'top': '-1'})[0], 400)
+        self.assertEqual(self.app.handle('/groups', {'position': '0'})[0], 400)
+        app = QueryServer({'a': _data('a'), 'b': _data('b')})
+        self.assertEqual(app.handle('/summary', {})[0], 400)
+        self.assertEqual(app.handle('/summary', {'bench': 'b'})[0], 200)
+        with self.assertRaises(ValueError):
+            QueryServer({})
+        with self.assertRaises(ValueError):
+            make_server(self.app, 'localhost:http')
+
+    def _serve(self, server):
+        """Runs a server in the background, returns its thread"""
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return thread
+
+    def test_http(self):
+        """Server Test / Concurrent HTTP clients"""
+        server = make_server(self.app, '127.0.0.1:0')
+        self._serve(server)
+        url = 'http://127.0.0.1:' + repr(server.server_address[1])
+        answers = list()
+        def client():
+            with urllib.request.urlopen(url + '/analysis?top=1') as response:
+                answers.append(json.loads(response.read()))
+        clients = [threading.Thread(target=client) for _ in range(8)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        self.assertEqual(len(answers), 8)
+        self.assertTrue(all(answer == answers[0] for answer in answers))
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url + '/query')
+        self.assertEqual(error.exception.code, 400)
+        # Unexpected errors are answered too, and the server goes on
+        def singular(params):
+            raise np.linalg.LinAlgError("Singular matrix")
+        self.app.routes['/summary'] = singular
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(url + '/summary')
+        self.assertEqual(error.exception.code, 500)
+        self.assertEqual(json.loads(error.exception.read()),
+                         {'error': "LinAlgError: Singular matrix"})
+        self.assertIn("Traceback", stderr.getvalue())
+        def overflow(params):
+            raise FloatingPointError("overflow")
+        self.app.routes['/summary'] = overflow
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(self.app.handle('/summary', {}),
+                             (500, {'error': "FloatingPointError: overflow"}))
+        with urllib.request.urlopen(url + '/benchmarks') as response:
+            self.assertEqual(response.status, 200)
+
+    def test_unix(self):
+        """Server Test / Unix socket"""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, 'aggregate.sock')
+        server = make_server(self.app, path)
+        self._serve(server)
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+            client.sendall(b'GET /benchmarks HTTP/1.0\r\n\r\n')
+            response = b''
+            while True:
+                chunk = client.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+        head, _, body = response.partition(b'\r\n\r\n')
+        self.assertTrue(head.startswith(b'HTTP/1.0 200'))
+        self.assertEqual(json.loads(body)['benchmarks'][0]['name'], 'bench')
+
+if __name__ == '__main__':
+    unittest.main()
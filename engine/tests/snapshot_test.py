@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+"""Testing script for Data snapshots"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from linux_perf import PerfData
+from data import Data
+from snapshot import Snapshot, merge, is_snapshot
+
+DATASTR = 'sep=-,none,outlier=3.5,fit=1/al'
+
+def _add(data, run, logs):
+    """Adds (log name, perf output) to a run"""
+    for log, output in logs:
+        perf = PerfData()
+        perf.parse(output)
+        data.add_log(run, log, perf)
+
+def _leaves(data):
+    """Sorted (run, categories, name, values) of all leaves, to compare"""
+    return sorted((run, cats, leaf.name, sorted(leaf.get_values().items()))
+                  for run, cats, leaf in data.leaves())
+
+class TestSnapshot(unittest.TestCase):
+    """Snapshot tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs = list()
+        for opt in ('O1', 'O2', 'O3'):
+            for cores in ('1', '2', '4'):
+                cycles = 1000 * int(cores) * (3 if opt == 'O3' else 1)
+                output = repr(cycles) + " cycles\n" + repr(cycles * 2) + " instructions"
+                if opt == 'O2':
+                    output += "\n5 cpu-migrations"
+                self.logs.append(('gcc-' + opt + '-' + cores + '.log', output))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip(self):
+        """Snapshot Test / Save and load"""
+        data = Data('bench', DATASTR)
+        _add(data, 'run', self.logs)
+        _add(data, 'run', [('gcc-O1-1-r2.log', '1100 cycles')])
+        path = os.path.join(self.tmp.name, 'node.snapshot')
+        self.assertTrue(is_snapshot(path))
+        Snapshot.from_data(data).save(path)
+        self.assertTrue(os.path.exists(path))
+
+        shard = Snapshot.load(path)
+        self.assertEqual(len(shard), 10)
+        self.assertEqual(shard.name, 'bench')
+        copy = shard.to_data()
+        self.assertEqual(copy.datastr, DATASTR)
+        self.assertEqual(copy.num_logs, data.num_logs)
+        self.assertEqual(_leaves(copy), _leaves(data))
+        for metric, column in data.columns().items():
+            np.testing.assert_array_equal(copy.columns()[metric], column)
+        # Samples are kept, not only the medians
+        self.assertEqual(copy.sample_stats('cycles')['count'][0], 2)
+
+    def test_merge(self):
+        """Snapshot Test / Merge shards"""
+        whole = Data('bench', DATASTR)
+        _add(whole, 'run', self.logs)
+        # Split by cores, so that each node has different dictionaries
+        shards = list()
+        for cores in ('4', '1', '2'):
+            part = Data('bench', DATASTR)
+            _add(part, 'run', [log for log in self.logs
+                               if log[0].endswith('-' + cores + '.log')])
+            shards.append(Snapshot.from_data(part))
+        merged = merge(shards)
+        self.assertEqual(len(merged), len(self.logs))
+        self.assertEqual(merged.runs, ['run'])
+        # Values by schema: with and without cpu-migrations, nothing missing
+        self.assertEqual(len(merged.schemas), 2)
+        self.assertEqual(len(merged.data), 2 * 9 + 3)
+        data = merged.to_data()
+        self.assertEqual(data.num_logs, whole.num_logs)
+        self.assertEqual(_leaves(data), _leaves(whole))
+        self.assertEqual(sorted(str(finding) for finding in data.analyse()),
+                         sorted(str(finding) for finding in whole.analyse()))
+
+        # Shards from many nodes can be merged again, as one run
+        again = merge([merged, Snapshot.from_data(whole)])
+        data = again.to_data(run='all')
+        self.assertEqual(list(data.logs), ['all'])
+        self.assertEqual(data.sample_stats('cycles')['count'].tolist(),
+                         [2] * len(self.logs))
+
+    def test_sparse(self):
+        """Snapshot Test / Metrics few samples have aren't stored for all"""
+        data = Data('bench', DATASTR)
+        _add(data, 'run', self.logs)
+        # One symbol per log, as perf report hotspots
+        for num, (log, _) in enumerate(self.logs):
+            data.attach('run', log, {'sym:func' + repr(num): 1.0})
+        shard = Snapshot.from_data(data)
+        self.assertEqual(len(shard.metrics), 3 + len(self.logs))
+        self.assertEqual(len(shard.data), 2 * 9 + 3 + len(self.logs))
+        self.assertEqual(_leaves(shard.to_data()), _leaves(data))
+        merged = merge([shard, Snapshot.from_data(Data('bench', DATASTR))])
+        self.assertEqual(_leaves(merged.to_data()), _leaves(data))
+
+    def test_errors(self):
+        """Snapshot Test / Errors"""
+        first = Data('bench', DATASTR)
+        _add(first, 'run', self.logs[:2])
+        other = Data('bench', 'sep=-,none,none,none')
+        _add(other, 'run', self.logs[2:4])
+        with self.assertRaises(ValueError):
+            merge([Snapshot.from_data(first), Snapshot.from_data(other)])
+        with self.assertRaises(ValueError):
+            Snapshot.from_data(first).to_data(other)
+        with self.assertRaises(ValueError):
+            merge([])
+
+        path = os.path.join(self.tmp.name, 'table.snapshot')
+        with open(path, 'wb') as out:
+            np.savez(out, cycles=np.zeros(3))
+        with self.assertRaises(ValueError):
+            Snapshot.load(path)
+
+        # Empty data is a valid (empty) snapshot
+        empty = Snapshot.from_data(Data('bench', DATASTR))
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(len(merge([empty, Snapshot.from_data(first)])), 2)
+
+if __name__ == '__main__':
+    unittest.main()
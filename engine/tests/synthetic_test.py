@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""Testing script for the synthetic log generator"""
+
+import unittest
+import os
+import tempfile
+from linux_perf import LinuxPerf
+from lulesh import LinuxPerfPlugin
+from data import Data
+import synthetic
+
+class TestSynthetic(unittest.TestCase):
+    """Synthetic log tests"""
+
+    def test_deterministic(self):
+        """Synthetic Test / Deterministic"""
+        first = list(synthetic.logs(50, depth=2, counters=4, seed=1))
+        second = list(synthetic.logs(50, depth=2, counters=4, seed=1))
+        other = list(synthetic.logs(50, depth=2, counters=4, seed=2))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(first), 50)
+        self.assertEqual(len(set(name for name, _ in first)), 50)
+        self.assertEqual(first[0][0], 'synth-c1v0-1.log')
+        self.assertEqual(first[1][0], 'synth-c1v0-2.log')
+
+    def test_parse(self):
+        """Synthetic Test / Parse"""
+        data = Data('synth', synthetic.data_string(3))
+        for name, text in synthetic.logs(30, depth=3, counters=2):
+            perf = LinuxPerf(plugin=LinuxPerfPlugin())
+            result = perf.parse(text, text)
+            threads = int(name[:-4].split('-')[-1])
+            self.assertEqual(int(result.get_value('Threads')), threads)
+            self.assertTrue(int(result.get_value('cycles')) > 0)
+            self.assertTrue(float(result.get_value('FOM')) > 0)
+            data.add_log('run', name, result)
+        self.assertEqual(data.num_cat, 4)
+        self.assertEqual(data.num_logs, 30)
+
+    def test_wide(self):
+        """Synthetic Test / Wide levels"""
+        names = [name for name, _ in synthetic.logs(2000, depth=1)]
+        self.assertEqual(len(set(names)), 2000)
+        counts = [int(name[:-4].split('-')[-1]) for name in names]
+        self.assertEqual(counts[:9], [1, 2, 4, 8, 16, 32, 64, 128, 192])
+        self.assertEqual(counts[-1], 64 * 1994)
+
+    def test_write(self):
+        """Synthetic Test / Write"""
+        with tempfile.TemporaryDirectory() as tmp:
+            size = synthetic.write(tmp, 8, depth=1)
+            files = sorted(os.listdir(tmp))
+            self.assertEqual(len(files), 8)
+            self.assertEqual(files[0], 'synth-1.log')
+            self.assertEqual(size, sum(os.path.getsize(os.path.join(tmp, name))
+                                       for name in files))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""Testing script for watching log directories"""
+
+import os
+import tempfile
+import threading
+import unittest
+from linux_perf import PerfData
+from data import Data
+from watch import Watcher
+
+def _write(path, text='123 cycles'):
+    """Writes a log file"""
+    with open(path, 'w') as log:
+        log.write(text)
+
+class TestWatch(unittest.TestCase):
+    """Watch tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        _write(os.path.join(self.root, 'gcc-O2-1.log'))
+        _write(os.path.join(self.root, '.hidden'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _check(self, watcher, waits):
+        """New files are reported once, in sub-directories too"""
+        self.assertEqual(watcher.existing(),
+                         [(self.root, os.path.join(self.root, 'gcc-O2-1.log'), '')])
+        self.assertEqual(watcher.wait(0), [])
+        _write(os.path.join(self.root, 'gcc-O2-2.log'))
+        os.mkdir(os.path.join(self.root, 'node1'))
+        _write(os.path.join(self.root, 'node1', 'gcc-O2-4.log'))
+        _write(os.path.join(self.root, '.partial'))
+        found = list()
+        for _ in range(waits):
+            found += watcher.wait(0.05)
+        self.assertEqual(sorted(found), [
+            (self.root, os.path.join(self.root, 'gcc-O2-2.log'), ''),
+            (self.root, os.path.join(self.root, 'node1', 'gcc-O2-4.log'), 'node1')])
+        self.assertEqual(watcher.wait(0.05), [])
+
+    def test_polling(self):
+        """Watch Test / Polling"""
+        with Watcher([self.root], polling=True) as watcher:
+            self.assertTrue(watcher.polling)
+            self._check(watcher, 3)
+
+    def test_inotify(self):
+        """Watch Test / inotify"""
+        with Watcher([self.root]) as watcher:
+            if watcher.polling:
+                self.skipTest("inotify not available")
+            self._check(watcher, 3)
+
+    def _check_partial(self, watcher, waits):
+        """A file written while watching starts is reported once, when done"""
+        partial = os.path.join(self.root, 'gcc-O2-3.log')
+        self.assertEqual(watcher.existing(),
+                         [(self.root, os.path.join(self.root, 'gcc-O2-1.log'), '')])
+        self.writer.join()
+        found = list()
+        for _ in range(waits):
+            found += watcher.wait(0.05)
+        self.assertEqual(found, [(self.root, partial, '')])
+        self.assertEqual(watcher.wait(0.05), [])
+
+    def _start_partial(self):
+        """Starts a file, finishes it while the watcher settles"""
+        partial = open(os.path.join(self.root, 'gcc-O2-3.log'), 'w')
+        partial.write('12')
+        partial.flush()
+        def finish():
+            partial.write('3 cycles')
+            partial.close()
+        self.writer = threading.Timer(0.05, finish)
+        self.writer.start()
+
+    def test_partial_polling(self):
+        """Watch Test / Partial file at start, polling"""
+        self._start_partial()
+        with Watcher([self.root], polling=True, settle=0.2) as watcher:
+            self._check_partial(watcher, 3)
+
+    def test_partial_inotify(self):
+        """Watch Test / Partial file at start, inotify"""
+        self._start_partial()
+        with Watcher([self.root], settle=0.2) as watcher:
+            if watcher.polling:
+                self.writer.join()
+                self.skipTest("inotify not available")
+            self._check_partial(watcher, 3)
+
+    def test_errors(self):
+        """Watch Test / Errors"""
+        with self.assertRaises(ValueError):
+            Watcher([os.path.join(self.root, 'gcc-O2-1.log')])
+
+    def test_affected(self):
+        """Watch Test / Only the groups of new logs are analysed"""
+        data = Data('data', 'sep=-,none,outlier=1.5,fit=1/al')
+        for opt in ('O1', 'O2', 'O3', 'Os'):
+            for cores in ('1', '2', '4'):
+                perf = PerfData()
+                cycles = 1000 * int(cores) * (3 if opt == 'O3' else 1)
+                perf.parse(repr(cycles + len(opt)) + " cycles")
+                data.add_log('run', 'gcc-' + opt + '-' + cores + '.log', perf)
+        everything = [str(finding) for finding in data.analyse()]
+        log_id = data.log_id('run', 'gcc-O3-4.log')
+        some = [str(finding) for finding in data.analyse(logs=[log_id])]
+        # The outlier among options for 4 cores, not the others
+        self.assertTrue(some)
+        self.assertTrue(set(some) < set(everything))
+        self.assertTrue(all('-4.log' in finding for finding in some))
+        groups = {(position, key) for position, key, _, _, _, _
+                  in data.results(logs=[log_id])}
+        self.assertEqual(groups, {(1, ('run', 'gcc', '4')),
+                                  (2, ('run', 'gcc', 'O3'))})
+
+if __name__ == '__main__':
+    unittest.main()
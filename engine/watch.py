@@ -0,0 +1,211 @@
+"""
+ Watch - Reports log files as they are written in log directories
+
+ On Linux, uses inotify (through libc, no extra modules): a file is reported
+ when it is closed after writing (or moved in), new sub-directories are
+ watched as they appear. Elsewhere, or if inotify can't be used, directories
+ are polled and a file is reported once its size and modification time stop
+ changing between two polls.
+
+ Files already there when watching starts are not reported, but listed by
+ existing(), unless they're still being written: their signature is taken
+ twice, 'settle' seconds apart, and those that changed are left to be
+ reported when they're done, as new ones. Each file is reported once, hidden
+ files are ignored.
+
+ Usage:
+   watcher = Watcher(['logs/node1', 'logs/node2'])
+   for root, path, reldir in watcher.existing(): ...
+   while True:
+     for root, path, reldir in watcher.wait(timeout=1.0): ...
+   watcher.close()
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# inotify flags and events (linux/inotify.h)
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT = struct.Struct('iIII')
+# Seconds between the two looks at the files there when watching starts
+SETTLE = 0.1
+
+def _inotify():
+    """libc with inotify, or None if not available"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+def _relative(root, path):
+    """Directory of path relative to root ('' at the top), as in the walk"""
+    reldir = os.path.relpath(os.path.dirname(path), root)
+    return '' if reldir == '.' else reldir
+
+class Watcher:
+    """Reports new log files in directories (and their sub-directories)"""
+    def __init__(self, roots, polling=False, settle=SETTLE):
+        for root in roots:
+            if not os.path.isdir(root):
+                raise ValueError(root + " is not a directory")
+        self.roots = list(roots)
+        self.fd = -1
+        self.libc = None if polling else _inotify()
+        # Watch descriptor -> (root, directory)
+        self.dirs = dict()
+        if self.libc is not None:
+            self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self.fd < 0:
+                self.libc = None
+        # Path -> (root, signature), files seen / reported
+        self.known = dict()
+        self.reported = set()
+        self.pending = list()
+        for root in self.roots:
+            self._add_tree(root, root)
+        # Everything there now is existing, not new, unless it's being written
+        if self.known and settle > 0:
+            time.sleep(settle)
+        for path, (root, signature) in list(self.known.items()):
+            current = self._signature(path)
+            if current is not None and current == signature:
+                self.reported.add(path)
+            else:
+                self.known[path] = (root, current)
+
+    @property
+    def polling(self):
+        """True if polling (no inotify)"""
+        return self.libc is None
+
+    def _add_tree(self, root, directory):
+        """Watches a directory and its sub-directories, records their files"""
+        for path, dirs, names in os.walk(directory):
+            dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+            if self.libc is not None:
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), "Cannot watch " + path)
+                self.dirs[wd] = (root, path)
+            for name in sorted(names):
+                if not name.startswith("."):
+                    full = os.path.join(path, name)
+                    self.known[full] = (root, self._signature(full))
+
+    @staticmethod
+    def _signature(path):
+        """Size and modification time of a file, None if it's gone"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def existing(self):
+        """(root, path, reldir) of the files there when watching started"""
+        return [(root, path, _relative(root, path))
+                for path, (root, _) in self.known.items()
+                if path in self.reported]
+
+    def _report(self, root, path):
+        """Queues a file, once"""
+        if path not in self.reported:
+            self.reported.add(path)
+            self.pending.append((root, path, _relative(root, path)))
+
+    def _read_events(self, timeout):
+        """Reads inotify events, waiting up to timeout seconds"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        buffer = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT.unpack_from(buffer, offset)
+            offset += EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Lost events, look for whatever is new
+                for root in self.roots:
+                    self._scan(root)
+                continue
+            if wd not in self.dirs or name.startswith(b'.'):
+                continue
+            root, directory = self.dirs[wd]
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may be in it before it's watched
+                    before = set(self.known)
+                    self._add_tree(root, path)
+                    for full in sorted(set(self.known) - before):
+                        self._report(root, full)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                self.known[path] = (root, self._signature(path))
+                self._report(root, path)
+
+    def _scan(self, root):
+        """Polls a tree, reports files that didn't change since last poll"""
+        for path, dirs, names in os.walk(root):
+            dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+            for name in sorted(names):
+                if name.startswith("."):
+                    continue
+                full = os.path.join(path, name)
+                signature = self._signature(full)
+                previous = self.known.get(full)
+                self.known[full] = (root, signature)
+                if previous is not None and previous[1] == signature and \
+                   signature is not None:
+                    self._report(root, full)
+
+    def wait(self, timeout=1.0):
+        """List of (root, path, reldir) of the files written since the last
+           call, waiting up to timeout seconds for some"""
+        if self.libc is not None:
+            self._read_events(timeout)
+        else:
+            time.sleep(timeout)
+            for root in self.roots:
+                self._scan(root)
+        pending = self.pending
+        self.pending = list()
+        return pending
+
+    def close(self):
+        """Stops watching"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __str__(self):
+        """Class name, for lists"""
+        return "Watcher"
+
+    def __repr__(self):
+        """Pretty-printing"""
+        string = "[ Watcher: " + ", ".join(self.roots) + ", "
+        string += ("polling" if self.polling else "inotify") + ", "
+        string += repr(len(self.known)) + " file(s) ]"
+        return string
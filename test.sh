@@ -13,11 +13,11 @@ echo " * Regression Tests *"
 out=$(python3 ./aggregate.py -d 'sep=-,none,outlier=1,cluster=2,fit=3' -p lulesh Lulesh x86_64)
 
 # Records
-logs=$(echo "$out" | grep -c name)
+logs=$(echo "$out" | grep -c "^ *name = ")
 # Perf results
-inst=$(echo "$out" | grep -c instructions)
+inst=$(echo "$out" | grep -c "^ *instructions = ")
 # Lulesh results
-diff=$(echo "$out" | grep -c MaxRelDiff)
+diff=$(echo "$out" | grep -c "^ *MaxRelDiff = ")
 # Should all be the same
 if [ "$logs" -ne "$inst" ] || [ "$inst" -ne "$diff" ]; then
   echo "Results don't match: [$logs] [$inst] [$diff]"
@@ -41,3 +41,11 @@ else
   echo "Cat 2: [$cat2]"
   echo "Cat 3: [$cat3]"
 fi
+
+# Ranking (at most 10 findings, after the header)
+top=$(echo "$out" | sed -n '/^ + Top 10 of/,$p' | grep -c "^ - ")
+if [ "$top" -gt "0" ] && [ "$top" -le "10" ]; then
+  echo "Ranking: PASS"
+else
+  echo "Ranking incorrect: [$top] findings"
+fi